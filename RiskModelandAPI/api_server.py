@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Scoring API Server
+
+A local HTTP scoring service built on credit_pred. Concurrent requests are
+collected into micro-batches (flushed when `max_batch_size` loans are waiting
+or `max_wait_ms` after the first one arrived) and each batch is scored with a
+single predict_credit_scores call on a worker thread, so the event loop keeps
+accepting requests while the model runs.
+
+Endpoints:
+  POST /score         body: one loan (JSON object) or a list of loans
+  GET  /health        liveness and the active model version
+  GET  /metrics       model info, batching and prediction cache counters
+  POST /admin/reload  hot-reload the model from the path it was loaded from
+                      (deploy the new version there); a model path cannot be
+                      given, since loading a pickle can run arbitrary code
+
+Every scoring response carries the version of the model that produced it.
+
+Uses only the standard library on top of credit_pred; no outside services.
+
+Usage:
+    python api_server.py --port 5000 --max-batch-size 64 --max-wait-ms 2
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import credit_pred
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    """
+    Collect concurrently submitted loans into batches and score each batch
+    with one call to `score_batch` on a thread pool.
+
+    The thread pool lives from start() to stop(); a stopped batcher can be
+    started again, and submit() raises RuntimeError while it is not running.
+    """
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait_ms=2.0, workers=1):
+        """
+        Args:
+            score_batch: Callable taking a list of loan dicts and returning one
+                result per loan, in order (e.g. credit_pred.predict_credit_scores)
+            max_batch_size: Flush a batch once this many loans are waiting
+            max_wait_ms: Flush a batch this long after its first loan arrived
+            workers: Number of batches that may be scored at the same time
+        """
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.workers = workers
+        self._executor = None
+        self._queue = None
+        self._slots = None
+        self._collector = None
+        self._inflight = set()
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+
+    async def start(self):
+        if self._collector is not None:
+            raise RuntimeError("MicroBatcher is already running")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scoring')
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Loans queued after the last batch was taken would otherwise wait forever
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher stopped"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, record):
+        """Queue one loan and wait for its result."""
+        if self._collector is None:
+            raise RuntimeError("MicroBatcher is not running; call start() first")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                # Wait for a free worker, then keep collecting while this batch runs
+                await self._slots.acquire()
+                task = asyncio.create_task(self._run(batch))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # The batch being collected has left the queue, so stop() cannot drain it
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("MicroBatcher stopped"))
+            raise
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            records = [record for record, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.score_batch, records)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'max_batch_size_seen': self.max_seen_batch,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+        }
+
+
+class ScoringServer:
+    """Minimal HTTP/1.1 server (with keep-alive) that scores loans through a MicroBatcher."""
+
+    def __init__(self, batcher, host='127.0.0.1', port=5000):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self._server = None
+        self.started = time.time()
+        self.requests = 0
+
+    async def start(self):
+        await self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Report the real port when started with port=0
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Scoring server listening on http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line'}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0) or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': 'Request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version.upper() == 'HTTP/1.1')
+
+                status, payload = await self._route(method.upper(), path, body)
+                self.requests += 1
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        path = path.split('?', 1)[0]
+        if path == '/health':
+            return 200, {'status': 'ok', 'model_version': credit_pred.get_model_version()}
+        if path == '/metrics':
+            return 200, {
+                'model': credit_pred.get_model_info(),
+                'requests': self.requests,
+                'uptime_seconds': time.time() - self.started,
+                'batching': self.batcher.stats(),
+                'cache': credit_pred.get_cache_stats(),
+            }
+        if path == '/admin/reload':
+            return await self._reload(method, body)
+        if path != '/score':
+            return 404, {'error': f'Unknown path: {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST /score'}
+
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            return 400, {'error': 'Body must be JSON'}
+
+        try:
+            if isinstance(data, list):
+                results = await asyncio.gather(*(self.batcher.submit(r) for r in data))
+                return 200, {'results': list(results)}
+            if isinstance(data, dict):
+                result = await self.batcher.submit(data)
+                return (200 if result['error'] is None else 400), result
+        except Exception as e:
+            return 500, {'error': f'Scoring failed: {str(e)}'}
+        return 400, {'error': 'Body must be a loan object or a list of loans'}
+
+    async def _reload(self, method, body):
+        if method != 'POST':
+            return 405, {'error': 'Use POST /admin/reload'}
+        try:
+            options = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'Body must be JSON'}
+        if isinstance(options, dict) and options.get('model_path') is not None:
+            # Loading a client-chosen pickle would run arbitrary code in the server
+            return 400, {'error': 'model_path is not accepted; the model is reloaded from the path it was '
+                                  'started with'}
+        # Loading and validating happen on a thread; scoring continues on the old model
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, credit_pred.reload_model, None)
+        except Exception as e:
+            return 500, {'error': f'Reload failed: {str(e)}', 'model': credit_pred.get_model_info()}
+        return 200, {'model': credit_pred.get_model_info()}
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode('latin1')
+        writer.write(head + body)
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MicroLoan risk scoring server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--model-path', default=None,
+                        help='Inference artifact directory or legacy .pkl (default: next to credit_pred.py)')
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Batches scored concurrently on worker threads')
+    parser.add_argument('--watch', action='store_true',
+                        help='Hot-reload the model when its file or artifact manifest changes')
+    parser.add_argument('--watch-interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    # Load the model before accepting connections
+    credit_pred.load_model_once(args.model_path)
+    if args.watch:
+        credit_pred.start_model_watcher(args.model_path, args.watch_interval)
+    batcher = MicroBatcher(credit_pred.predict_credit_scores, args.max_batch_size,
+                           args.max_wait_ms, args.workers)
+    server = ScoringServer(batcher, args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("Scoring server stopped")
+
+
+if __name__ == "__main__":
+    main()
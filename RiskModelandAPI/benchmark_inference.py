@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Inference Benchmarks
+
+A reproducible benchmark of the scoring path, using a model trained on
+synthetic loans (no real dataset or network needed). It measures:
+  - single-row predict_credit_score latency (p50/p95/p99), with the
+    prediction cache disabled, plus MicroLoanRiskModelAdvanced.predict on
+    one row for reference
+  - batch throughput of MicroLoanRiskModelAdvanced.predict,
+    predict_credit_scores and explain_credit_scores for several batch sizes
+  - SHAP throughput of the lookup tables of explanations.py against
+    XGBoost's pred_contribs
+  - cold-start import time and model load time (artifact and pickle), each
+    measured in a fresh interpreter
+  - peak RSS of this process and of the cold-start interpreters
+  - per scoring backend (xgboost, onnx, lookup; see credit_pred):
+    single-row latency, batch throughput, and load time and peak RSS in a
+    fresh interpreter
+
+Results are written as JSON, together with versions and the git commit, so
+runs can be compared across commits.
+
+Usage:
+    python benchmark_inference.py --output benchmark_results.json
+    python benchmark_inference.py --quick
+    python benchmark_inference.py --backends xgboost onnx
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Peak RSS comes from profiling.peak_rss_mb, imported after the timed steps
+_COLD_START_PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import credit_pred\n"
+    "imported = time.perf_counter()\n"
+    "credit_pred.load_model_once(sys.argv[1])\n"
+    "loaded = time.perf_counter()\n"
+    "from profiling import peak_rss_mb\n"
+    "print(json.dumps({'import_seconds': imported - start, 'load_seconds': loaded - imported,\n"
+    "                  'peak_rss_mb': peak_rss_mb()}))\n"
+)
+
+# Loads the model and builds the scorer of the backend set in CREDIT_PRED_BACKEND
+_BACKEND_PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import credit_pred\n"
+    "credit_pred.load_model_once(sys.argv[1])\n"
+    "handle = credit_pred.get_active_model()\n"
+    "ready = time.perf_counter()\n"
+    "credit_pred.predict_credit_score(credit_pred.CANARY_RECORDS[0])\n"
+    "first = time.perf_counter()\n"
+    "from profiling import peak_rss_mb\n"
+    "print(json.dumps({'backend': handle.backend, 'ready_seconds': ready - start,\n"
+    "                  'first_score_seconds': first - ready, 'peak_rss_mb': peak_rss_mb()}))\n"
+)
+
+
+def _percentiles(seconds):
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'n': int(ms.size),
+    }
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _environment():
+    import pandas as pd
+    import sklearn
+    import xgboost as xgb
+    return {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'xgboost': xgb.__version__,
+    }
+
+
+def bench_single_row(ml_model, records, repeats):
+    """Latency of one loan through predict_credit_score and MicroLoanRiskModelAdvanced.predict."""
+    import pandas as pd
+    import credit_pred
+
+    credit_pred.configure_prediction_cache(maxsize=0)
+    credit_pred.predict_credit_score(records[0])  # warm-up (compiles the scorer)
+    latencies = []
+    for i in range(repeats):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        credit_pred.predict_credit_score(record)
+        latencies.append(time.perf_counter() - start)
+
+    legacy = []
+    for i in range(max(repeats // 20, 20)):
+        frame = pd.DataFrame([records[i % len(records)]])
+        start = time.perf_counter()
+        ml_model.predict(frame)
+        legacy.append(time.perf_counter() - start)
+
+    return {
+        'predict_credit_score': _percentiles(latencies),
+        'model_predict_one_row': _percentiles(legacy),
+    }
+
+
+def bench_batches(ml_model, records, batch_sizes, min_seconds):
+    """Rows per second for each batch size through the batch entry points."""
+    import pandas as pd
+    import credit_pred
+
+    credit_pred.configure_prediction_cache(maxsize=0)
+    results = []
+    for size in batch_sizes:
+        batch = [records[i % len(records)] for i in range(size)]
+        frame = pd.DataFrame(batch)
+        row = {'batch_size': size}
+        for name, fn in (('model_predict', lambda: ml_model.predict(frame)),
+                         ('predict_credit_scores', lambda: credit_pred.predict_credit_scores(batch)),
+                         ('explain_credit_scores', lambda: credit_pred.explain_credit_scores(batch))):
+            fn()  # warm-up
+            calls, start = 0, time.perf_counter()
+            while True:
+                fn()
+                calls += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_seconds and calls >= 3:
+                    break
+            row[f'{name}_rows_per_second'] = calls * size / elapsed
+            row[f'{name}_ms_per_batch'] = elapsed / calls * 1000.0
+        results.append(row)
+    return results
+
+
+def bench_explainers(ml_model, records, batch_sizes, min_seconds):
+    """
+    Per-loan SHAP through the precomputed tables of explanations.py against
+    XGBoost's pred_contribs (the fallback for very deep trees): build time,
+    and rows per second for each batch size.
+    """
+    from explanations import MAX_TABLE_SIZE, TreeShapExplainer
+
+    scorer = ml_model.compile_scorer()
+    results = {}
+    for name, max_table_size in (('tables', MAX_TABLE_SIZE), ('pred_contribs', 0)):
+        start = time.perf_counter()
+        explainer = TreeShapExplainer.from_scorer(scorer, max_table_size)
+        row = {'build_seconds': time.perf_counter() - start, 'uses_tables': explainer.tables is not None,
+               'rows_per_second': {}}
+        for size in batch_sizes:
+            X = scorer.transform([records[i % len(records)] for i in range(size)])
+            explainer.shap_values(X)  # warm-up
+            calls, start = 0, time.perf_counter()
+            while True:
+                explainer.shap_values(X)
+                calls += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_seconds and calls >= 3:
+                    break
+            row['rows_per_second'][str(size)] = calls * size / elapsed
+        results[name] = row
+    return results
+
+
+def bench_cold_start(model_paths, runs):
+    """Import and load time in fresh interpreters, best of `runs`, per model format."""
+    results = {}
+    for name, path in model_paths.items():
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, '-c', _COLD_START_PROBE, path],
+                                 cwd=HERE, capture_output=True, text=True, check=True)
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        results[name] = {
+            'import_seconds': min(s['import_seconds'] for s in samples),
+            'load_seconds': min(s['load_seconds'] for s in samples),
+            'peak_rss_mb': min(s['peak_rss_mb'] for s in samples),
+            'runs': runs,
+        }
+    return results
+
+
+def bench_backends(records, artifact_path, backends, batch_sizes, repeats, min_seconds, cold_runs):
+    """
+    Compare scoring backends through credit_pred: single-row latency, batch
+    rows per second, and time to a ready scorer and peak RSS in fresh
+    interpreters (best of `cold_runs`).
+
+    A backend that cannot be built falls back to xgboost; `backend` in each
+    result says which one actually ran.
+    """
+    import credit_pred
+
+    previous = credit_pred._backend
+    credit_pred.configure_prediction_cache(maxsize=0)
+    results = {}
+    try:
+        for backend in backends:
+            credit_pred.configure_backend(backend)
+            row = {'backend': credit_pred.get_active_model().backend}
+            credit_pred.predict_credit_score(records[0])  # warm-up
+            latencies = []
+            for i in range(repeats):
+                record = records[i % len(records)]
+                start = time.perf_counter()
+                credit_pred.predict_credit_score(record)
+                latencies.append(time.perf_counter() - start)
+            row['single_row'] = _percentiles(latencies)
+
+            row['batch_rows_per_second'] = {}
+            for size in batch_sizes:
+                batch = [records[i % len(records)] for i in range(size)]
+                credit_pred.predict_credit_scores(batch)  # warm-up
+                calls, start = 0, time.perf_counter()
+                while True:
+                    credit_pred.predict_credit_scores(batch)
+                    calls += 1
+                    elapsed = time.perf_counter() - start
+                    if elapsed >= min_seconds and calls >= 3:
+                        break
+                row['batch_rows_per_second'][str(size)] = calls * size / elapsed
+
+            samples = []
+            env = dict(os.environ, CREDIT_PRED_BACKEND=backend)
+            for _ in range(cold_runs):
+                out = subprocess.run([sys.executable, '-c', _BACKEND_PROBE, artifact_path],
+                                     cwd=HERE, env=env, capture_output=True, text=True, check=True)
+                samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            row['cold_start'] = {
+                'backend': samples[0]['backend'],
+                'ready_seconds': min(s['ready_seconds'] for s in samples),
+                'first_score_seconds': min(s['first_score_seconds'] for s in samples),
+                'peak_rss_mb': min(s['peak_rss_mb'] for s in samples),
+                'runs': cold_runs,
+            }
+            results[backend] = row
+    finally:
+        credit_pred.configure_backend(previous)
+    return results
+
+
+def run_benchmarks(n_rows=20000, n_estimators=200, max_depth=5, batch_sizes=(1, 10, 100, 1000, 10000),
+                   repeats=2000, min_seconds=0.5, cold_runs=3, seed=0, extra=None,
+                   backends=('xgboost', 'onnx', 'lookup')):
+    """
+    Run the whole suite and return the results as a dict.
+
+    Args:
+        n_rows, n_estimators, max_depth: Size of the synthetic training run
+        batch_sizes: Batch sizes for the throughput benchmark
+        repeats: Single-row predictions to time
+        min_seconds: Minimum timed duration per batch size
+        cold_runs: Fresh interpreters per cold-start measurement
+        seed: Seed for the synthetic data
+        extra: Optional callable(ml_model, records, workdir) -> dict of extra
+            sections to include
+        backends: Scoring backends to compare (empty to skip)
+    """
+    sys.path.insert(0, HERE)
+    import credit_pred
+    from inference import load_artifact
+    from synthetic_data import build_synthetic_model, sample_records
+
+    results = {'environment': _environment()}
+    start = time.perf_counter()
+    ml_model = build_synthetic_model(n_rows=n_rows, seed=seed, n_estimators=n_estimators, max_depth=max_depth)
+    results['model'] = {
+        'training_rows': n_rows,
+        'n_estimators': n_estimators,
+        'max_depth': max_depth,
+        'n_columns': len(ml_model.model.feature_names_in_),
+        'train_seconds': time.perf_counter() - start,
+    }
+    records = sample_records(max(batch_sizes + (repeats,)), seed=seed + 1)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pickle_path = os.path.join(workdir, 'microloan_risk_model_advanced.pkl')
+        artifact_path = os.path.join(workdir, 'microloan_risk_model_advanced')
+        ml_model.save_model(pickle_path)
+        ml_model.save_inference_artifact(artifact_path)
+        results['model']['pickle_bytes'] = os.path.getsize(pickle_path)
+        results['model']['artifact_bytes'] = sum(
+            os.path.getsize(os.path.join(artifact_path, name)) for name in os.listdir(artifact_path)
+        )
+        # Exported into the artifact directory, where credit_pred's onnx backend looks for it
+        if 'onnx' in backends:
+            try:
+                from onnx_export import ONNX_FILE, export_onnx
+                onnx_path = export_onnx(load_artifact(artifact_path), os.path.join(artifact_path, ONNX_FILE))
+                results['model']['onnx_bytes'] = os.path.getsize(onnx_path)
+            except (ImportError, ValueError) as e:
+                print(f"ONNX export skipped: {str(e)}")
+
+        # Installed through the regular reload path, so the handle, version and backend scorer match
+        credit_pred.reload_model(pickle_path)
+        results['single_row'] = bench_single_row(ml_model, records, repeats)
+        results['batch'] = bench_batches(ml_model, records, list(batch_sizes), min_seconds)
+        results['explainers'] = bench_explainers(ml_model, records, list(batch_sizes), min_seconds)
+        results['cold_start'] = bench_cold_start({'artifact': artifact_path, 'pickle': pickle_path}, cold_runs)
+        if backends:
+            results['backends'] = bench_backends(records, artifact_path, backends, list(batch_sizes),
+                                                 repeats, min_seconds, cold_runs)
+        if extra is not None:
+            results.update(extra(ml_model, records, workdir))
+
+    from profiling import peak_rss_mb
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def print_summary(results):
+    single = results['single_row']['predict_credit_score']
+    legacy = results['single_row']['model_predict_one_row']
+    print("\n=== Single-row latency ===")
+    print(f"predict_credit_score: p50 {single['p50_ms']:.3f} ms, p95 {single['p95_ms']:.3f} ms, "
+          f"p99 {single['p99_ms']:.3f} ms")
+    print(f"model.predict (1 row): p50 {legacy['p50_ms']:.3f} ms, p99 {legacy['p99_ms']:.3f} ms")
+    print("\n=== Batch throughput (rows/s) ===")
+    for row in results['batch']:
+        print(f"batch {row['batch_size']:>6}: model.predict {row['model_predict_rows_per_second']:>12,.0f}   "
+              f"predict_credit_scores {row['predict_credit_scores_rows_per_second']:>12,.0f}   "
+              f"explain_credit_scores {row['explain_credit_scores_rows_per_second']:>12,.0f}")
+    if results.get('explainers'):
+        print("\n=== SHAP explanations (rows/s) ===")
+        for name, row in results['explainers'].items():
+            throughput = ', '.join(f"{size}: {rate:,.0f}" for size, rate in row['rows_per_second'].items())
+            fallback = '' if name != 'tables' or row['uses_tables'] else ' (over the table budget)'
+            print(f"{name:>13}{fallback}: built in {row['build_seconds']:.2f}s, batch rows/s {throughput}")
+    print("\n=== Cold start ===")
+    for name, cold in results['cold_start'].items():
+        print(f"{name:>8}: import {cold['import_seconds']:.3f}s, load {cold['load_seconds']:.3f}s, "
+              f"peak RSS {cold['peak_rss_mb']:.0f} MB")
+    if results.get('backends'):
+        print("\n=== Scoring backends ===")
+        for name, row in results['backends'].items():
+            single, cold = row['single_row'], row['cold_start']
+            ran = '' if row['backend'] == name else f" (fell back to {row['backend']})"
+            throughput = ', '.join(f"{size}: {rate:,.0f}" for size, rate in row['batch_rows_per_second'].items())
+            print(f"{name:>8}{ran}: single row p50 {single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms")
+            print(f"{'':>8}  batch rows/s {throughput}")
+            print(f"{'':>8}  cold start {cold['ready_seconds']:.3f}s to ready, first score "
+                  f"{cold['first_score_seconds'] * 1000:.1f} ms, peak RSS {cold['peak_rss_mb']:.0f} MB")
+    print(f"\nBenchmark process peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the risk model scoring path')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--quick', action='store_true', help='Smaller model and fewer repetitions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backends', nargs='*', default=['xgboost', 'onnx', 'lookup'],
+                        help='Scoring backends to compare (none to skip)')
+    args = parser.parse_args()
+
+    if args.quick:
+        results = run_benchmarks(n_rows=3000, n_estimators=50, max_depth=4, batch_sizes=(1, 100, 1000),
+                                 repeats=300, min_seconds=0.1, cold_runs=1, seed=args.seed,
+                                 backends=tuple(args.backends))
+    else:
+        results = run_benchmarks(seed=args.seed, backends=tuple(args.backends))
+    print_summary(results)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Training Benchmarks
+
+Compares the ways preprocess_data can feed the categorical features to
+XGBoost ('onehot' dense DataFrames, 'sparse' CSR matrices, 'native'
+category columns) on the same synthetic loans. Each encoding runs in a fresh
+process, so the reported peak RSS belongs to that encoding alone. Reported
+per encoding:
+  - processed training matrix size and width
+  - preprocessing, fit and raw-input predict times
+  - peak RSS while preprocessing, fitting and predicting, above the RSS
+    after the data was generated
+  - test R² and RMSE
+
+With --out-of-core it also trains from a CSV of the same loans in memory
+(load_data + preprocess_data) and through external_memory.py with several
+chunk sizes, reporting peak RSS, wall time and test R² for each.
+
+With --workers it also trains the same model single-process and with
+distributed.py on each worker count, reporting wall time (total and the
+slowest worker's training), speedup, test RMSE and the largest prediction
+difference from single-process training.
+
+With --tuning-cpus it also runs the same Hyperband search with several CPU
+budgets and reports wall time, speedup and CPU utilization per budget.
+
+Usage:
+    python benchmark_training.py --rows 200000 --countries 300 --output training_benchmark.json
+    python benchmark_training.py --rows 50000 --tuning-cpus 1 2 4 8
+    python benchmark_training.py --rows 1000000 --out-of-core 50000 200000
+    python benchmark_training.py --rows 500000 --workers 1 2 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from inference import FEATURE_ENCODINGS
+from profiling import peak_rss_mb, proc_status_mb, reset_peak_rss
+
+
+def _matrix_bytes(X):
+    if hasattr(X, 'memory_usage'):
+        return int(X.memory_usage(deep=True).sum())
+    return int(X.data.nbytes + X.indices.nbytes + X.indptr.nbytes)
+
+
+def _run_encoding(feature_encoding, n_rows, n_countries, n_estimators, max_depth, seed):
+    """Train and evaluate one encoding; runs in its own process."""
+    import xgboost as xgb
+    from sklearn.metrics import r2_score, mean_squared_error
+    from boost_model import MicroLoanRiskModelAdvanced
+    from synthetic_data import generate_loan_data
+
+    ml_model = MicroLoanRiskModelAdvanced()
+    df_clean = ml_model.clean_data(generate_loan_data(n_rows, seed, n_countries=n_countries), lean=True)
+    X, y = ml_model.prepare_features(df_clean)
+    del df_clean
+    baseline_mb = proc_status_mb('VmRSS') or 0.0
+    reset_peak_rss()
+
+    start = time.perf_counter()
+    X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y, feature_encoding=feature_encoding)
+    preprocess_seconds = time.perf_counter() - start
+
+    ml_model.model = xgb.XGBRegressor(objective='reg:squarederror', random_state=42, tree_method='hist',
+                                      n_estimators=n_estimators, max_depth=max_depth, learning_rate=0.1,
+                                      **ml_model.xgb_params())
+    start = time.perf_counter()
+    ml_model.fit_model(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    y_pred = ml_model.model.predict(X_test)
+    X_raw_test = X.loc[y_test.index]
+    start = time.perf_counter()
+    ml_model.predict(X_raw_test)
+    predict_seconds = time.perf_counter() - start
+
+    return {
+        'feature_encoding': feature_encoding,
+        'n_columns': int(X_train.shape[1]),
+        'train_matrix_mb': _matrix_bytes(X_train) / 1e6,
+        'preprocess_seconds': preprocess_seconds,
+        'fit_seconds': fit_seconds,
+        'predict_rows_per_second': len(X_raw_test) / predict_seconds,
+        'peak_rss_over_baseline_mb': peak_rss_mb() - baseline_mb,
+        'r2': float(r2_score(y_test, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
+    }
+
+
+def compare_feature_encodings(n_rows=200000, n_countries=300, n_estimators=200, max_depth=6, seed=0,
+                              encodings=FEATURE_ENCODINGS):
+    """
+    Train the same model with each feature encoding and collect its costs.
+
+    Args:
+        n_rows: Synthetic loans to generate
+        n_countries: Number of distinct countries (drives one-hot width)
+        n_estimators, max_depth: XGBoost size
+        seed: Seed for the synthetic data
+        encodings: Encodings to compare
+
+    Returns:
+        list: One result dict per encoding
+    """
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for feature_encoding in encodings:
+        print(f"Training with feature_encoding={feature_encoding}...")
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(_run_encoding, (feature_encoding, n_rows, n_countries,
+                                                      n_estimators, max_depth, seed)))
+    return results
+
+
+def print_encoding_comparison(results):
+    print(f"\n{'encoding':>8} {'cols':>6} {'matrix MB':>10} {'prep s':>7} {'fit s':>7} "
+          f"{'pred rows/s':>12} {'peak MB':>8} {'R²':>7} {'RMSE':>7}")
+    for r in results:
+        print(f"{r['feature_encoding']:>8} {r['n_columns']:>6} {r['train_matrix_mb']:>10.1f} "
+              f"{r['preprocess_seconds']:>7.2f} {r['fit_seconds']:>7.2f} {r['predict_rows_per_second']:>12,.0f} "
+              f"{r['peak_rss_over_baseline_mb']:>8.0f} {r['r2']:>7.4f} {r['rmse']:>7.3f}")
+
+
+def _run_training_from_file(filepath, chunksize, n_estimators, max_depth):
+    """Train from a CSV in memory (chunksize None) or out of core; runs in its own process."""
+    import xgboost as xgb
+    from sklearn.metrics import r2_score
+    from boost_model import MicroLoanRiskModelAdvanced
+    from external_memory import DEFAULT_PARAMS, train_out_of_core
+
+    baseline_mb = proc_status_mb('VmRSS') or 0.0
+    reset_peak_rss()
+    start = time.perf_counter()
+    if chunksize is None:
+        ml_model = MicroLoanRiskModelAdvanced()
+        df_clean = ml_model.clean_data(ml_model.load_data(filepath), lean=True)
+        X, y = ml_model.prepare_features(df_clean)
+        X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y)
+        ml_model.model = xgb.XGBRegressor(n_estimators=n_estimators, **dict(DEFAULT_PARAMS, max_depth=max_depth))
+        ml_model.fit_model(X_train, y_train)
+        r2 = float(r2_score(y_test, ml_model.model.predict(X_test)))
+    else:
+        ml_model = train_out_of_core(filepath, chunksize=chunksize, num_boost_round=n_estimators,
+                                     params=dict(DEFAULT_PARAMS, max_depth=max_depth))
+        r2 = ml_model.model_metrics['r2_score']
+    return {
+        'mode': 'in-memory' if chunksize is None else f'chunks of {chunksize}',
+        'chunksize': chunksize,
+        'seconds': time.perf_counter() - start,
+        'peak_rss_over_baseline_mb': peak_rss_mb() - baseline_mb,
+        'r2': r2,
+    }
+
+
+def compare_out_of_core(chunksizes, n_rows=1000000, n_estimators=200, max_depth=6, seed=0):
+    """
+    Train from the same synthetic CSV in memory and out of core with each
+    chunk size.
+
+    Returns:
+        list: One result dict per mode
+    """
+    import tempfile
+    from synthetic_data import generate_loan_data
+
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        filepath = f'{workdir}/loan_data.csv'
+        generate_loan_data(n_rows, seed).to_csv(filepath, index=False)
+        for chunksize in [None] + list(chunksizes):
+            print(f"Training from file with chunksize={chunksize}...")
+            with ctx.Pool(1) as pool:
+                results.append(pool.apply(_run_training_from_file, (filepath, chunksize, n_estimators, max_depth)))
+    return results
+
+
+def print_out_of_core_comparison(results):
+    print(f"\n{'mode':>18} {'seconds':>8} {'peak MB':>8} {'R²':>7}")
+    for r in results:
+        print(f"{r['mode']:>18} {r['seconds']:>8.1f} {r['peak_rss_over_baseline_mb']:>8.0f} {r['r2']:>7.4f}")
+
+
+def compare_worker_counts(worker_counts, n_rows=200000, n_estimators=200, max_depth=6, seed=0):
+    """
+    Train the same configuration single-process and distributed with each
+    worker count.
+
+    Returns:
+        list: One result dict per mode, single-process first
+    """
+    import copy
+    import xgboost as xgb
+    from sklearn.metrics import mean_squared_error
+    from boost_model import MicroLoanRiskModelAdvanced
+    from distributed import fit_distributed
+    from external_memory import DEFAULT_PARAMS
+    from synthetic_data import generate_loan_data
+
+    ml_model = MicroLoanRiskModelAdvanced()
+    X, y = ml_model.prepare_features(ml_model.clean_data(generate_loan_data(n_rows, seed), lean=True))
+    X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y)
+    ml_model.model = xgb.XGBRegressor(n_estimators=n_estimators, **dict(DEFAULT_PARAMS, max_depth=max_depth))
+
+    single = copy.deepcopy(ml_model)
+    start = time.perf_counter()
+    single.fit_model(X_train, y_train)
+    single_seconds = time.perf_counter() - start
+    reference = single.model.predict(X_test)
+    results = [{'n_workers': 0, 'mode': 'single process', 'wall_seconds': single_seconds,
+                'train_seconds': single_seconds,
+                'rmse': float(np.sqrt(mean_squared_error(y_test, reference))), 'max_prediction_diff': 0.0}]
+    for n_workers in worker_counts:
+        distributed = copy.deepcopy(ml_model)
+        summary = fit_distributed(distributed, X_train, y_train, n_workers)
+        y_pred = distributed.model.predict(X_test)
+        results.append({
+            'n_workers': n_workers,
+            'mode': f'{n_workers} workers',
+            'wall_seconds': summary['wall_seconds'],
+            'train_seconds': summary['train_seconds'],
+            'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
+            'max_prediction_diff': float(np.abs(y_pred - reference).max()),
+        })
+    for r in results:
+        r['speedup'] = single_seconds / r['train_seconds']
+    return results
+
+
+def print_worker_comparison(results):
+    print(f"\n{'mode':>15} {'wall s':>7} {'train s':>8} {'speedup':>8} {'RMSE':>8} {'max diff':>9}")
+    for r in results:
+        print(f"{r['mode']:>15} {r['wall_seconds']:>7.1f} {r['train_seconds']:>8.1f} {r['speedup']:>8.2f} "
+              f"{r['rmse']:>8.4f} {r['max_prediction_diff']:>9.3f}")
+
+
+def _run_tuning(cpu_budget, n_rows, seed, max_rounds, n_folds):
+    """One Hyperband search with `cpu_budget` cores; runs in its own process."""
+    from boost_model import MicroLoanRiskModelAdvanced
+    from synthetic_data import generate_loan_data
+    from tuning import HalvingSearch
+
+    ml_model = MicroLoanRiskModelAdvanced()
+    X, y = ml_model.prepare_features(ml_model.clean_data(generate_loan_data(n_rows, seed), lean=True))
+    X_train, _, y_train, _ = ml_model.preprocess_data(X, y, feature_encoding='sparse')
+    search = HalvingSearch(max_rounds=max_rounds, min_rounds=max(max_rounds // 27, 1), n_folds=n_folds,
+                           cpu_budget=cpu_budget, xgb_params=ml_model.xgb_params(), log=lambda *a: None)
+    search.fit(X_train, y_train)
+    return {
+        'cpu_budget': cpu_budget,
+        'wall_seconds': search.elapsed_,
+        'cpu_seconds': search.cpu_report_['cpu_seconds'],
+        'utilization': search.cpu_report_['utilization'],
+        'n_trials': len(search.trials_),
+        'best_rmse': search.best_score_,
+    }
+
+
+def compare_tuning_cpus(cpu_budgets, n_rows=50000, seed=0, max_rounds=243, n_folds=3):
+    """
+    Run the same cross-validated Hyperband search with each CPU budget.
+
+    Returns:
+        list: One result dict per budget, with speedup over the first budget
+    """
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for cpu_budget in cpu_budgets:
+        print(f"Tuning with cpu_budget={cpu_budget}...")
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(_run_tuning, (cpu_budget, n_rows, seed, max_rounds, n_folds)))
+    for r in results:
+        r['speedup'] = results[0]['wall_seconds'] / r['wall_seconds']
+    return results
+
+
+def print_tuning_comparison(results):
+    print(f"\n{'cpus':>5} {'wall s':>8} {'speedup':>8} {'CPU util':>9} {'trials':>7} {'best RMSE':>10}")
+    for r in results:
+        print(f"{r['cpu_budget']:>5} {r['wall_seconds']:>8.1f} {r['speedup']:>8.2f} {r['utilization']:>9.0%} "
+              f"{r['n_trials']:>7} {r['best_rmse']:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark training-side options of the risk model')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--countries', type=int, default=300)
+    parser.add_argument('--estimators', type=int, default=200)
+    parser.add_argument('--max-depth', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tuning-cpus', type=int, nargs='+',
+                        help='Also benchmark Hyperband tuning with these CPU budgets')
+    parser.add_argument('--out-of-core', type=int, nargs='+', metavar='CHUNKSIZE',
+                        help='Also compare in-memory and out-of-core training with these chunk sizes')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help='Also compare distributed training with these worker counts')
+    parser.add_argument('--output', default='training_benchmark.json')
+    args = parser.parse_args()
+
+    results = {'feature_encodings': compare_feature_encodings(args.rows, args.countries, args.estimators,
+                                                              args.max_depth, args.seed)}
+    print_encoding_comparison(results['feature_encodings'])
+    if args.out_of_core:
+        results['out_of_core'] = compare_out_of_core(args.out_of_core, n_rows=args.rows,
+                                                     n_estimators=args.estimators, max_depth=args.max_depth,
+                                                     seed=args.seed)
+        print_out_of_core_comparison(results['out_of_core'])
+    if args.workers:
+        results['distributed'] = compare_worker_counts(args.workers, n_rows=args.rows,
+                                                       n_estimators=args.estimators, max_depth=args.max_depth,
+                                                       seed=args.seed)
+        print_worker_comparison(results['distributed'])
+    if args.tuning_cpus:
+        results['tuning'] = compare_tuning_cpus(args.tuning_cpus, n_rows=args.rows, seed=args.seed)
+        print_tuning_comparison(results['tuning'])
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,27 +15,112 @@ The output is a credit score on a 0-100 scale.
 
 import os
 import pickle
+import time
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime
 import xgboost as xgb
-import shap
-from sklearn.model_selection import train_test_split, RandomizedSearchCV, GridSearchCV
 from sklearn.metrics import r2_score, mean_squared_error
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.preprocessing import PowerTransformer, OneHotEncoder
+from inference import CATEGORICAL_FEATURES, FEATURE_ENCODINGS, NUMERIC_FEATURES
+from profiling import profiled
 import warnings
 warnings.filterwarnings('ignore')
 
 
 
-# Set up plotting style
-plt.style.use('ggplot')
-sns.set(style='whitegrid')
+# matplotlib (via reports.py), shap and sklearn.model_selection are imported
+# where they are used, so that loading a model for scoring does not pay for them.
+
+# Columns the training pipeline reads from the export, and their parse dtypes
+FEATURE_COLUMNS = [
+    'sector',
+    'location.country',
+    'location.geo.level',
+    'terms.disbursal_currency',
+    'terms.loan_amount',
+    'local_amount',
+    'amount'
+]
+LOAD_COLUMNS = FEATURE_COLUMNS + ['status', 'terms.disbursal_date']
+LOAD_DTYPES = {
+    'sector': 'category',
+    'location.country': 'category',
+    'location.geo.level': 'category',
+    'terms.disbursal_currency': 'category',
+    'terms.loan_amount': 'float64',
+    'local_amount': 'float64',
+    'amount': 'float64',
+    'status': str,
+}
+
+# Global SHAP explanations, cached per model version and sampled data (see explain_global)
+SHAP_CACHE_DIR = os.environ.get(
+    'SHAP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.shap_cache')
+)
+
+def _data_fingerprint(X):
+    """Short content hash of processed data (DataFrame, CSR matrix or array)."""
+    import hashlib
+    digest = hashlib.sha256()
+    if hasattr(X, 'iloc'):
+        digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+        digest.update(','.join(map(str, X.columns)).encode())
+    elif hasattr(X, 'indptr'):
+        for array in (X.data, X.indices, X.indptr):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    else:
+        digest.update(np.ascontiguousarray(X).tobytes())
+    digest.update(str(X.shape).encode())
+    return digest.hexdigest()[:12]
+
+def _nan_columns(X):
+    """Names (or indices, for sparse matrices) of columns containing NaN."""
+    if hasattr(X, 'columns'):
+        return X.columns[X.isna().any()].tolist()
+    return sorted(set(X.indices[np.isnan(X.data)].tolist()))
+
+class CategoryEncoder(BaseEstimator, TransformerMixin):
+    """
+    Cast each column to a pandas `category` with the categories seen in fit
+    (or the given `categories`, one list per column). Unseen values become
+    NaN, which XGBoost treats as missing.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = categories
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        if self.categories is not None:
+            self.categories_ = [sorted(str(c) for c in cats) for cats in self.categories]
+        else:
+            self.categories_ = [sorted(X[col].dropna().astype(str).unique()) for col in X.columns]
+        return self
+
+    def transform(self, X):
+        X = pd.DataFrame(X, columns=None if hasattr(X, 'columns') else self.feature_names_in_)
+        encoded = {}
+        for col, cats in zip(self.feature_names_in_, self.categories_):
+            values = X[col].astype(str)
+            encoded[col] = pd.Categorical(values.where(values.isin(cats)), categories=cats)
+        return pd.DataFrame(encoded, index=X.index)
+
+    def get_feature_names_out(self, input_features=None):
+        return self.feature_names_in_
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
 
 class MicroLoanRiskModelAdvanced:
     def __init__(self):
@@ -45,28 +130,108 @@ class MicroLoanRiskModelAdvanced:
         self.feature_names = None
         self.model_metrics = {}
         self.calibration = None  # Could hold any calibration info if used
+        self.feature_encoding = 'onehot'
+        self.processed_feature_names = None
+        self.explainer_version = None
+        self.global_explanations = None
+
+    @profiled('load')
+    def load_data(self, filepath='loan_data.csv', encoding='latin1', usecols='model', chunksize=None):
+        """
+        Load the loan data file.
+
+        By default only the columns the pipeline uses (the 7 features, `status`
+        and `terms.disbursal_date`) are parsed, with explicit dtypes: the
+        categorical features as `category` and the amounts as float64. This
+        cuts parse time and memory several-fold on the full export, and
+        clean_data produces the same result as with a full read. The pyarrow
+        CSV engine is used when pyarrow is installed.
+
+        Args:
+            filepath: Path to the CSV export
+            encoding: File encoding
+            usecols: 'model' for the pipeline columns, None for every column,
+                or an explicit list of column names
+            chunksize: If set, stream the file in chunks of this many rows and
+                keep only resolved ('paid' / 'defaulted') loans from each chunk
+                before accumulating, so peak memory follows the resolved rows
+                rather than the whole file. Uses the C engine.
 
-    def load_data(self, filepath='loan_data.csv', encoding='latin1'):
-        """Load the loan data file."""
+        Returns:
+            DataFrame with the loaded rows
+        """
         print(f"Loading data from {filepath}...")
         try:
             if not os.path.exists(filepath):
                 raise FileNotFoundError(f"File {filepath} not found.")
             else:
-                df = pd.read_csv(filepath, encoding=encoding, low_memory=False)
-                print(f"Data loaded with {df.shape[0]} rows and {df.shape[1]} columns")
+                start = time.perf_counter()
+                if usecols is None:
+                    read_kwargs = {'low_memory': False}
+                else:
+                    wanted = LOAD_COLUMNS if usecols == 'model' else list(usecols)
+                    header = pd.read_csv(filepath, encoding=encoding, nrows=0).columns
+                    columns = [col for col in wanted if col in header]
+                    read_kwargs = {'usecols': columns,
+                                   'dtype': {col: LOAD_DTYPES[col] for col in columns if col in LOAD_DTYPES}}
+
+                try:
+                    df = self._read_csv(filepath, encoding, read_kwargs, chunksize)
+                except ValueError:
+                    # Unparseable amounts: let the parser infer them and clean_data coerce
+                    dtype = read_kwargs.get('dtype', {})
+                    read_kwargs['dtype'] = {col: t for col, t in dtype.items() if t != 'float64'}
+                    df = self._read_csv(filepath, encoding, read_kwargs, chunksize)
+
+                print(f"Data loaded with {df.shape[0]} rows and {df.shape[1]} columns "
+                      f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB in "
+                      f"{time.perf_counter() - start:.1f}s)")
                 return df
         except Exception as e:
             raise Exception(f"Error loading data: {str(e)}")
 
-    def clean_data(self, df):
+    def _read_csv(self, filepath, encoding, read_kwargs, chunksize):
+        """Read the CSV whole (pyarrow engine if available) or in status-filtered chunks."""
+        if chunksize is None:
+            engine = 'pyarrow' if _has_pyarrow() and 'usecols' in read_kwargs else 'c'
+            return pd.read_csv(filepath, encoding=encoding, engine=engine, **read_kwargs)
+
+        chunks = []
+        for chunk in pd.read_csv(filepath, encoding=encoding, chunksize=chunksize, **read_kwargs):
+            if 'status' in chunk.columns:
+                chunk = chunk[chunk['status'].isin(['paid', 'defaulted'])]
+            chunks.append(chunk)
+        if not chunks:
+            return pd.read_csv(filepath, encoding=encoding, nrows=0, **read_kwargs)
+        # Chunks infer their own category sets; merge them so the columns stay categorical
+        categorical = [col for col in chunks[0].columns if isinstance(chunks[0][col].dtype, pd.CategoricalDtype)]
+        merged = {col: union_categoricals([chunk[col] for chunk in chunks]) for col in categorical}
+        df = pd.concat(chunks)
+        for col, values in merged.items():
+            df[col] = values
+        return df
+
+    @profiled('clean')
+    def clean_data(self, df, lean=False, fill_values=None):
         """
         Perform minimal cleaning:
           - Convert date columns to datetime.
           - Create the target variable: map status "paid" -> 100 and "defaulted" -> 0.
           - Ensure key numeric columns are numeric and fill missing values.
           - Convert selected categorical columns to strings.
+
+        Args:
+            df: Raw loan DataFrame (as returned by load_data)
+            lean: Use the low-memory path for large datasets (see _clean_data_lean).
+                Keeps only the pipeline columns and returns the categorical
+                features as `category`; the values are otherwise identical.
+            fill_values: Lean path only: {column: value} used for missing
+                amounts instead of this frame's medians, so that chunks of one
+                file are filled alike (see external_memory.py)
         """
+        if lean:
+            return self._clean_data_lean(df, fill_values)
+
         df_clean = df.copy()
 
         # Convert disbursal date if available
@@ -86,7 +251,9 @@ class MicroLoanRiskModelAdvanced:
         for col in numeric_cols:
             if col in df_clean.columns:
                 df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
-                df_clean[col].fillna(df_clean[col].median(), inplace=True)
+                # Assign rather than fillna(inplace=True): under copy-on-write the
+                # chained inplace call silently leaves the NaNs in place
+                df_clean[col] = df_clean[col].fillna(df_clean[col].median())
 
         # Convert selected categorical columns to string and fill missing with 'Unknown'
         categorical_cols = ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency']
@@ -96,6 +263,56 @@ class MicroLoanRiskModelAdvanced:
 
         return df_clean
 
+    def _clean_data_lean(self, df, fill_values=None):
+        """
+        clean_data for tens of millions of rows. Instead of copying the whole
+        raw frame and building Python strings per categorical column, this
+          - filters rows and selects the pipeline columns in one step, which is
+            the only copy made,
+          - coerces the numeric columns and computes all medians in one pass,
+          - encodes the categorical features as `category` (integer codes plus
+            one small string table) with missing values as 'Unknown'.
+        """
+        columns = [col for col in df.columns if col in LOAD_COLUMNS]
+
+        if 'status' in df.columns:
+            resolved = df['status'].isin(['paid', 'defaulted']).to_numpy()
+            df_clean = df.loc[resolved, columns]
+            paid = (df_clean['status'] == 'paid').to_numpy()
+            df_clean['score'] = np.where(paid, 100, 0).astype(np.int64)
+        else:
+            df_clean = df[columns]
+
+        if 'terms.disbursal_date' in df_clean.columns:
+            df_clean['terms.disbursal_date'] = pd.to_datetime(
+                df_clean['terms.disbursal_date'], format='%Y%m%d', errors='coerce'
+            )
+
+        numeric_cols = [col for col in ['terms.loan_amount', 'local_amount', 'amount'] if col in df_clean.columns]
+        if numeric_cols:
+            numeric = df_clean[numeric_cols].apply(pd.to_numeric, errors='coerce')
+            df_clean[numeric_cols] = numeric.fillna(numeric.median() if fill_values is None
+                                                    else pd.Series(fill_values, dtype='float64'))
+
+        categorical_cols = ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency']
+        for col in categorical_cols:
+            if col not in df_clean.columns:
+                continue
+            values = df_clean[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype('category')
+            if not all(isinstance(c, str) for c in values.cat.categories):
+                # Match astype(str) for non-string labels (numbers, booleans)
+                values = values.cat.rename_categories([str(c) for c in values.cat.categories])
+            if values.isna().any():
+                if 'Unknown' not in values.cat.categories:
+                    values = values.cat.add_categories(['Unknown'])
+                values = values.fillna('Unknown')
+            df_clean[col] = values
+
+        return df_clean
+
+    @profiled('prepare')
     def prepare_features(self, df):
         """
         Select the fixed set of features (without additional feature engineering)
@@ -118,37 +335,75 @@ class MicroLoanRiskModelAdvanced:
         y = df['score']  # score is our continuous target from 0-100
         return X, y
 
-    def preprocess_data(self, X, y, test_size=0.3, random_state=42):
+    def build_preprocessor(self, feature_encoding='onehot', categories=None):
         """
-        Use an advanced preprocessing pipeline. In this example, we:
-          - Identify numeric and categorical columns.
-          - For numeric columns: impute missing values (median) then apply a power transform.
-          - For categorical columns: impute missing values and one-hot encode them.
-          - Combine these with ColumnTransformer.
-        """
-        print("Preprocessing data...")
-
-        # Define our fixed column types based on our features
-        numeric_cols = ['terms.loan_amount', 'local_amount', 'amount']
-        categorical_cols = ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency']
+        Build the (unfitted) ColumnTransformer for a feature encoding:
+        median imputation and a Yeo-Johnson power transform for the numeric
+        columns; constant imputation and one-hot or category encoding for the
+        categorical columns.
 
+        Args:
+            feature_encoding: 'onehot', 'sparse' or 'native' (see preprocess_data)
+            categories: Optional list of category lists, one per categorical
+                column, to fix the encoding instead of learning it in fit
+        """
         # Create pipelines for numeric and categorical data.
         numeric_transformer = Pipeline(steps=[
             ('imputer', SimpleImputer(strategy='median')),
             ('power', PowerTransformer(method='yeo-johnson', standardize=True))
         ])
-        categorical_transformer = Pipeline(steps=[
-            ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
-            ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
-        ])
+        if feature_encoding == 'native':
+            categorical_transformer = Pipeline(steps=[
+                ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+                ('categories', CategoryEncoder(categories=categories))
+            ])
+        else:
+            categorical_transformer = Pipeline(steps=[
+                ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+                ('onehot', OneHotEncoder(categories=categories or 'auto', handle_unknown='ignore',
+                                         sparse_output=feature_encoding == 'sparse'))
+            ])
 
         # Combine transformers using ColumnTransformer
-        self.preprocessor = ColumnTransformer(transformers=[
-            ('num', numeric_transformer, numeric_cols),
-            ('cat', categorical_transformer, categorical_cols)
-        ])
+        preprocessor = ColumnTransformer(transformers=[
+            ('num', numeric_transformer, NUMERIC_FEATURES),
+            ('cat', categorical_transformer, CATEGORICAL_FEATURES)
+        ], sparse_threshold=1.0 if feature_encoding == 'sparse' else 0.0,
+           verbose_feature_names_out=feature_encoding != 'native')
+        if feature_encoding == 'native':
+            # Keep the category dtype through the ColumnTransformer
+            preprocessor.set_output(transform='pandas')
+        return preprocessor
+
+    @profiled('preprocess')
+    def preprocess_data(self, X, y, test_size=0.3, random_state=42, feature_encoding='onehot'):
+        """
+        Use an advanced preprocessing pipeline. In this example, we:
+          - Identify numeric and categorical columns.
+          - For numeric columns: impute missing values (median) then apply a power transform.
+          - For categorical columns: impute missing values and one-hot encode them.
+          - Combine these with ColumnTransformer.
+
+        Args:
+            X, y: Features and target from prepare_features
+            test_size, random_state: Train/test split parameters
+            feature_encoding: How the categorical columns reach XGBoost:
+                'onehot' - dense one-hot DataFrames (the original layout)
+                'sparse' - the same one-hot columns as scipy CSR matrices; XGBoost
+                           treats the absent zeros as missing
+                'native' - one pandas `category` column per feature, trained with
+                           XGBoost's enable_categorical (no one-hot expansion)
+        """
+        if feature_encoding not in FEATURE_ENCODINGS:
+            raise ValueError(f"Unknown feature encoding: {feature_encoding}. Use one of {FEATURE_ENCODINGS}")
+        print("Preprocessing data...")
+        self.feature_encoding = feature_encoding
+
+        numeric_cols, categorical_cols = NUMERIC_FEATURES, CATEGORICAL_FEATURES
+        self.preprocessor = self.build_preprocessor(feature_encoding)
 
         # Split into training and testing sets
+        from sklearn.model_selection import train_test_split
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=test_size, random_state=random_state, stratify=y
         )
@@ -156,6 +411,12 @@ class MicroLoanRiskModelAdvanced:
         # Fit preprocessor on training data and transform both train and test data
         X_train_proc = self.preprocessor.fit_transform(X_train)
         X_test_proc = self.preprocessor.transform(X_test)
+
+        if feature_encoding == 'native':
+            self.processed_feature_names = numeric_cols + categorical_cols
+            X_train_proc.index, X_test_proc.index = X_train.index, X_test.index
+            self.X_train_proc_df = X_train_proc.copy()
+            return X_train_proc, X_test_proc, y_train, y_test
         
         # Get feature names from ColumnTransformer:
         # For numeric, names are the same.
@@ -164,6 +425,15 @@ class MicroLoanRiskModelAdvanced:
         cat_features = list(self.preprocessor.named_transformers_['cat'].
                             named_steps['onehot'].get_feature_names_out(categorical_cols))
         final_features = num_features + cat_features
+        self.processed_feature_names = final_features
+
+        if feature_encoding == 'sparse':
+            X_train_proc, X_test_proc = X_train_proc.tocsr(), X_test_proc.tocsr()
+            # Only a dense background sample is kept for SHAP; absent entries are missing
+            background = X_train_proc[:100].toarray()
+            background[background == 0] = np.nan
+            self.X_train_proc_df = pd.DataFrame(background, columns=final_features, index=X_train.index[:100])
+            return X_train_proc, X_test_proc, y_train, y_test
         
         # Convert processed data back to DataFrames for convenience
         X_train_proc_df = pd.DataFrame(X_train_proc, columns=final_features, index=X_train.index)
@@ -173,24 +443,93 @@ class MicroLoanRiskModelAdvanced:
         
         return X_train_proc_df, X_test_proc_df, y_train, y_test
 
-    def tune_model(self, X_train, y_train):
+    def transform_features(self, X):
+        """
+        Apply the fitted preprocessor to raw features, returning the same
+        container preprocess_data produced for training (DataFrame or CSR).
+        """
+        X_proc = self.preprocessor.transform(X)
+        feature_encoding = getattr(self, 'feature_encoding', 'onehot')
+        if feature_encoding == 'sparse':
+            return X_proc.tocsr()
+        if feature_encoding == 'native':
+            X_proc.index = X.index
+            return X_proc
+        columns = self.processed_feature_names
+        if columns is None:
+            columns = list(self.model.feature_names_in_)
+        return pd.DataFrame(X_proc, columns=columns, index=X.index)
+
+    def xgb_params(self):
+        """Extra XGBRegressor parameters required by the active feature encoding."""
+        if getattr(self, 'feature_encoding', 'onehot') == 'native':
+            return {'enable_categorical': True}
+        return {}
+
+    @profiled('fit')
+    def fit_model(self, X_train, y_train):
+        """Fit self.model, naming the booster's features when they come in as a CSR matrix."""
+        self.model.fit(X_train, y_train)
+        if getattr(self, 'feature_encoding', 'onehot') == 'sparse':
+            self.model.get_booster().feature_names = list(self.processed_feature_names)
+        return self.model
+
+    def adopt_booster(self, booster, params):
         """
-        Tune the XGBoost regressor using an initial RandomizedSearchCV
-        followed by a focused GridSearchCV.
+        Install a booster trained with xgb.train (out of core, distributed) as
+        self.model: an XGBRegressor with the same parameters, so predict,
+        save_model and compile_scorer work as after fit_model.
         """
+        params = {k: v for k, v in params.items() if k not in ('nthread', 'enable_categorical')}
+        seed = params.pop('seed', None)
+        self.model = xgb.XGBRegressor(n_estimators=booster.num_boosted_rounds(), random_state=seed,
+                                      **params, **self.xgb_params())
+        self.model.load_model(bytearray(booster.save_raw('ubj')))
+        return self.model
+
+    @profiled('tune')
+    def tune_model(self, X_train, y_train, method='random', time_budget=None, trials_path=None,
+                   resume=False, cpu_budget=None, **search_options):
+        """
+        Tune the XGBoost regressor.
+
+        'halving' and 'hyperband' (opt-in through train_model's `tuning`) run
+        tuning.HalvingSearch: successive halving over boosting rounds or data
+        fraction, early-stopping each trial on a validation fold, within an
+        optional time budget. 'random', the default, is the small
+        RandomizedSearchCV (5 candidates, 2 folds).
+
+        Args:
+            X_train, y_train: Processed training data
+            method: 'random' for RandomizedSearchCV, or 'halving' /
+                'hyperband' for tuning.HalvingSearch with early stopping on a
+                stratified validation fold held out from X_train
+            time_budget: Wall-clock limit in seconds ('halving'/'hyperband')
+            trials_path: JSONL trial log ('halving'/'hyperband')
+            resume: Continue the search recorded in trials_path
+            cpu_budget: Cores the search may use (default: all available)
+            **search_options: Further HalvingSearch arguments (max_rounds, eta,
+                n_folds, ...). With n_folds > 1 trials are scored on
+                cross-validation folds of X_train instead of one held-out fold
+        """
+        if method in ('halving', 'hyperband'):
+            search_options['cpu_budget'] = cpu_budget
+            return self._tune_halving(X_train, y_train, method, time_budget, trials_path, resume, search_options)
+        if method != 'random':
+            raise ValueError(f"Unknown tuning method: {method}")
         print("\n=== Starting Model Tuning ===")
         print(f"Training data shape: {X_train.shape}")
         print(f"Target data shape: {y_train.shape}")
         
         try:
             # Validate input data
-            if X_train.empty or y_train.empty:
+            if X_train.shape[0] == 0 or y_train.empty:
                 raise ValueError("Empty training data provided")
-            if len(X_train) != len(y_train):
-                raise ValueError(f"Mismatched data shapes: X_train ({len(X_train)}) != y_train ({len(y_train)})")
+            if X_train.shape[0] != len(y_train):
+                raise ValueError(f"Mismatched data shapes: X_train ({X_train.shape[0]}) != y_train ({len(y_train)})")
             
             # Check for NaN values
-            nan_cols = X_train.columns[X_train.isna().any()].tolist()
+            nan_cols = _nan_columns(X_train)
             if nan_cols:
                 print(f"Warning: Found NaN values in columns: {nan_cols}")
             
@@ -207,15 +546,22 @@ class MicroLoanRiskModelAdvanced:
                 'reg_lambda': [1.0]
             }
             
-            print("\nInitializing XGBoost model...")
+            # Split the cores between parallel CV fits and XGBoost threads per
+            # fit; n_jobs=-1 on both levels oversubscribes the CPU
+            from tuning import available_cpus, plan_threads
+            n_candidates, n_folds = 5, 2
+            search_jobs, xgb_threads = plan_threads(cpu_budget or available_cpus(), n_candidates * n_folds)
+            print(f"\nInitializing XGBoost model ({search_jobs} parallel fits x {xgb_threads} threads)...")
             xgb_model = xgb.XGBRegressor(
                 objective='reg:squarederror',
                 random_state=42,
-                n_jobs=-1,  # Use all available cores
-                tree_method='hist'  # Use histogram-based algorithm for faster training
+                n_jobs=xgb_threads,
+                tree_method='hist',  # Use histogram-based algorithm for faster training
+                **self.xgb_params()
             )
             
             # First, RandomizedSearchCV for a broad search
+            from sklearn.model_selection import RandomizedSearchCV
             print("\n=== Starting RandomizedSearchCV ===")
             print(f"Number of iterations: 5")  # Reduced from 20
             print(f"Cross-validation folds: 2")  # Reduced from 3
@@ -223,10 +569,10 @@ class MicroLoanRiskModelAdvanced:
             random_search = RandomizedSearchCV(
                 estimator=xgb_model,
                 param_distributions=param_grid,
-                n_iter=5,  # Reduced from 20
+                n_iter=n_candidates,  # Reduced from 20
                 scoring='r2',
-                cv=2,  # Reduced from 3
-                n_jobs=-1,
+                cv=n_folds,  # Reduced from 3
+                n_jobs=search_jobs,
                 verbose=2,
                 random_state=42
             )
@@ -251,6 +597,7 @@ class MicroLoanRiskModelAdvanced:
                 objective='reg:squarederror',
                 random_state=42,
                 tree_method='hist',  # Use histogram-based algorithm
+                **self.xgb_params(),
                 **best_params
             )
             
@@ -260,20 +607,69 @@ class MicroLoanRiskModelAdvanced:
             print(f"\n!!! Error during model tuning: {str(e)}")
             raise
 
-    def train_model(self, X_train, y_train, X_test, y_test):
-        """Train the model with the refined hyperparameters and evaluate performance."""
+    def _tune_halving(self, X_train, y_train, method, time_budget, trials_path, resume, search_options):
+        """Successive-halving / Hyperband tuning; sets self.model with the best parameters and rounds."""
+        from sklearn.model_selection import train_test_split
+        from tuning import HalvingSearch
+
+        print(f"\n=== Starting Model Tuning ({method}) ===")
+        print(f"Training data shape: {X_train.shape}")
+        if X_train.shape[0] == 0 or X_train.shape[0] != len(y_train):
+            raise ValueError("Empty or mismatched training data provided")
+
+        search = HalvingSearch(method=method, time_budget=time_budget, trials_path=trials_path,
+                               resume=resume, xgb_params=self.xgb_params(), **search_options)
+        if search.n_folds > 1:
+            search.fit(X_train, y_train)
+        else:
+            X_fit, X_valid, y_fit, y_valid = train_test_split(
+                X_train, y_train, test_size=0.2, random_state=42, stratify=y_train
+            )
+            search.fit(X_fit, y_fit, X_valid, y_valid)
+
+        self.tuning_summary = {
+            'method': method,
+            'best_params': search.best_params_,
+            'best_rounds': search.best_rounds_,
+            'validation_rmse': search.best_score_,
+            'n_trials': len(search.trials_),
+            'seconds': search.elapsed_,
+            'timed_out': search.timed_out_,
+            'cpu': search.cpu_report_,
+        }
+        print(f"Best parameters: {search.best_params_}")
+        self.model = xgb.XGBRegressor(
+            objective='reg:squarederror',
+            random_state=42,
+            tree_method='hist',
+            n_estimators=search.best_rounds_,
+            **self.xgb_params(),
+            **search.best_params_
+        )
+        print("\n=== Model Tuning Completed Successfully ===")
+
+    @profiled('train')
+    def train_model(self, X_train, y_train, X_test, y_test, n_workers=1):
+        """
+        Train the model with the refined hyperparameters and evaluate performance.
+
+        Args:
+            X_train, y_train, X_test, y_test: Processed data from preprocess_data
+            n_workers: With more than 1, train data-parallel across this many
+                localhost worker processes (see distributed.py)
+        """
         print("\n=== Starting Final Model Training ===")
         try:
             # Validate input data
-            if X_train.empty or y_train.empty or X_test.empty or y_test.empty:
+            if X_train.shape[0] == 0 or y_train.empty or X_test.shape[0] == 0 or y_test.empty:
                 raise ValueError("Empty training or test data provided")
             
-            if len(X_train) != len(y_train) or len(X_test) != len(y_test):
+            if X_train.shape[0] != len(y_train) or X_test.shape[0] != len(y_test):
                 raise ValueError("Mismatched data shapes in training or test sets")
             
             # Check for NaN values
-            train_nan_cols = X_train.columns[X_train.isna().any()].tolist()
-            test_nan_cols = X_test.columns[X_test.isna().any()].tolist()
+            train_nan_cols = _nan_columns(X_train)
+            test_nan_cols = _nan_columns(X_test)
             if train_nan_cols or test_nan_cols:
                 print(f"Warning: Found NaN values in columns:")
                 if train_nan_cols:
@@ -289,7 +685,11 @@ class MicroLoanRiskModelAdvanced:
             
             # Train the model
             print("\nFitting final model...")
-            self.model.fit(X_train, y_train)
+            if n_workers > 1:
+                from distributed import fit_distributed
+                self.distributed_summary = fit_distributed(self, X_train, y_train, n_workers)
+            else:
+                self.fit_model(X_train, y_train)
             
             # Make predictions
             print("\nMaking predictions...")
@@ -322,46 +722,264 @@ class MicroLoanRiskModelAdvanced:
             }).sort_values('Importance', ascending=False)
             print(feature_importance.head())
             
-            # Plot feature importance
-            print("\nGenerating feature importance plot...")
-            self.plot_feature_importance()
-            
+            # Plots are rendered from the saved model by reports.py
             print("\n=== Model Training Completed Successfully ===")
             
         except Exception as e:
             print(f"\n!!! Error during model training: {str(e)}")
             raise
 
-    def plot_feature_importance(self):
-        """Plot and save feature importance using SHAP values."""
+    @profiled('update')
+    def update_model(self, X_new, y_new, max_rounds=50, early_stopping_rounds=10, holdout_size=0.2,
+                     validation_size=0.2, random_state=42, force=False):
+        """
+        Continue boosting the trained model on newly resolved loans, without
+        refitting the preprocessor or revisiting the training history.
+
+        The new loans go through the fitted preprocessor (unseen categories
+        become all-zero one-hot rows or missing native categories). They are
+        split three ways (stratified): the extra rounds are fit on one part,
+        early-stopped on a validation part, and the model is scored before and
+        after the update on a holdout that early stopping never saw, so the
+        keep/apply decision is not biased towards the update.
+
+        Args:
+            X_new, y_new: Raw features and targets of the new loans (see
+                prepare_features)
+            max_rounds: Upper bound on boosting rounds added
+            early_stopping_rounds: Stop after this many rounds without
+                validation improvement
+            holdout_size: Share of the new loans held out for evaluation
+            validation_size: Share of the new loans used for early stopping
+            random_state: Split seed
+            force: Apply the update even if it worsens holdout RMSE (by
+                default the current model is kept in that case)
+
+        Returns:
+            dict: Update summary (rows, rounds, unseen categories,
+            before/after holdout metrics and whether it was applied); applied
+            updates are appended to model_metrics['updates']
+        """
+        if self.model is None or self.preprocessor is None:
+            raise ValueError("Model not trained.")
+        if len(X_new) == 0 or len(X_new) != len(y_new):
+            raise ValueError("Empty or mismatched update data provided")
+        print(f"\n=== Updating Model with {len(X_new)} New Loans ===")
+        start = time.perf_counter()
+
+        unseen = self._unseen_categories(X_new)
+        for col, values in unseen.items():
+            print(f"Unseen categories in {col}: {values[:10]}{' ...' if len(values) > 10 else ''}")
+
+        from sklearn.model_selection import train_test_split
+
+        def split(X, y, size):
+            try:
+                return train_test_split(X, y, test_size=size, random_state=random_state, stratify=y)
+            except ValueError:
+                return train_test_split(X, y, test_size=size, random_state=random_state)
+
+        X_rest, X_hold, y_rest, y_hold = split(X_new, y_new, holdout_size)
+        X_fit, X_val, y_fit, y_val = split(X_rest, y_rest, validation_size / (1.0 - holdout_size))
+        X_fit_proc, X_val_proc = self.transform_features(X_fit), self.transform_features(X_val)
+        X_hold_proc = self.transform_features(X_hold)
+
+        def holdout_metrics(model):
+            y_pred = model.predict(X_hold_proc)
+            return {'r2_score': float(r2_score(y_hold, y_pred)),
+                    'rmse': float(np.sqrt(mean_squared_error(y_hold, y_pred)))}
+
+        before = holdout_metrics(self.model)
+        booster = self.model.get_booster()
+        base_rounds = booster.num_boosted_rounds()
+        best_iteration = getattr(self.model, 'best_iteration', None)
+        if best_iteration is not None and best_iteration + 1 < base_rounds:
+            # Continue from the trees the model actually uses
+            booster = booster[:best_iteration + 1]
+            base_rounds = best_iteration + 1
+        if getattr(self, 'feature_encoding', 'onehot') == 'sparse':
+            # CSR input carries no feature names; fit_model restores them afterwards
+            booster = booster.copy()
+            booster.feature_names = None
+
+        params = dict(self.model.get_params(), n_estimators=max_rounds,
+                      early_stopping_rounds=early_stopping_rounds)
+        updated = xgb.XGBRegressor(**params)
+        updated.fit(X_fit_proc, y_fit, eval_set=[(X_val_proc, y_val)], xgb_model=booster, verbose=False)
+        if getattr(self, 'feature_encoding', 'onehot') == 'sparse':
+            updated.get_booster().feature_names = list(self.processed_feature_names)
+        after = holdout_metrics(updated)
+
+        summary = {
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'n_new': len(y_new),
+            'n_validation': len(y_val),
+            'n_holdout': len(y_hold),
+            'base_rounds': base_rounds,
+            'rounds_added': updated.best_iteration + 1 - base_rounds,
+            'unseen_categories': {col: len(values) for col, values in unseen.items()},
+            'before': before,
+            'after': after,
+            'applied': force or after['rmse'] <= before['rmse'],
+            'seconds': time.perf_counter() - start,
+        }
+        print(f"Trained {summary['rounds_added']} rounds on top of {base_rounds} in {summary['seconds']:.2f}s")
+        print(f"Holdout R²: {before['r2_score']:.4f} -> {after['r2_score']:.4f}, "
+              f"RMSE: {before['rmse']:.4f} -> {after['rmse']:.4f}")
+        if not summary['applied']:
+            print("Update worsened holdout RMSE; keeping the current model")
+            return summary
+
+        # The early stopping and round budget belong to this update only; a
+        # later fit of the kept regressor (without an eval_set) must not inherit them
+        updated.set_params(early_stopping_rounds=None, n_estimators=self.model.get_params()['n_estimators'])
+        self.model = updated
+        self.model_metrics['n_samples'] = self.model_metrics.get('n_samples', 0) + len(y_new)
+        self.model_metrics.setdefault('updates', []).append(summary)
+        print("\n=== Model Update Completed Successfully ===")
+        return summary
+
+    def _unseen_categories(self, X):
+        """{column: [values]} of categorical values the fitted preprocessor has not seen."""
+        cat = self.preprocessor.named_transformers_['cat']
+        encoder = cat.named_steps['categories' if getattr(self, 'feature_encoding', 'onehot') == 'native'
+                                  else 'onehot']
+        columns = self.preprocessor.transformers_[1][2]
+        unseen = {}
+        for col, known in zip(columns, encoder.categories_):
+            values = pd.Series(X[col]).dropna().astype(str)
+            new = sorted(set(values.unique()) - set(known))
+            if new:
+                unseen[col] = new
+        return unseen
+
+    @profiled('plot')
+    def plot_feature_importance(self, output_dir=None):
+        """
+        Plot and save XGBoost's built-in feature importances to
+        feature_importance.png in `output_dir` (default reports.REPORT_DIR).
+        SHAP-based global importances come from explain_global(). Training
+        no longer calls this; reports.py renders all plots from the saved model.
+        """
+        from reports import REPORT_DIR, plot_importance
         print("Plotting feature importance...")
-        # Use SHAP to explain model predictions
-        self.setup_explainer()
-        shap_values = self.explainer.shap_values(self.X_train_proc_df)
-        # For simplicity, use XGBoost's built-in feature importance here.
-        importance = self.model.feature_importances_
-        features = self.model.feature_names_in_
-        importance_df = pd.DataFrame({'Feature': features, 'Importance': importance}).sort_values('Importance', ascending=False)
-        plt.figure(figsize=(12, 10))
-        sns.barplot(x='Importance', y='Feature', data=importance_df.head(20), palette='viridis')
-        plt.title('Top 20 Feature Importances', fontsize=16)
-        plt.xlabel('Importance', fontsize=14)
-        plt.ylabel('Feature', fontsize=14)
-        plt.tight_layout()
-        plt.savefig('feature_importance.png', dpi=300)
-        plt.close()
-        print("Feature importance saved to 'feature_importance.png'")
+        output_dir = output_dir or REPORT_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        importance = dict(zip(self.model.feature_names_in_, self.model.feature_importances_.astype(float)))
+        path = plot_importance(importance, os.path.join(output_dir, 'feature_importance.png'),
+                               'Top 20 Feature Importances')
+        print(f"Feature importance saved to '{path}'")
+        return path
+
+    def model_version(self):
+        """
+        Content hash of the booster and the fitted preprocessing parameters
+        (CompiledScorer.content_version): identical models share a version in
+        any process, and it equals the version of their inference artifact.
+        """
+        try:
+            return self.compile_scorer().content_version()
+        except (AttributeError, ValueError):
+            # Preprocessor layout the scorer cannot read; pickles of it are not stable, so hash the booster alone
+            import hashlib
+            return hashlib.sha256(bytes(self.model.get_booster().save_raw('ubj'))).hexdigest()[:16]
+
+    @profiled('shap_values')
+    def explain_global(self, X, y=None, sample_size=2000, random_state=42, cache_dir=None):
+        """
+        Global SHAP explanation of the model on a sample of processed data.
+
+        SHAP values are XGBoost's exact path-dependent TreeSHAP
+        (pred_contribs), computed on at most `sample_size` rows drawn
+        stratified by `y`, and cached on disk keyed by the model version and a
+        hash of the sampled rows, so repeated calls on the same data (and
+        retrains that produce the same model) reuse them.
+
+        Args:
+            X: Processed data, e.g. X_train from preprocess_data
+            y: Targets to stratify the sample by (optional)
+            sample_size: Rows to explain
+            random_state: Sampling seed
+            cache_dir: Cache directory (default SHAP_CACHE_DIR)
+
+        Returns:
+            dict: model_version, sample_size, features, mean_abs_shap
+            ({feature: mean |SHAP|}, largest first) and whether it was cached;
+            also stored as self.global_explanations
+        """
+        cache_dir = cache_dir or SHAP_CACHE_DIR
+        version = self.model_version()
+        size = min(sample_size, X.shape[0])
+        rows = np.arange(X.shape[0])
+        if size < X.shape[0]:
+            from sklearn.model_selection import train_test_split
+            try:
+                rows, _ = train_test_split(rows, train_size=size, random_state=random_state, stratify=y)
+            except ValueError:
+                rows, _ = train_test_split(rows, train_size=size, random_state=random_state)
+            rows = np.sort(rows)
+        sample = X.iloc[rows] if hasattr(X, 'iloc') else X[rows]
+
+        path = os.path.join(cache_dir, f'{version}-{_data_fingerprint(sample)}-{size}-{random_state}.npz')
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as cached:
+                features, mean_abs = list(cached['features']), cached['mean_abs_shap']
+            print(f"Loaded SHAP explanations of model {version} from {path}")
+            return self._store_global_explanations(version, size, features, mean_abs, cached=True)
+
+        print(f"Computing SHAP values on {size} sampled rows...")
+        start = time.perf_counter()
+        booster = self.model.get_booster()
+        data = xgb.DMatrix(sample, enable_categorical=getattr(self, 'feature_encoding', 'onehot') == 'native')
+        iteration_range = (0, self.model.best_iteration + 1) if hasattr(self.model, 'best_iteration') else (0, 0)
+        contribs = booster.predict(data, pred_contribs=True, iteration_range=iteration_range,
+                                   validate_features=False)
+        features = list(self.processed_feature_names or self.model.feature_names_in_)
+        mean_abs = np.abs(contribs[:, :-1]).mean(axis=0)
+        print(f"SHAP values computed in {time.perf_counter() - start:.2f}s")
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, shap_values=contribs[:, :-1].astype(np.float32), base_values=contribs[:, -1],
+                 rows=rows, features=np.array(features, dtype=str), mean_abs_shap=mean_abs)
+        os.replace(tmp_path, path)
+        return self._store_global_explanations(version, size, features, mean_abs, cached=False)
+
+    def _store_global_explanations(self, version, size, features, mean_abs, cached):
+        order = np.argsort(-mean_abs, kind='stable')
+        self.global_explanations = {
+            'model_version': version,
+            'sample_size': int(size),
+            'features': list(features),
+            'mean_abs_shap': {features[i]: float(mean_abs[i]) for i in order},
+            'cached': cached,
+        }
+        self.model_metrics['shap_importance'] = self.global_explanations['mean_abs_shap']
+        return self.global_explanations
 
+    @profiled('shap')
     def setup_explainer(self):
-        """Initialize SHAP explainer using a background sample from processed training data."""
+        """
+        Initialize SHAP explainer using a background sample from processed
+        training data. Reused while the model version is unchanged.
+        """
+        version = self.model_version()
+        if self.explainer is not None and getattr(self, 'explainer_version', None) == version:
+            print("Reusing SHAP explainer")
+            return
         print("Setting up SHAP explainer...")
         # <<-- ADDED: Use a sample of the processed training data as background for SHAP -->> 
         if hasattr(self, 'X_train_proc_df'):
             X_sample = self.X_train_proc_df.head(100)
         else:
             raise ValueError("Processed training data not available. Run preprocess_data first.")
-        self.explainer = shap.TreeExplainer(self.model, data=X_sample)
-        return
+        import shap
+        if getattr(self, 'feature_encoding', 'onehot') == 'native':
+            # Interventional SHAP cannot follow categorical splits; use the tree paths instead
+            self.explainer = shap.TreeExplainer(self.model)
+        else:
+            self.explainer = shap.TreeExplainer(self.model, data=X_sample)
+        self.explainer_version = version
 
 
     def predict(self, X_new):
@@ -414,6 +1032,16 @@ class MicroLoanRiskModelAdvanced:
         
         return predictions
 
+    def compile_scorer(self):
+        """
+        Build a pandas-free CompiledScorer from the fitted preprocessor and booster.
+        Its predictions match predict() but skip DataFrame construction and the
+        ColumnTransformer, which dominate single-row latency.
+        """
+        from inference import CompiledScorer
+        return CompiledScorer.from_model(self)
+
+    @profiled('save_model')
     def save_model(self, filepath='microloan_risk_model_advanced.pkl'):
         """Save the model and preprocessing objects."""
         # Save both the components dictionary and the instance itself
@@ -430,6 +1058,28 @@ class MicroLoanRiskModelAdvanced:
         print(f"Model saved to {filepath}")
         print("The model instance has been saved, which will make future predictions simpler.")
 
+    @profiled('save_artifact')
+    def save_inference_artifact(self, dirpath='microloan_risk_model_advanced', booster_format='ubj'):
+        """
+        Save a lean inference artifact (native booster + preprocessing arrays +
+        manifest) that loads in milliseconds with inference.load_artifact.
+        The pickle written by save_model remains the full training snapshot.
+        """
+        metadata = {
+            'feature_names': self.feature_names,
+            'tuning_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for key in ('r2_score', 'rmse', 'n_samples'):
+            if key in self.model_metrics:
+                metadata[key] = np.asarray(self.model_metrics[key]).item()
+        # Lets reports.py render the importance plots from the artifact alone
+        for key in ('feature_importance', 'shap_importance'):
+            if key in self.model_metrics:
+                metadata[key] = {str(k): float(v) for k, v in self.model_metrics[key].items()}
+        manifest = self.compile_scorer().save(dirpath, booster_format=booster_format, metadata=metadata)
+        print(f"Inference artifact saved to {dirpath} (version {manifest['model_version']})")
+        return manifest
+
     def load_model(self, filepath='microloan_risk_model_advanced.pkl'):
         """Load a saved model."""
         if not os.path.exists(filepath):
@@ -442,36 +1092,133 @@ class MicroLoanRiskModelAdvanced:
         self.feature_names = model_data['feature_names']
         print(f"Model loaded from {filepath}")
 
-def train_model():
-    """Main training function for Modal deployment"""
-    try:
-        print("Starting model training...")
-        ml_model = MicroLoanRiskModelAdvanced()
-        
-        # Load and clean data
-        df_raw = ml_model.load_data(filepath='loan_data.csv')
-        df_clean = ml_model.clean_data(df_raw)
-        
-        # Prepare features
-        X, y = ml_model.prepare_features(df_clean)
-        
-        # Preprocess data
-        X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y)
-        
-        # Tune and train model
-        ml_model.tune_model(X_train, y_train)
-        ml_model.train_model(X_train, y_train, X_test, y_test)
-        
-        # Setup explainer and save model
-        ml_model.setup_explainer()
-        ml_model.save_model('microloan_risk_model_advanced.pkl')
-        
-        return "Model training completed successfully"
-    except Exception as e:
-        return f"Error during training: {str(e)}"
+# Run report written by train_model() next to the saved model (see profiling.py)
+RUN_REPORT_PATH = 'microloan_risk_model_advanced_run.json'
+
+# Default wall-clock limit of the opt-in halving/Hyperband search, in seconds
+TUNING_TIME_BUDGET = 1800
+
+def train_model(use_cache=True, feature_encoding='onehot', tuning='random', time_budget=TUNING_TIME_BUDGET,
+                trials_path='tuning_trials.jsonl', resume_tuning=False, cpu_budget=None, cv_folds=1,
+                n_workers=1, profile_stage=None, profile_dir='profiles', explanations=True,
+                shap_sample_size=2000, reports='background', report_dir=None):
+    """
+    Main training function for Modal deployment
+
+    Every stage is timed and measured (profiling.py); the JSON run report is
+    written to RUN_REPORT_PATH, also when training fails. Plots and summaries
+    are rendered from the saved model by reports.py, not during training.
+
+    By default the model is tuned with the small RandomizedSearchCV (see
+    tune_model). tuning='hyperband' or 'halving' searches a much larger space
+    and runs for up to time_budget (TUNING_TIME_BUDGET, 30 minutes, unless
+    given), so it is opt-in.
+
+    Args:
+        use_cache: Reuse cleaned and preprocessed data from the training data
+            cache when loan_data.csv is unchanged (see training_cache.py)
+        feature_encoding: 'onehot', 'sparse' or 'native' (see preprocess_data)
+        tuning: 'random' (default), 'hyperband' or 'halving' (see tune_model)
+        time_budget: Tuning wall-clock limit in seconds ('halving'/'hyperband';
+            default TUNING_TIME_BUDGET)
+        trials_path: Tuning trial log
+        resume_tuning: Continue the search recorded in trials_path
+        cpu_budget: Cores for tuning (default: all available)
+        cv_folds: Cross-validation folds for 'halving'/'hyperband' (1 = one
+            held-out validation fold)
+        n_workers: Worker processes for the final fit (see distributed.py)
+        profile_stage: Run this stage (e.g. 'tune') under cProfile
+        profile_dir: Where the cProfile stats of profile_stage are written
+        explanations: Compute global SHAP explanations and the SHAP explainer;
+            False skips both for fast retrains
+        shap_sample_size: Training rows explained (see explain_global)
+        reports: 'background' starts report rendering in a separate process
+            and returns without waiting, 'inline' renders before returning,
+            'none' skips it (run reports.py later)
+        report_dir: Report output directory (default reports.REPORT_DIR)
+    """
+    from profiling import profile_run
+    options = {'use_cache': use_cache, 'feature_encoding': feature_encoding, 'tuning': tuning,
+               'time_budget': time_budget, 'cpu_budget': cpu_budget, 'cv_folds': cv_folds, 'n_workers': n_workers,
+               'explanations': explanations, 'shap_sample_size': shap_sample_size, 'reports': reports}
+    model_version = None
+    with profile_run(profile_stage=profile_stage, profile_dir=profile_dir) as profiler:
+        try:
+            print("Starting model training...")
+            ml_model = MicroLoanRiskModelAdvanced()
+
+            # Load, clean, prepare and preprocess data (or restore them from the cache)
+            from training_cache import prepare_training_data
+            X_train, X_test, y_train, y_test, _ = prepare_training_data(
+                ml_model, filepath='loan_data.csv', use_cache=use_cache, feature_encoding=feature_encoding
+            )
+
+            # Tune and train model
+            search_options = {'n_folds': cv_folds} if tuning != 'random' else {}
+            ml_model.tune_model(X_train, y_train, method=tuning, time_budget=time_budget,
+                                trials_path=trials_path, resume=resume_tuning, cpu_budget=cpu_budget,
+                                **search_options)
+            ml_model.train_model(X_train, y_train, X_test, y_test, n_workers=n_workers)
+
+            # Explain on a stratified sample (cached per model version) and save model
+            if explanations:
+                ml_model.explain_global(X_train, y_train, sample_size=shap_sample_size)
+                ml_model.setup_explainer()
+            ml_model.save_model('microloan_risk_model_advanced.pkl')
+            model_version = ml_model.save_inference_artifact('microloan_risk_model_advanced')['model_version']
+
+            status = "Model training completed successfully"
+        except Exception as e:
+            status = f"Error during training: {str(e)}"
+        profiler.write_report(RUN_REPORT_PATH, status=status, model_version=model_version, options=options)
+
+    if model_version is not None and reports != 'none':
+        import reports as report_module
+        render = (report_module.render_reports_in_background if reports == 'background'
+                  else report_module.render_reports)
+        try:
+            render('microloan_risk_model_advanced', report_dir, RUN_REPORT_PATH)
+        except Exception as e:
+            # The model is saved; a failed report must not fail training
+            print(f"Report rendering failed: {str(e)}")
+    return status
 
 def main():
-    train_model()
+    import argparse
+    parser = argparse.ArgumentParser(description='Train the MicroLoan risk model')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Bypass the cleaned/preprocessed training data cache')
+    parser.add_argument('--feature-encoding', choices=FEATURE_ENCODINGS, default='onehot',
+                        help='Dense one-hot, sparse CSR one-hot, or native XGBoost categoricals')
+    parser.add_argument('--tuning', choices=['random', 'hyperband', 'halving'], default='random',
+                        help='Small randomized search (default) or a halving/Hyperband search within --time-budget')
+    parser.add_argument('--time-budget', type=float, default=TUNING_TIME_BUDGET,
+                        help=f'Halving/Hyperband wall-clock limit in seconds (default: {TUNING_TIME_BUDGET})')
+    parser.add_argument('--trials-log', default='tuning_trials.jsonl')
+    parser.add_argument('--resume-tuning', action='store_true',
+                        help='Continue the search recorded in the trial log')
+    parser.add_argument('--cpus', type=int, default=None,
+                        help='Cores for tuning, split between parallel trials and XGBoost threads')
+    parser.add_argument('--cv-folds', type=int, default=1,
+                        help='Cross-validation folds for halving/hyperband tuning')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Train the final model data-parallel across this many processes')
+    parser.add_argument('--profile-stage', default=None,
+                        help='Run one stage (load, clean, preprocess, tune, fit, shap, ...) under cProfile')
+    parser.add_argument('--no-explanations', action='store_true',
+                        help='Skip SHAP explanations (fast retrains)')
+    parser.add_argument('--shap-sample-size', type=int, default=2000,
+                        help='Training rows explained with SHAP')
+    parser.add_argument('--reports', choices=['background', 'inline', 'none'], default='background',
+                        help='Render plots and summaries in a background process, inline, or not at all')
+    parser.add_argument('--report-dir', default=None, help='Report output directory (default: reports)')
+    args = parser.parse_args()
+    print(train_model(use_cache=not args.no_cache, feature_encoding=args.feature_encoding,
+                      tuning=args.tuning, time_budget=args.time_budget, trials_path=args.trials_log,
+                      resume_tuning=args.resume_tuning, cpu_budget=args.cpus, cv_folds=args.cv_folds,
+                      n_workers=args.workers, profile_stage=args.profile_stage,
+                      explanations=not args.no_explanations, shap_sample_size=args.shap_sample_size,
+                      reports=args.reports, report_dir=args.report_dir))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def trained_model():
+    """A small MicroLoanRiskModelAdvanced trained on synthetic loans."""
+    from synthetic_data import build_synthetic_model
+    return build_synthetic_model()
+
+
+@pytest.fixture
+def loaded_model(trained_model, monkeypatch):
+    """Install the synthetic model as credit_pred's cached model."""
+    import credit_pred
+    from prediction_cache import PredictionCache
+    monkeypatch.setattr(credit_pred, '_model', trained_model)
+    monkeypatch.setattr(credit_pred, '_active', None)
+    monkeypatch.setattr(credit_pred, '_model_path', None)
+    monkeypatch.setattr(credit_pred, '_reload_stats', {'reloads': 0, 'failed_reloads': 0, 'last_error': None})
+    monkeypatch.setattr(credit_pred, '_prediction_cache', PredictionCache(maxsize=1024))
+    return trained_model
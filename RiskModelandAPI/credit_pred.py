@@ -6,31 +6,126 @@ MicroLoan Risk Model - API Credit Prediction
 
 This file provides a function to load the model and make predictions
 from API data sent from a React frontend.
+
+Only numpy and the inference module are imported up front; pandas and the
+training code (boost_model) are loaded only when a legacy pickle is used.
+
+Scoring runs on one of SCORING_BACKENDS, chosen with the CREDIT_PRED_BACKEND
+environment variable or configure_backend():
+  - xgboost: CompiledScorer, the booster's own predictor (default)
+  - onnx: the model exported to ONNX (onnx_export.py), run by onnxruntime
+  - lookup: numpy lookup tables compiled from the trees (lookup_compiler.py)
+If the chosen backend cannot be built for a model, scoring falls back to
+xgboost. Explanations always use the CompiledScorer.
 """
 
-import pandas as pd
+import math
 import pickle
 import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
 import numpy as np
-from boost_model import MicroLoanRiskModelAdvanced
+from inference import CompiledScorer, is_artifact, load_artifact
+from prediction_cache import PredictionCache
 
 # Global variable to store the loaded model
 _model = None
 
+# Guards loading and compiling, so concurrent first requests load the model once
+_model_lock = threading.RLock()
+
+# Everything a request needs from the active model, swapped as one object on
+# reload. Requests take one snapshot and use it throughout, so in-flight
+# requests finish on the version they started with.
+# `scorer` scores with the active backend; `compiled` is the CompiledScorer
+# (None if the model could not be compiled), which explanations use.
+ModelHandle = namedtuple('ModelHandle', ['model', 'scorer', 'version', 'path', 'loaded_at', 'backend', 'compiled'])
+_active = None
+
+SCORING_BACKENDS = ('xgboost', 'onnx', 'lookup')
+_backend = os.environ.get('CREDIT_PRED_BACKEND', 'xgboost')
+
+# Path the active model was loaded from (None until the first load)
+_model_path = None
+
+# Only one reload runs at a time; counters are reported by get_model_info()
+_reload_lock = threading.Lock()
+_reload_stats = {'reloads': 0, 'failed_reloads': 0, 'last_error': None}
+
+# Cache of recent predictions, keyed on (model version, normalized features)
+_prediction_cache = PredictionCache(
+    maxsize=int(os.environ.get('CREDIT_PRED_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('CREDIT_PRED_CACHE_TTL', 3600)) or None
+)
+
+# Fields the model needs for every loan
+REQUIRED_FIELDS = [
+    'sector',
+    'location.country',
+    'location.geo.level',
+    'terms.disbursal_currency',
+    'terms.loan_amount',
+    'local_amount',
+    'amount'
+]
+CATEGORICAL_FIELDS = REQUIRED_FIELDS[:4]
+NUMERIC_FIELDS = REQUIRED_FIELDS[4:]
+
+# Field order of the contributions returned by CompiledScorer.explain
+EXPLAINED_FIELDS = NUMERIC_FIELDS + CATEGORICAL_FIELDS
+
+# Loans a newly loaded model must score sensibly before it is swapped in
+CANARY_RECORDS = [
+    {'sector': 'Agriculture', 'location.country': 'Kenya', 'location.geo.level': 'rural_area',
+     'terms.disbursal_currency': 'KES', 'terms.loan_amount': 500, 'local_amount': 500, 'amount': 500},
+    {'sector': 'Retail', 'location.country': 'Philippines', 'location.geo.level': 'town',
+     'terms.disbursal_currency': 'PHP', 'terms.loan_amount': 1500, 'local_amount': 1500, 'amount': 1500},
+    {'sector': 'Food', 'location.country': 'Peru', 'location.geo.level': 'city',
+     'terms.disbursal_currency': 'USD', 'terms.loan_amount': 3000, 'local_amount': 3000, 'amount': 3000},
+]
+
+def _default_model_path():
+    """Prefer the lean inference artifact, falling back to the full pickle."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    artifact_path = os.path.join(current_dir, 'microloan_risk_model_advanced')
+    if is_artifact(artifact_path):
+        return artifact_path
+    return os.path.join(current_dir, 'microloan_risk_model_advanced.pkl')
+
 def load_model_once(model_path=None):
-    """Load the model once and cache it for future use"""
-    global _model
+    """
+    Load the model once and cache it for future use.
+
+    `model_path` may point at an inference artifact directory (loaded as a
+    CompiledScorer, without unpickling the training instance) or at the
+    legacy pickle file.
+    """
+    global _model, _model_path, _active
     
     if _model is not None:
         return _model
-        
-    if model_path is None:
-        # Default path
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(current_dir, 'microloan_risk_model_advanced.pkl')
-    
+
+    with _model_lock:
+        # Another thread may have finished loading while we waited for the lock
+        if _model is None:
+            if model_path is None:
+                model_path = _default_model_path()
+            model = _load_model(model_path)
+            # Compile (and build the backend scorer) here, not in the first request
+            _active = _build_handle(model, model_path)
+            _model = model
+            _model_path = model_path
+    return _model
+
+def _load_model(model_path):
+    """Load a model from an artifact directory or a pickle file, without caching it."""
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found at {model_path}")
+
+    if is_artifact(model_path):
+        return load_artifact(model_path)
     
     # Load the model
     with open(model_path, 'rb') as f:
@@ -38,16 +133,309 @@ def load_model_once(model_path=None):
     
     # Get model instance
     if 'instance' in model_dict:
-        _model = model_dict['instance']
+        model = model_dict['instance']
     else:
         # Fallback if no instance is available
         from boost_model import MicroLoanRiskModelAdvanced
-        _model = MicroLoanRiskModelAdvanced()
-        _model.model = model_dict['model']
-        _model.preprocessor = model_dict['preprocessor']
-        _model.feature_names = model_dict['feature_names']
+        model = MicroLoanRiskModelAdvanced()
+        model.model = model_dict['model']
+        model.preprocessor = model_dict['preprocessor']
+        model.feature_names = model_dict['feature_names']
     
-    return _model
+    return model
+
+def _compile_scorer(model):
+    """
+    Return a CompiledScorer for a model, or None if its preprocessor layout is
+    not supported, in which case callers fall back to model.predict.
+    """
+    if isinstance(model, CompiledScorer):
+        return model
+    try:
+        return model.compile_scorer()
+    except (AttributeError, ValueError) as e:
+        print(f"Compiled scorer unavailable, using model.predict: {str(e)}")
+        return None
+
+def _compute_model_version(model):
+    """Content hash of a model: the artifact manifest version, or a hash of booster and preprocessor."""
+    manifest = getattr(model, 'manifest', None)
+    if manifest:
+        return manifest['model_version']
+    if isinstance(model, CompiledScorer):
+        return model.content_version()
+    return model.model_version()
+
+def _backend_scorer(backend, model, compiled, version, path):
+    """Build the scorer of a non-default backend; raises if it is unavailable for this model."""
+    if backend not in SCORING_BACKENDS:
+        raise ValueError(f"Unknown scoring backend: {backend}")
+    source = compiled if compiled is not None else model
+    if backend == 'lookup':
+        from lookup_compiler import compile_lookup_scorer
+        return compile_lookup_scorer(source)
+
+    from onnx_export import OnnxScorer, default_onnx_path, load_onnx_scorer
+    onnx_path = default_onnx_path(path) if path else None
+    if onnx_path and os.path.exists(onnx_path):
+        try:
+            return load_onnx_scorer(onnx_path, model_version=version)
+        except ValueError as e:
+            print(f"Ignoring exported ONNX model: {str(e)}")
+    # No (current) export next to the model: export it in memory
+    return OnnxScorer.from_model(source)
+
+def _build_handle(model, path=None, backend=None):
+    """
+    Compile a model and build the scorer of `backend` (default: the
+    configured one). The explainer is not built here: scoring-only processes
+    never pay for it, and explain_credit_scores builds it on first use.
+    """
+    requested = backend or _backend
+    compiled = _compile_scorer(model)
+    version = _compute_model_version(model)
+    scorer, backend = compiled, 'xgboost'
+    if requested != 'xgboost':
+        try:
+            scorer, backend = _backend_scorer(requested, model, compiled, version, path), requested
+        except Exception as e:
+            print(f"Scoring backend {requested} unavailable, using xgboost: {type(e).__name__}: {str(e)}")
+    return ModelHandle(model, scorer, version, path, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                       backend, compiled)
+
+def configure_backend(backend='xgboost'):
+    """
+    Select the scoring backend. If a model is active, its new scorer is built
+    first, while requests keep scoring on the current one, and then swapped in.
+
+    Args:
+        backend: One of SCORING_BACKENDS
+    """
+    global _backend, _active
+    if backend not in SCORING_BACKENDS:
+        raise ValueError(f"Unknown scoring backend: {backend} (expected one of {SCORING_BACKENDS})")
+    with _reload_lock:
+        handle = _active
+        if handle is not None:
+            handle = _build_handle(handle.model, handle.path, backend)
+        with _model_lock:
+            _backend = backend
+            if handle is not None:
+                _active = handle
+    # Backends agree only to float32 rounding, so drop scores cached by the old one
+    _prediction_cache.clear()
+
+def get_active_model():
+    """
+    Return the ModelHandle (model, scorer, version, path, loaded_at) of the
+    active model, loading and compiling it on first use.
+
+    `_active` is the only source of truth: once set, it changes only by
+    reload_model swapping in a complete new handle.
+    """
+    global _active
+
+    handle = _active
+    if handle is not None:
+        return handle
+    model = load_model_once()
+    with _model_lock:
+        if _active is None:
+            # A model installed without going through load_model_once
+            _active = _build_handle(model, _model_path)
+        return _active
+
+def get_scorer():
+    """
+    Return the scorer serving the active model: its CompiledScorer, or the
+    ONNX or lookup-table scorer when that backend is configured (see
+    configure_backend). None if the model could not be compiled.
+    """
+    return get_active_model().scorer
+
+def get_compiled_scorer():
+    """
+    Return the CompiledScorer (booster and preprocessing) of the active model,
+    whatever the scoring backend, or None if it could not be compiled.
+    """
+    return get_active_model().compiled
+
+def get_model_version():
+    """Return the version hash of the active model."""
+    return get_active_model().version
+
+def _validate_canary(handle, canary):
+    """Score the canary loans with a candidate model; raise ValueError if anything looks wrong."""
+    rows = [_normalize_record(record) for record in canary]
+    scores = np.asarray(_score_rows(handle, rows), dtype=np.float64)
+    if scores.shape != (len(rows),):
+        raise ValueError(f"Canary returned {scores.shape} scores for {len(rows)} loans")
+    if not np.all(np.isfinite(scores)) or scores.min() < 0 or scores.max() > 100:
+        raise ValueError(f"Canary scores out of range: {scores.tolist()}")
+    return scores
+
+def reload_model(model_path=None, canary=None, background=False):
+    """
+    Load a new model version and swap it in without interrupting scoring.
+
+    The new model is loaded and compiled off to the side, validated on a
+    canary batch, and only then made active in one assignment. Requests that
+    already took a snapshot of the old model finish on it. If loading or
+    validation fails the old model stays active.
+
+    Args:
+        model_path: Artifact directory or pickle (default: the active model's path)
+        canary: Loans to validate with (default: CANARY_RECORDS)
+        background: If True, reload on a daemon thread and return the thread
+
+    Returns:
+        The new ModelHandle, or the started thread if background=True
+    """
+    global _model, _active, _model_path
+
+    if background:
+        thread = threading.Thread(target=_reload_quietly, args=(model_path, canary),
+                                  name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    with _reload_lock:
+        if model_path is None:
+            model_path = _model_path or _default_model_path()
+        try:
+            handle = _build_handle(_load_model(model_path), model_path)
+            _validate_canary(handle, canary or CANARY_RECORDS)
+        except Exception as e:
+            _reload_stats['failed_reloads'] += 1
+            _reload_stats['last_error'] = f"{type(e).__name__}: {str(e)}"
+            print(f"Model reload from {model_path} failed, keeping current model: {str(e)}")
+            raise
+        with _model_lock:
+            _active = handle
+            _model = handle.model
+            _model_path = model_path
+        _reload_stats['reloads'] += 1
+        _reload_stats['last_error'] = None
+        print(f"Model version {handle.version} is now active (from {model_path})")
+        return handle
+
+def _reload_quietly(model_path, canary):
+    try:
+        reload_model(model_path, canary)
+    except Exception:
+        pass  # Already logged and counted; the old model stays active
+
+def get_model_info():
+    """Return the active model's version, source and reload counters."""
+    handle = get_active_model()
+    return {
+        'model_version': handle.version,
+        'model_path': handle.path,
+        'loaded_at': handle.loaded_at,
+        'compiled': handle.compiled is not None,
+        'backend': handle.backend,
+        **_reload_stats,
+    }
+
+def _model_mtime(path):
+    """Modification time of a model file, or of an artifact's manifest."""
+    if is_artifact(path):
+        path = os.path.join(path, 'manifest.json')
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+class ModelWatcher:
+    """Poll a model location and hot-reload when it changes."""
+
+    def __init__(self, model_path=None, interval=5.0, canary=None):
+        self.model_path = model_path
+        self.interval = interval
+        self.canary = canary
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.model_path is None:
+            get_active_model()
+            self.model_path = _model_path
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        last_seen = _model_mtime(self.model_path)
+        while not self._stop.wait(self.interval):
+            mtime = _model_mtime(self.model_path)
+            if mtime is None or mtime == last_seen:
+                continue
+            # Give a writer a moment to finish, then reload from the new files
+            time.sleep(min(self.interval, 1.0))
+            last_seen = _model_mtime(self.model_path)
+            _reload_quietly(self.model_path, self.canary)
+
+def start_model_watcher(model_path=None, interval=5.0, canary=None):
+    """Start a ModelWatcher on `model_path` (default: the active model's path) and return it."""
+    return ModelWatcher(model_path, interval, canary).start()
+
+def configure_prediction_cache(maxsize=4096, ttl=3600):
+    """
+    Replace the prediction cache.
+
+    Args:
+        maxsize: Maximum number of cached predictions; 0 disables caching
+        ttl: Seconds a cached prediction stays valid, or None for no expiry
+    """
+    global _prediction_cache
+    _prediction_cache = PredictionCache(maxsize=maxsize, ttl=ttl)
+
+def get_cache_stats():
+    """Return hit/miss/eviction counters of the prediction cache."""
+    return _prediction_cache.stats()
+
+def _normalize_record(api_data):
+    """
+    Return the model inputs of one loan as a tuple in REQUIRED_FIELDS order:
+    categoricals as strings and numerics as floats, with None for missing values.
+    The tuple is both what gets scored and (with the model version) the cache key.
+    """
+    values = []
+    for field in CATEGORICAL_FIELDS:
+        value = api_data[field]
+        missing = value is None or (isinstance(value, float) and math.isnan(value))
+        values.append(None if missing else str(value))
+    for field in NUMERIC_FIELDS:
+        value = api_data[field]
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid numeric value for {field}: {value!r}")
+            if math.isnan(value):
+                value = None
+        values.append(value)
+    return tuple(values)
+
+def _rows_to_columns(rows):
+    """Columnar mapping of normalized rows, with numeric fields as float arrays."""
+    columns = {field: [row[i] for row in rows] for i, field in enumerate(REQUIRED_FIELDS)}
+    for field in NUMERIC_FIELDS:
+        columns[field] = np.array(columns[field], dtype=np.float64)
+    return columns
+
+def _score_rows(handle, rows):
+    """Score normalized rows with one preprocessing pass and one booster call."""
+    columns = _rows_to_columns(rows)
+    if handle.scorer is not None:
+        return handle.scorer.predict(columns)
+    import pandas as pd
+    return handle.model.predict(pd.DataFrame(columns, columns=REQUIRED_FIELDS))
 
 def predict_credit_score(api_data):
     """
@@ -67,32 +455,36 @@ def predict_credit_score(api_data):
         float: The predicted default probability (0-1, where 1 = 100% probability of default)
     """
     try:
-        # Load model if not already loaded
-        model = load_model_once()
+        # Load model if not already loaded; the snapshot is used for the whole request
+        handle = get_active_model()
         
         # Validate required fields
-        required_fields = [
-            'sector', 
-            'location.country', 
-            'location.geo.level', 
-            'terms.disbursal_currency',
-            'terms.loan_amount', 
-            'local_amount', 
-            'amount'
-        ]
-        
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             if field not in api_data:
                 raise ValueError(f"Missing required field: {field}")
+
+        # Repeated loans are answered from the cache without touching the model
+        row = _normalize_record(api_data)
+        key = (handle.version,) + row
+        cached = _prediction_cache.get(key)
+        if cached is not None:
+            return cached
         
-        # Convert to DataFrame (required format for model)
-        df = pd.DataFrame([api_data])
-        
-        # Make prediction - model returns a credit score (0-100)
-        credit_score = model.predict(df)[0]
+        if handle.scorer is not None:
+            # Fast path: no DataFrame or ColumnTransformer, one in-place booster call
+            credit_score = handle.scorer.predict_one(dict(zip(REQUIRED_FIELDS, row)))
+        else:
+            # Convert to DataFrame (required format for model)
+            import pandas as pd
+            df = pd.DataFrame([dict(zip(REQUIRED_FIELDS, row))])
+
+            # Make prediction - model returns a credit score (0-100)
+            credit_score = handle.model.predict(df)[0]
         
         # Return single score value
-        return float(credit_score)
+        credit_score = float(credit_score)
+        _prediction_cache.put(key, credit_score)
+        return credit_score
         
     except Exception as e:
         # Log the error
@@ -100,3 +492,145 @@ def predict_credit_score(api_data):
         # Return a default value or re-raise
         raise
 
+
+def _batch_columns(records):
+    """
+    Normalize a batch payload into per-field value lists.
+
+    Accepts either a list of dicts (one per loan) or a columnar payload
+    (a dict or DataFrame mapping each field to a list of values).
+
+    Returns:
+        (columns, errors): columns maps each required field to a list of raw
+        values, errors holds one message (or None) per row.
+    """
+    if hasattr(records, 'columns'):  # DataFrame, checked without importing pandas
+        records = {col: records[col].tolist() for col in records.columns}
+
+    if isinstance(records, dict):
+        missing = [f for f in REQUIRED_FIELDS if f not in records]
+        if missing:
+            raise ValueError(f"Missing required fields: {missing}")
+        columns = {f: list(records[f]) for f in REQUIRED_FIELDS}
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All fields of a columnar payload must have the same length")
+        n_rows = lengths.pop()
+        return columns, [None] * n_rows
+
+    columns = {f: [] for f in REQUIRED_FIELDS}
+    errors = []
+    for row in records:
+        if not isinstance(row, dict):
+            error = "Record must be a dict"
+        else:
+            missing = [f for f in REQUIRED_FIELDS if f not in row]
+            error = f"Missing required field: {missing[0]}" if missing else None
+        errors.append(error)
+        for f in REQUIRED_FIELDS:
+            columns[f].append(row[f] if error is None else None)
+    return columns, errors
+
+
+def predict_credit_scores(records):
+    """
+    Predict credit scores for a batch of loans with a single model call.
+
+    Args:
+        records: Either a list of dicts with the same fields as
+            predict_credit_score, or a columnar payload (dict of lists or a
+            DataFrame) keyed by those fields.
+
+    Returns:
+        list: One dict per input loan, in input order, with keys
+            - score: the predicted credit score (0-100), or None on error
+            - error: None, or a message describing why the row was rejected
+            - model_version: version of the model that scored the batch
+
+    Rows found in the prediction cache are not sent to the model.
+    """
+    handle = get_active_model()
+    version = handle.version
+    columns, errors = _batch_columns(records)
+    results = [{'score': None, 'error': e, 'model_version': version} for e in errors]
+
+    # Normalize valid rows and answer what we can from the cache
+    miss_index, miss_rows, miss_keys = [], [], []
+    for i, error in enumerate(errors):
+        if error is not None:
+            continue
+        try:
+            row = _normalize_record({f: columns[f][i] for f in REQUIRED_FIELDS})
+        except ValueError as e:
+            results[i]['error'] = str(e)
+            continue
+        key = (version,) + row
+        cached = _prediction_cache.get(key)
+        if cached is not None:
+            results[i]['score'] = cached
+        else:
+            miss_index.append(i)
+            miss_rows.append(row)
+            miss_keys.append(key)
+
+    if miss_rows:
+        # One preprocessing pass and one booster call for all cache misses
+        scores = _score_rows(handle, miss_rows)
+        for i, key, score in zip(miss_index, miss_keys, scores):
+            score = float(score)
+            results[i]['score'] = score
+            _prediction_cache.put(key, score)
+    return results
+
+
+def explain_credit_scores(records, top_k=3):
+    """
+    Score a batch of loans and give the main reasons behind each score.
+
+    Reasons are SHAP contributions of the 7 input fields, computed with
+    path-dependent TreeSHAP on the booster (see explanations.py). No
+    background data is needed. The contributions of a categorical field's
+    one-hot columns are summed into that field. A negative contribution
+    lowers the score.
+
+    Args:
+        records: A list of dicts or a columnar payload, as for predict_credit_scores
+        top_k: Reasons returned per loan, largest absolute contribution first
+
+    Returns:
+        list: One dict per input loan, in input order, with keys
+            - score, error, model_version: as in predict_credit_scores
+            - expected_score: average score of the model, which the
+              contributions of all 7 fields move to the loan's (unclipped) score
+            - reasons: up to top_k dicts with field, value and contribution
+    """
+    handle = get_active_model()
+    if handle.compiled is None:
+        raise ValueError("Explanations need a compiled scorer, which this model does not support")
+    columns, errors = _batch_columns(records)
+    results = [{'score': None, 'error': e, 'model_version': handle.version, 'expected_score': None,
+                'reasons': []} for e in errors]
+
+    valid_index, valid_rows = [], []
+    for i, error in enumerate(errors):
+        if error is not None:
+            continue
+        try:
+            valid_rows.append(_normalize_record({f: columns[f][i] for f in REQUIRED_FIELDS}))
+            valid_index.append(i)
+        except ValueError as e:
+            results[i]['error'] = str(e)
+
+    if valid_rows:
+        scores, contributions, expected_score = handle.compiled.explain(_rows_to_columns(valid_rows))
+        top = np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :top_k]
+        for i, row, score, contribution, order in zip(valid_index, valid_rows, scores, contributions, top):
+            values = dict(zip(REQUIRED_FIELDS, row))
+            results[i]['score'] = float(score)
+            results[i]['expected_score'] = float(expected_score)
+            results[i]['reasons'] = [
+                {'field': EXPLAINED_FIELDS[j], 'value': values[EXPLAINED_FIELDS[j]],
+                 'contribution': float(contribution[j])}
+                for j in order
+            ]
+    return results
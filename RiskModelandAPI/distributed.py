@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Distributed Training
+
+Data-parallel training with XGBoost's collective protocol. N worker
+processes each own a contiguous shard of the training rows. They build
+their QuantileDMatrix and train together: the quantile sketches and
+gradient histograms are allreduced through the collective, so every
+worker ends with the same booster. A RabitTracker coordinates the workers.
+
+Here the tracker and workers all run on localhost, which is enough for
+testing and for spreading one machine's memory bandwidth across processes.
+Scaling to several nodes means starting worker() on each node with the
+tracker's address and that node's shard; the protocol is the same.
+
+With one worker the booster is identical to single-process training. With
+several, the merged quantile sketch places a few bin boundaries
+differently, so trees differ slightly while accuracy stays equivalent.
+
+Usage (after preprocess_data):
+    from distributed import fit_distributed
+    summary = fit_distributed(ml_model, X_train, y_train, n_workers=4)
+"""
+
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from profiling import profiled
+
+# Seconds to wait for a worker result before giving up
+WORKER_TIMEOUT = 3600
+
+# Seconds the tracker waits for workers to connect and to shut down; bounds
+# how long freeing it can block after workers were terminated
+TRACKER_TIMEOUT = 300
+
+
+def _shard(X, rows):
+    if hasattr(X, 'iloc'):
+        return X.iloc[rows]
+    return X[rows]
+
+
+def worker(tracker_args, X, y, params, num_boost_round, feature_names, results):
+    """
+    Train on one shard as one member of the collective; rank 0 sends back the
+    booster. Runs in a worker process.
+    """
+    import xgboost as xgb
+    from xgboost import collective
+
+    try:
+        with collective.CommunicatorContext(**tracker_args):
+            rank = collective.get_rank()
+            start = time.perf_counter()
+            dtrain = xgb.QuantileDMatrix(X, label=y, feature_names=feature_names,
+                                         enable_categorical=bool(params.get('enable_categorical')),
+                                         nthread=params.get('nthread'))
+            booster = xgb.train({k: v for k, v in params.items() if k != 'enable_categorical'},
+                                dtrain, num_boost_round=num_boost_round)
+            report = {'rank': rank, 'rows': dtrain.num_row(), 'seconds': time.perf_counter() - start}
+            if rank == 0:
+                report['booster'] = bytes(booster.save_raw('ubj'))
+            results.put(report)
+    except Exception as e:
+        results.put({'rank': None, 'error': f"{type(e).__name__}: {str(e)}"})
+
+
+def _collect_reports(processes, results):
+    """
+    Wait for one report per worker. Fails fast on the first error report, or
+    if a worker dies without reporting.
+    """
+    reports = []
+    deadline = time.monotonic() + WORKER_TIMEOUT
+    while len(reports) < len(processes):
+        try:
+            report = results.get(timeout=1.0)
+        except queue.Empty:
+            report = None
+        if report is not None:
+            if 'error' in report:
+                raise RuntimeError(f"Distributed training failed: {report['error']}")
+            reports.append(report)
+            continue
+        dead = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+        if dead:
+            raise RuntimeError(f"A training worker exited with code {dead[0]}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Distributed training timed out after {WORKER_TIMEOUT}s")
+    return reports
+
+
+def train_distributed(X_train, y_train, params, num_boost_round, n_workers=2, feature_names=None):
+    """
+    Train a booster with `n_workers` localhost processes, one row shard each.
+
+    Args:
+        X_train, y_train: Processed training data (DataFrame, CSR or array)
+        params: Booster parameters for xgb.train
+        num_boost_round: Boosting rounds
+        n_workers: Worker processes
+        feature_names: Feature names for CSR/array input
+
+    Returns:
+        tuple: (xgb.Booster, summary dict with per-worker rows and times)
+    """
+    import xgboost as xgb
+    from xgboost.tracker import RabitTracker
+    from tuning import available_cpus, plan_threads
+
+    # Split the cores between workers instead of letting each one take them all
+    _, threads = plan_threads(available_cpus(), n_workers)
+    params = dict(params, nthread=threads)
+    y = np.asarray(y_train)
+    shards = np.array_split(np.arange(len(y)), n_workers)
+
+    start = time.perf_counter()
+    tracker = RabitTracker(host_ip='127.0.0.1', n_workers=n_workers, timeout=TRACKER_TIMEOUT)
+    tracker.start()
+    tracker_args = tracker.worker_args()
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(tracker_args, _shard(X_train, rows), y[rows], params,
+                                         num_boost_round, feature_names, results))
+        for rows in shards
+    ]
+    failed = True
+    try:
+        for process in processes:
+            process.start()
+        reports = _collect_reports(processes, results)
+        failed = False
+    finally:
+        for process in processes:
+            if failed:
+                # Peers of a failed worker would block in a collective until WORKER_TIMEOUT
+                process.terminate()
+            process.join(timeout=60)
+            if process.is_alive():
+                process.terminate()
+        try:
+            if not failed:
+                tracker.wait_for()
+            tracker.free()
+        except xgb.core.XGBoostError as e:
+            if not failed:
+                raise
+            print(f"Tracker shut down after the failure: {str(e).splitlines()[0]}")
+
+    reports.sort(key=lambda r: r['rank'])
+    booster = xgb.Booster(model_file=bytearray(reports[0].pop('booster')))
+    summary = {
+        'n_workers': n_workers,
+        'threads_per_worker': threads,
+        'wall_seconds': time.perf_counter() - start,
+        'train_seconds': max(r['seconds'] for r in reports),
+        'workers': reports,
+    }
+    return booster, summary
+
+
+@profiled('fit_distributed')
+def fit_distributed(ml_model, X_train, y_train, n_workers=2):
+    """
+    Distributed counterpart of ml_model.fit_model: trains ml_model.model's
+    configuration (e.g. the tuned one) across `n_workers` processes and
+    installs the result as ml_model.model.
+
+    Returns:
+        dict: Summary with wall time and per-worker rows and times
+    """
+    if ml_model.model is None:
+        raise ValueError("No model configuration to train. Run tune_model first.")
+    params = {k: v for k, v in ml_model.model.get_xgb_params().items() if v is not None and k != 'n_jobs'}
+    if 'random_state' in params:
+        params['seed'] = params.pop('random_state')
+    params.update(ml_model.xgb_params())
+    num_boost_round = ml_model.model.get_params()['n_estimators'] or 100
+    feature_names = None
+    if getattr(ml_model, 'feature_encoding', 'onehot') == 'sparse':
+        feature_names = list(ml_model.processed_feature_names)
+
+    print(f"Training on {n_workers} workers ({len(y_train)} rows, {num_boost_round} rounds)...")
+    booster, summary = train_distributed(X_train, y_train, params, num_boost_round, n_workers, feature_names)
+    ml_model.adopt_booster(booster, params)
+    print(f"Distributed training finished in {summary['wall_seconds']:.1f}s "
+          f"(slowest worker trained for {summary['train_seconds']:.1f}s)")
+    return summary
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Out-of-Core Training
+
+Trains the same model as train_model() on loan files larger than RAM. The
+file is never loaded whole: chunks are streamed through the pipeline and
+into XGBoost's external-memory ExtMemQuantileDMatrix, which keeps its
+quantized pages in a disk cache. Memory follows the chunk size, not the
+file size.
+
+  1. One pass over the file collects every category of the 4 categorical
+     features and a uniform random sample of resolved loans (reservoir
+     sampling), from which the amount medians and the preprocessor
+     (imputers, Yeo-Johnson transform) are fitted. The one-hot / category
+     encoders get the complete category lists.
+  2. LoanDataIter streams the file again for XGBoost: each chunk is cleaned
+     with the same target mapping (paid -> 100, defaulted -> 0) and median
+     fill values, split into train/test rows by a seeded per-chunk draw,
+     and transformed with the fitted preprocessor.
+  3. Test metrics (R², RMSE) are accumulated chunk by chunk.
+
+CSV and Parquet (.parquet / .pq) files are supported.
+
+Usage:
+    python external_memory.py loan_data.csv --chunksize 200000 --feature-encoding sparse
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from boost_model import FEATURE_COLUMNS, LOAD_COLUMNS, LOAD_DTYPES, MicroLoanRiskModelAdvanced
+from inference import CATEGORICAL_FEATURES, FEATURE_ENCODINGS, NUMERIC_FEATURES
+
+# Booster parameters used when none are given (the tuned ones can be passed instead)
+DEFAULT_PARAMS = {
+    'objective': 'reg:squarederror',
+    'tree_method': 'hist',
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'seed': 42,
+}
+
+
+def _is_parquet(filepath):
+    return filepath.lower().endswith(('.parquet', '.pq'))
+
+
+def iter_loan_chunks(filepath, chunksize=100000, encoding='latin1'):
+    """
+    Yield the pipeline columns of a CSV or Parquet loan file in chunks of
+    about `chunksize` rows, with the dtypes load_data uses.
+    """
+    if _is_parquet(filepath):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(filepath)
+        columns = [col for col in LOAD_COLUMNS if col in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    header = pd.read_csv(filepath, encoding=encoding, nrows=0).columns
+    columns = [col for col in LOAD_COLUMNS if col in header]
+    dtype = {col: LOAD_DTYPES[col] for col in columns if col in LOAD_DTYPES}
+    yield from pd.read_csv(filepath, encoding=encoding, usecols=columns, dtype=dtype, chunksize=chunksize)
+
+
+def _resolved(chunk):
+    if 'status' not in chunk.columns:
+        return chunk
+    return chunk[chunk['status'].isin(['paid', 'defaulted'])]
+
+
+def scan_loans(filepath, chunksize=100000, sample_size=100000, seed=42):
+    """
+    First pass: collect the categories of each categorical feature and a
+    uniform random sample of resolved loans, in memory bounded by
+    `sample_size` + `chunksize` rows.
+
+    Returns:
+        tuple: (categories {column: sorted values}, raw sample DataFrame,
+        number of resolved loans)
+    """
+    rng = np.random.default_rng(seed)
+    seen = {col: set() for col in CATEGORICAL_FEATURES}
+    sample, keys = None, None
+    n_resolved = 0
+    ml_model = MicroLoanRiskModelAdvanced()
+    for chunk in iter_loan_chunks(filepath, chunksize):
+        chunk = _resolved(chunk)
+        if chunk.empty:
+            continue
+        n_resolved += len(chunk)
+        # The categories as clean_data writes them ('Unknown' for missing)
+        cleaned = ml_model.clean_data(chunk[[col for col in chunk.columns if col in CATEGORICAL_FEATURES]],
+                                      lean=True)
+        for col in seen:
+            if col in cleaned.columns:
+                seen[col].update(cleaned[col].cat.categories[np.unique(cleaned[col].cat.codes)])
+
+        # Reservoir sampling: keep the rows with the smallest random keys
+        chunk_keys = rng.random(len(chunk))
+        if sample is None:
+            sample, keys = chunk, chunk_keys
+        else:
+            sample = pd.concat([sample, chunk], ignore_index=True)
+            keys = np.concatenate([keys, chunk_keys])
+        if len(sample) > sample_size:
+            keep = np.sort(np.argpartition(keys, sample_size)[:sample_size])
+            sample, keys = sample.iloc[keep].reset_index(drop=True), keys[keep]
+
+    if sample is None:
+        raise ValueError(f"No resolved (paid/defaulted) loans in {filepath}")
+    categories = {col: sorted(values) for col, values in seen.items()}
+    for col in CATEGORICAL_FEATURES:
+        # Concatenated categoricals fall back to strings; clean_data needs them consistent
+        if col in sample.columns:
+            sample[col] = sample[col].astype('category')
+    return categories, sample, n_resolved
+
+
+class LoanDataIter(xgb.DataIter):
+    """
+    Streams one split (train or test) of a loan file through the fitted
+    preprocessor, one chunk per batch, for ExtMemQuantileDMatrix.
+    """
+
+    def __init__(self, ml_model, filepath, fill_values, subset='train', chunksize=100000, test_size=0.3,
+                 seed=42, cache_prefix=None):
+        self.ml_model = ml_model
+        self.filepath = filepath
+        self.fill_values = fill_values
+        self.subset = subset
+        self.chunksize = chunksize
+        self.test_size = test_size
+        self.seed = seed
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def batches(self):
+        """Yield (X_processed, y) per chunk of this split."""
+        for index, chunk in enumerate(iter_loan_chunks(self.filepath, self.chunksize)):
+            chunk = _resolved(chunk)
+            if chunk.empty:
+                continue
+            # The same draw on every pass, so a row always lands in the same split
+            test = np.random.default_rng([self.seed, index]).random(len(chunk)) < self.test_size
+            chunk = chunk[test if self.subset == 'test' else ~test]
+            if chunk.empty:
+                continue
+            X, y = self.ml_model.prepare_features(
+                self.ml_model.clean_data(chunk, lean=True, fill_values=self.fill_values)
+            )
+            yield self.ml_model.transform_features(X), y.to_numpy(dtype=np.float64)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = self.batches()
+        batch = next(self._chunks, None)
+        if batch is None:
+            return False
+        X, y = batch
+        if self.ml_model.feature_encoding == 'sparse':
+            input_data(data=X, label=y, feature_names=list(self.ml_model.processed_feature_names))
+        else:
+            input_data(data=X, label=y)
+        return True
+
+    def reset(self):
+        self._chunks = None
+
+
+def fit_streaming_preprocessor(ml_model, categories, sample, feature_encoding):
+    """
+    Fit ml_model's preprocessor on the sampled loans with the complete
+    category lists; returns the median fill values for clean_data.
+    """
+    ml_model.feature_encoding = feature_encoding
+    numeric = sample[[col for col in NUMERIC_FEATURES if col in sample.columns]].apply(
+        pd.to_numeric, errors='coerce')
+    fill_values = numeric.median().to_dict()
+    X_sample, _ = ml_model.prepare_features(ml_model.clean_data(sample, lean=True, fill_values=fill_values))
+
+    ml_model.preprocessor = ml_model.build_preprocessor(
+        feature_encoding, categories=[categories[col] for col in CATEGORICAL_FEATURES]
+    )
+    ml_model.preprocessor.fit(X_sample)
+    if feature_encoding == 'native':
+        ml_model.processed_feature_names = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+    else:
+        encoder = ml_model.preprocessor.named_transformers_['cat'].named_steps['onehot']
+        ml_model.processed_feature_names = NUMERIC_FEATURES + list(
+            encoder.get_feature_names_out(CATEGORICAL_FEATURES))
+
+    # SHAP background, as preprocess_data keeps it
+    background = ml_model.transform_features(X_sample.head(100))
+    if feature_encoding == 'sparse':
+        background = background.toarray()
+        background[background == 0] = np.nan
+        background = pd.DataFrame(background, columns=ml_model.processed_feature_names)
+    ml_model.X_train_proc_df = background
+    return fill_values
+
+
+def train_out_of_core(filepath='loan_data.csv', chunksize=100000, feature_encoding='onehot', params=None,
+                      num_boost_round=300, sample_size=100000, test_size=0.3, seed=42, cache_dir=None):
+    """
+    Train a MicroLoanRiskModelAdvanced from a loan file without loading it
+    into memory.
+
+    Args:
+        filepath: CSV or Parquet loan file
+        chunksize: Rows per streamed chunk; bounds memory use
+        feature_encoding: 'onehot', 'sparse' or 'native' (see preprocess_data)
+        params: Booster parameters (default DEFAULT_PARAMS), e.g. tuned ones
+        num_boost_round: Boosting rounds
+        sample_size: Loans sampled to fit the preprocessor
+        test_size: Share of loans held out for the test metrics
+        seed: Seed for sampling and the train/test split
+        cache_dir: Directory for XGBoost's external-memory cache (default: a
+            temporary directory, removed afterwards)
+
+    Returns:
+        The trained MicroLoanRiskModelAdvanced, with model_metrics set as
+        train_model() sets them
+    """
+    if feature_encoding not in FEATURE_ENCODINGS:
+        raise ValueError(f"Unknown feature encoding: {feature_encoding}. Use one of {FEATURE_ENCODINGS}")
+    print(f"\n=== Out-of-Core Training on {filepath} (chunks of {chunksize} rows) ===")
+    start = time.perf_counter()
+    ml_model = MicroLoanRiskModelAdvanced()
+    ml_model.feature_names = list(FEATURE_COLUMNS)
+
+    categories, sample, n_resolved = scan_loans(filepath, chunksize, sample_size, seed)
+    fill_values = fit_streaming_preprocessor(ml_model, categories, sample, feature_encoding)
+    del sample
+    print(f"Scanned {n_resolved} resolved loans and fitted the preprocessor in "
+          f"{time.perf_counter() - start:.1f}s")
+
+    params = dict(DEFAULT_PARAMS if params is None else params)
+    params.update(ml_model.xgb_params())
+    categorical = params.pop('enable_categorical', False)
+    with tempfile.TemporaryDirectory(dir=cache_dir) as workdir:
+        train_iter = LoanDataIter(ml_model, filepath, fill_values, 'train', chunksize, test_size, seed,
+                                  cache_prefix=os.path.join(workdir, 'train'))
+        dtrain = xgb.ExtMemQuantileDMatrix(train_iter, enable_categorical=categorical)
+        print(f"Built the external-memory matrix ({dtrain.num_row()} rows) in "
+              f"{time.perf_counter() - start:.1f}s")
+        booster = xgb.train(params, dtrain, num_boost_round=num_boost_round)
+        del dtrain
+
+    ml_model.adopt_booster(booster, params)
+
+    test_iter = LoanDataIter(ml_model, filepath, fill_values, 'test', chunksize, test_size, seed)
+    ml_model.model_metrics = evaluate_streaming(ml_model, test_iter)
+    ml_model.model_metrics['n_samples'] = n_resolved
+    ml_model.model_metrics['feature_importance'] = dict(zip(ml_model.model.feature_names_in_,
+                                                            ml_model.model.feature_importances_))
+    print(f"Test R² {ml_model.model_metrics['r2_score']:.4f}, RMSE {ml_model.model_metrics['rmse']:.4f} "
+          f"({time.perf_counter() - start:.1f}s total)")
+    return ml_model
+
+
+def evaluate_streaming(ml_model, data_iter):
+    """R² and RMSE of ml_model over the batches of a LoanDataIter, accumulated chunk by chunk."""
+    n, sum_y, sum_y2, sse = 0, 0.0, 0.0, 0.0
+    for X, y in data_iter.batches():
+        y_pred = ml_model.model.predict(X)
+        n += len(y)
+        sum_y += float(y.sum())
+        sum_y2 += float(np.square(y).sum())
+        sse += float(np.square(y - y_pred).sum())
+    if n == 0:
+        raise ValueError("No test loans to evaluate")
+    sst = sum_y2 - sum_y * sum_y / n
+    return {'r2_score': 1.0 - sse / sst if sst > 0 else 0.0, 'rmse': float(np.sqrt(sse / n)), 'n_test': n}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the risk model out of core')
+    parser.add_argument('filepath', nargs='?', default='loan_data.csv', help='CSV or Parquet loan file')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--feature-encoding', choices=FEATURE_ENCODINGS, default='onehot')
+    parser.add_argument('--rounds', type=int, default=300)
+    parser.add_argument('--cache-dir', default=None, help='Directory for the external-memory cache')
+    parser.add_argument('--output', default='microloan_risk_model_advanced.pkl')
+    parser.add_argument('--artifact', default='microloan_risk_model_advanced')
+    args = parser.parse_args()
+
+    ml_model = train_out_of_core(args.filepath, chunksize=args.chunksize, feature_encoding=args.feature_encoding,
+                                 num_boost_round=args.rounds, cache_dir=args.cache_dir)
+    ml_model.save_model(args.output)
+    ml_model.save_inference_artifact(args.artifact)
+
+
+if __name__ == "__main__":
+    main()
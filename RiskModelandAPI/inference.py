@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Compiled Inference
+
+A pandas-free scorer compiled from a fitted MicroLoanRiskModelAdvanced. It
+replaces the ColumnTransformer chain with plain lookups:
+  - numeric columns: median imputation, Yeo-Johnson with the fitted lambdas,
+    then standardization with the fitted means and scales
+  - categorical columns: a category -> output column index map per column
+    (unknown categories leave all their one-hot columns at zero)
+and writes the result straight into a float32 buffer that is passed to the
+booster's in-place prediction.
+
+Models trained with preprocess_data(feature_encoding='sparse') get the same
+one-hot layout with zeros passed as missing (as XGBoost saw them in CSR
+training data); 'native' models get one column of category codes per
+categorical feature (unknown categories are missing).
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+NUMERIC_FEATURES = ['terms.loan_amount', 'local_amount', 'amount']
+CATEGORICAL_FEATURES = ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency']
+FEATURE_ENCODINGS = ('onehot', 'sparse', 'native')
+
+# Inference artifact layout (see CompiledScorer.save / load_artifact)
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+PREPROCESSING_FILE = 'preprocessing.npz'
+
+# Same epsilon scipy uses to decide whether lambda is 0 (or 2)
+_EPS = np.spacing(1.0)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def yeo_johnson(x, lmbda):
+    """Vectorized Yeo-Johnson transform, matching scipy.stats.yeojohnson."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty_like(x)
+    pos = x >= 0
+    neg = ~pos
+    if abs(lmbda) < _EPS:
+        out[pos] = np.log1p(x[pos])
+    else:
+        out[pos] = np.expm1(lmbda * np.log1p(x[pos])) / lmbda
+    if abs(lmbda - 2) > _EPS:
+        out[neg] = -np.expm1((2 - lmbda) * np.log1p(-x[neg])) / (2 - lmbda)
+    else:
+        out[neg] = -np.log1p(-x[neg])
+    return out
+
+
+def _yeo_johnson_scalar(x, lmbda):
+    if x >= 0:
+        if abs(lmbda) < _EPS:
+            return math.log1p(x)
+        return math.expm1(lmbda * math.log1p(x)) / lmbda
+    if abs(lmbda - 2) > _EPS:
+        return -math.expm1((2 - lmbda) * math.log1p(-x)) / (2 - lmbda)
+    return -math.log1p(-x)
+
+
+class CompiledScorer:
+    """
+    Score loans without pandas or sklearn, using parameters extracted from a
+    fitted preprocessor and the trained XGBoost booster.
+    """
+
+    def __init__(self, booster, medians, lambdas, means, scales, categories,
+                 missing_value='missing', iteration_range=(0, 0), feature_encoding='onehot'):
+        """
+        Args:
+            booster: Trained xgboost.Booster
+            medians, lambdas, means, scales: Per numeric feature imputation,
+                Yeo-Johnson and standardization parameters (NUMERIC_FEATURES order)
+            categories: One list of known categories per categorical feature
+                (CATEGORICAL_FEATURES order), in one-hot column order
+            missing_value: Value the categorical imputer substitutes for missing input
+            iteration_range: Trees to use, as for Booster.inplace_predict
+            feature_encoding: 'onehot', 'sparse' or 'native' (see preprocess_data)
+        """
+        if feature_encoding not in FEATURE_ENCODINGS:
+            raise ValueError(f"Unsupported feature encoding: {feature_encoding}")
+        self.booster = booster
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.lambdas = np.asarray(lambdas, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.categories = [[str(c) for c in cats] for cats in categories]
+        self.missing_value = missing_value
+        self.iteration_range = tuple(iteration_range)
+        self.feature_encoding = feature_encoding
+
+        if feature_encoding == 'native':
+            # One column per categorical feature holding the category code
+            self.category_index = [{c: i for i, c in enumerate(cats)} for cats in self.categories]
+            self.n_columns = len(NUMERIC_FEATURES) + len(CATEGORICAL_FEATURES)
+            self.feature_names = list(NUMERIC_FEATURES) + list(CATEGORICAL_FEATURES)
+        else:
+            # Precompute category -> output column index for each categorical feature
+            self.category_index = []
+            offset = len(NUMERIC_FEATURES)
+            for cats in self.categories:
+                self.category_index.append({c: offset + i for i, c in enumerate(cats)})
+                offset += len(cats)
+            self.n_columns = offset
+            self.feature_names = list(NUMERIC_FEATURES) + [
+                f"{feature}_{c}" for feature, cats in zip(CATEGORICAL_FEATURES, self.categories) for c in cats
+            ]
+        self._numeric_params = list(zip(NUMERIC_FEATURES, self.medians, self.lambdas, self.means, self.scales))
+        self._local = threading.local()
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        # Filled in from the manifest when loaded from an artifact
+        self.manifest = {}
+
+    @classmethod
+    def from_model(cls, ml_model):
+        """Compile a scorer from a trained MicroLoanRiskModelAdvanced."""
+        if ml_model.model is None or ml_model.preprocessor is None:
+            raise ValueError("Model not trained.")
+        feature_encoding = getattr(ml_model, 'feature_encoding', 'onehot')
+        try:
+            num = ml_model.preprocessor.named_transformers_['num']
+            cat = ml_model.preprocessor.named_transformers_['cat']
+            num_imputer = num.named_steps['imputer']
+            power = num.named_steps['power']
+            cat_imputer = cat.named_steps['imputer']
+            encoder = cat.named_steps['categories' if feature_encoding == 'native' else 'onehot']
+        except (AttributeError, KeyError) as e:
+            raise ValueError(f"Unsupported preprocessor layout: {str(e)}")
+
+        if power.method != 'yeo-johnson':
+            raise ValueError(f"Unsupported power transform: {power.method}")
+        n_numeric = len(NUMERIC_FEATURES)
+        if power.standardize:
+            means, scales = power._scaler.mean_, power._scaler.scale_
+        else:
+            means, scales = np.zeros(n_numeric), np.ones(n_numeric)
+
+        booster = ml_model.model.get_booster()
+        iteration_range = (0, 0)
+        try:
+            iteration_range = (0, ml_model.model.best_iteration + 1)
+        except AttributeError:
+            pass
+
+        return cls(
+            booster=booster,
+            medians=num_imputer.statistics_,
+            lambdas=power.lambdas_,
+            means=means,
+            scales=scales,
+            categories=[list(c) for c in encoder.categories_],
+            missing_value=cat_imputer.fill_value,
+            iteration_range=iteration_range,
+            feature_encoding=feature_encoding
+        )
+
+    def _buffer(self):
+        # One reusable single-row buffer per thread
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None:
+            buf = np.zeros((1, self.n_columns), dtype=np.float32)
+            self._local.buffer = buf
+        return buf
+
+    def _predict_matrix(self, X):
+        predictions = self.booster.inplace_predict(
+            X, iteration_range=self.iteration_range, validate_features=False
+        )
+        return np.clip(predictions, 0, 100)
+
+    def predict_one(self, record):
+        """
+        Score a single loan given as a dict with the 7 model features.
+
+        Returns:
+            float: The credit score (0-100)
+        """
+        buf = self._buffer()
+        buf.fill(0)
+        row = buf[0]
+        for i, (feature, median, lmbda, mean, scale) in enumerate(self._numeric_params):
+            value = record[feature]
+            value = math.nan if value is None else float(value)
+            if math.isnan(value):
+                value = median
+            row[i] = (_yeo_johnson_scalar(value, lmbda) - mean) / scale
+        native = self.feature_encoding == 'native'
+        for j, (feature, index) in enumerate(zip(CATEGORICAL_FEATURES, self.category_index)):
+            value = record[feature]
+            if _is_missing(value):
+                value = self.missing_value
+            column = index.get(value)
+            if native:
+                row[len(NUMERIC_FEATURES) + j] = math.nan if column is None else column
+            elif column is not None:
+                row[column] = 1.0
+        if self.feature_encoding == 'sparse':
+            row[row == 0] = np.nan
+        return float(self._predict_matrix(buf)[0])
+
+    def transform(self, X):
+        """
+        Preprocess a batch into the model's float32 feature matrix.
+
+        Args:
+            X: A list of dicts, or a columnar mapping (dict of lists or DataFrame)
+
+        Returns:
+            np.ndarray of shape (n_rows, n_columns)
+        """
+        columns = _as_columns(X)
+        n_rows = len(columns[NUMERIC_FEATURES[0]])
+        out = np.zeros((n_rows, self.n_columns), dtype=np.float32)
+        for i, (feature, median, lmbda, mean, scale) in enumerate(self._numeric_params):
+            values = np.asarray(columns[feature], dtype=np.float64)
+            values = np.where(np.isnan(values), median, values)
+            out[:, i] = (yeo_johnson(values, lmbda) - mean) / scale
+        rows = np.arange(n_rows)
+        for j, (feature, index) in enumerate(zip(CATEGORICAL_FEATURES, self.category_index)):
+            missing_column = index.get(self.missing_value, -1)
+            cols = np.fromiter(
+                (missing_column if _is_missing(v) else index.get(v, -1) for v in columns[feature]),
+                dtype=np.int64, count=n_rows
+            )
+            known = cols >= 0
+            if self.feature_encoding == 'native':
+                out[:, len(NUMERIC_FEATURES) + j] = np.where(known, cols, np.nan)
+            else:
+                out[rows[known], cols[known]] = 1.0
+        if self.feature_encoding == 'sparse':
+            out[out == 0] = np.nan
+        return out
+
+    def predict(self, X):
+        """
+        Score a batch of loans.
+
+        Args:
+            X: A list of dicts, or a columnar mapping (dict of lists or DataFrame)
+
+        Returns:
+            np.ndarray of credit scores (0-100)
+        """
+        return self._predict_matrix(self.transform(X))
+
+    def explainer(self):
+        """The TreeShapExplainer of this scorer's booster, built on first use."""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    from explanations import TreeShapExplainer
+                    self._explainer = TreeShapExplainer.from_scorer(self)
+        return self._explainer
+
+    def explain(self, X):
+        """
+        Score a batch of loans and attribute each score to the 7 features
+        with path-dependent TreeSHAP (see explanations.py).
+
+        Args:
+            X: A list of dicts, or a columnar mapping (dict of lists or DataFrame)
+
+        Returns:
+            tuple: (scores (0-100), (n_rows, 7) contributions in
+            NUMERIC_FEATURES + CATEGORICAL_FEATURES order, expected score).
+            Contributions plus the expected score give the unclipped score.
+        """
+        matrix = self.transform(X)
+        contributions, expected_value = self.explainer().shap_values(matrix)
+        return self._predict_matrix(matrix), contributions, expected_value
+
+    def content_version(self):
+        """
+        Content hash of the booster and the preprocessing parameters. It does
+        not depend on the process, the save format or file timestamps, so
+        identical models always get identical versions.
+        """
+        digest = hashlib.sha256(bytes(self.booster.save_raw('ubj')))
+        for array in (self.medians, self.lambdas, self.means, self.scales):
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        digest.update(json.dumps([self.categories, self.missing_value, self.feature_encoding,
+                                  list(self.iteration_range)], default=str).encode())
+        return digest.hexdigest()[:16]
+
+    def save(self, dirpath, booster_format='ubj', metadata=None):
+        """
+        Write a lean inference artifact to `dirpath`:
+          - booster.ubj (or booster.json): the booster in XGBoost's native format
+          - preprocessing.npz: the preprocessing parameters as plain arrays
+          - manifest.json: feature layout, file names, model version and metadata
+
+        Args:
+            dirpath: Output directory (created if needed)
+            booster_format: 'ubj' or 'json'
+            metadata: Optional JSON-serializable dict stored in the manifest
+
+        Returns:
+            dict: The manifest that was written
+        """
+        if booster_format not in ('ubj', 'json'):
+            raise ValueError(f"Unsupported booster format: {booster_format}")
+        os.makedirs(dirpath, exist_ok=True)
+
+        booster_file = f'booster.{booster_format}'
+        self.booster.save_model(os.path.join(dirpath, booster_file))
+        arrays = {
+            'medians': self.medians,
+            'lambdas': self.lambdas,
+            'means': self.means,
+            'scales': self.scales,
+        }
+        for i, cats in enumerate(self.categories):
+            arrays[f'categories_{i}'] = np.array(cats, dtype=str)
+        np.savez(os.path.join(dirpath, PREPROCESSING_FILE), **arrays)
+
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'model_version': self.content_version(),
+            'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'booster_file': booster_file,
+            'preprocessing_file': PREPROCESSING_FILE,
+            'numeric_features': NUMERIC_FEATURES,
+            'categorical_features': CATEGORICAL_FEATURES,
+            'missing_value': self.missing_value,
+            'feature_encoding': self.feature_encoding,
+            'iteration_range': list(self.iteration_range),
+            'n_columns': self.n_columns,
+            'metadata': metadata or {},
+        }
+        with open(os.path.join(dirpath, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self.manifest = manifest
+        return manifest
+
+
+def is_artifact(path):
+    """Return True if `path` is an inference artifact directory."""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def load_artifact(dirpath, nthread=None):
+    """
+    Load an inference artifact written by CompiledScorer.save.
+
+    Only numpy and xgboost are needed; nothing from the training code is unpickled.
+
+    Args:
+        dirpath: Artifact directory
+        nthread: Optional thread count for the booster
+
+    Returns:
+        CompiledScorer with its `manifest` attribute set
+    """
+    import xgboost as xgb
+
+    manifest_path = os.path.join(dirpath, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Artifact manifest not found at {manifest_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format: {manifest.get('format_version')}")
+    if (manifest['numeric_features'] != NUMERIC_FEATURES
+            or manifest['categorical_features'] != CATEGORICAL_FEATURES):
+        raise ValueError("Artifact feature layout does not match this scorer")
+
+    booster = xgb.Booster(model_file=os.path.join(dirpath, manifest['booster_file']))
+    if nthread is not None:
+        booster.set_param({'nthread': nthread})
+    with np.load(os.path.join(dirpath, manifest['preprocessing_file']), allow_pickle=False) as arrays:
+        scorer = CompiledScorer(
+            booster=booster,
+            medians=arrays['medians'],
+            lambdas=arrays['lambdas'],
+            means=arrays['means'],
+            scales=arrays['scales'],
+            categories=[arrays[f'categories_{i}'].tolist() for i in range(len(CATEGORICAL_FEATURES))],
+            missing_value=manifest['missing_value'],
+            iteration_range=manifest['iteration_range'],
+            feature_encoding=manifest.get('feature_encoding', 'onehot')
+        )
+    scorer.manifest = manifest
+    return scorer
+
+
+def _as_columns(X):
+    """Return a mapping from each model feature to its sequence of values."""
+    features = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+    if isinstance(X, dict) or hasattr(X, 'columns'):
+        missing = [f for f in features if f not in X]
+        if missing:
+            raise ValueError(f"Missing required features: {missing}")
+        return {f: list(X[f]) if hasattr(X, 'columns') else X[f] for f in features}
+    rows = list(X)
+    for row in rows:
+        missing = [f for f in features if f not in row]
+        if missing:
+            raise ValueError(f"Missing required features: {missing}")
+    return {f: [row[f] for row in rows] for f in features}
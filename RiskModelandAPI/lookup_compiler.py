@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Lookup Table Compiler
+
+Compiles the trained booster and fitted preprocessing into lookup tables
+for exact, branch-free scoring with numpy only (no XGBoost at serve time).
+
+The model sees 3 numeric and 4 categorical fields. A tree ensemble is
+piecewise constant between the split thresholds it actually uses, so:
+  - Numeric fields: after the (monotone) imputation, Yeo-Johnson and
+    scaling, a value is mapped with searchsorted to its bin among all of
+    the ensemble's thresholds on that field. The bins are computed in
+    float32, exactly as the booster compares them. A value the model sees
+    as missing gets its own bin.
+  - Categorical fields: each known category has its own code, and unknown
+    categories share one code.
+  - Trees are packed greedily into groups. For every field, a group only
+    tells apart the codes on which some of its splits decide differently.
+    Each group's output is tabulated once, in a dense table over the
+    product of those classes. Groups are capped by max_group_size, and all
+    tables together by max_table_entries: a model whose trees are too
+    complex for that budget (typically deep trees) is refused with a
+    ValueError before any table is built.
+
+Scoring a batch is one searchsorted per numeric field, one dictionary
+lookup per categorical value, then per group one gather from the code
+maps and one from the table, summed over the groups. The result equals
+the booster's prediction up to float32 summation order.
+
+Usage:
+    python lookup_compiler.py --model microloan_risk_model_advanced --output lookup_tables.npz
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from inference import CATEGORICAL_FEATURES, NUMERIC_FEATURES, _as_columns, _is_missing, yeo_johnson
+
+FIELDS = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+
+# Largest dense table (entries) a group of trees may share
+MAX_GROUP_SIZE = 1 << 14
+
+# Total table entries (float32) a compiled model may have: 32 MB
+MAX_TABLE_ENTRIES = 1 << 23
+
+# Rows scored per vectorized chunk, bounding the (rows x groups) index matrix
+CHUNK_ROWS = 4096
+
+# Table entries evaluated per chunk while compiling, bounding the (entries x columns) matrix
+BUILD_CHUNK_ROWS = 1 << 14
+
+LOOKUP_FORMAT_VERSION = 1
+
+
+def parse_trees(booster, iteration_range):
+    """Split and leaf arrays of the trees in iteration_range, and the base score."""
+    learner = json.loads(bytes(booster.save_raw('json')))['learner']
+    objective = learner['objective']['name']
+    if objective != 'reg:squarederror':
+        raise ValueError(f"Unsupported objective for lookup tables: {objective}")
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]').split(',')[0])
+    model = learner['gradient_booster']['model']
+    trees = model['trees']
+    if iteration_range[1]:
+        indptr = model.get('iteration_indptr') or list(range(len(trees) + 1))
+        trees = trees[:indptr[iteration_range[1]]]
+
+    parsed = []
+    for tree in trees:
+        n_nodes = len(tree['left_children'])
+        split_type = tree.get('split_type') or [0] * n_nodes
+        category_lists = {}
+        for node, start, size in zip(tree.get('categories_nodes', []), tree.get('categories_segments', []),
+                                     tree.get('categories_sizes', [])):
+            category_lists[node] = tree['categories'][start:start + size]
+        width = max([max(cats, default=0) for cats in category_lists.values()], default=0) + 1
+        category_sets = np.zeros((n_nodes, width), dtype=bool)
+        for node, cats in category_lists.items():
+            category_sets[node, cats] = True
+        parsed.append({
+            'left': np.array(tree['left_children'], dtype=np.int64),
+            'right': np.array(tree['right_children'], dtype=np.int64),
+            'feature': np.array(tree['split_indices'], dtype=np.int64),
+            # Split thresholds for split nodes, leaf values for leaves
+            'condition': np.array(tree['split_conditions'], dtype=np.float32),
+            'default_left': np.array(tree['default_left'], dtype=bool),
+            'categorical': np.array(split_type, dtype=np.int64) == 1,
+            'category_sets': category_sets,
+        })
+    return parsed, base_score
+
+
+def _go_left(tree, nodes, values):
+    """Whether each value goes left at the split node paired with it."""
+    missing = np.isnan(values)
+    go_left = values < tree['condition'][nodes]
+    categorical = tree['categorical'][nodes]
+    if categorical.any():
+        sets = tree['category_sets']
+        codes = np.where(missing, -1, values)
+        valid = (codes >= 0) & (codes < sets.shape[1])
+        in_set = np.zeros(len(values), dtype=bool)
+        in_set[valid] = sets[nodes[valid], codes[valid].astype(np.int64)]
+        # Categories in a split's set go right
+        go_left = np.where(categorical, ~in_set, go_left)
+    return np.where(missing, tree['default_left'][nodes], go_left)
+
+
+def _evaluate(tree, X):
+    """Leaf value reached by each row of the model-column matrix X."""
+    node = np.zeros(len(X), dtype=np.int64)
+    while True:
+        active = np.flatnonzero(tree['left'][node] != -1)
+        if not len(active):
+            return tree['condition'][node]
+        nodes = node[active]
+        go_left = _go_left(tree, nodes, X[active, tree['feature'][nodes]])
+        node[active] = np.where(go_left, tree['left'][nodes], tree['right'][nodes])
+
+
+def _combine(a, b):
+    """Class ids of the pairs (a[i], b[i])."""
+    return np.unique(a * (int(b.max()) + 1) + b, return_inverse=True)[1].ravel()
+
+
+class LookupTableScorer:
+    """
+    Scores loans from precomputed tables with numpy only; see the module
+    docstring. Built by compile_lookup_scorer or load_lookup_scorer.
+    """
+
+    def __init__(self, medians, lambdas, means, scales, thresholds, categories, missing_value,
+                 feature_encoding, tables, offsets, maps, base_score):
+        """
+        Args:
+            medians, lambdas, means, scales: Numeric preprocessing, as in CompiledScorer
+            thresholds: Per numeric feature, the sorted float32 split thresholds
+            categories: Per categorical feature, the known categories
+            missing_value: Category substituted for missing categorical input
+            feature_encoding: 'onehot', 'sparse' or 'native'
+            tables: float32 concatenation of the group tables
+            offsets: (n_groups,) start of each group's table
+            maps: Per field, an (n_codes, n_groups) int32 array giving each
+                code's position in each group's table
+            base_score: The booster's base score
+        """
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.lambdas = np.asarray(lambdas, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.thresholds = [np.asarray(t, dtype=np.float32) for t in thresholds]
+        self.categories = [[str(c) for c in cats] for cats in categories]
+        self.category_index = [{c: i for i, c in enumerate(cats)} for cats in self.categories]
+        self.missing_value = missing_value
+        self.feature_encoding = feature_encoding
+        self.tables = np.asarray(tables, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.maps = [np.asarray(m, dtype=np.int32) for m in maps]
+        self.base_score = float(base_score)
+
+    def codes(self, X):
+        """Per field, the bin (numeric) or category code of each loan."""
+        columns = _as_columns(X)
+        codes = []
+        for i, feature in enumerate(NUMERIC_FEATURES):
+            values = np.asarray(columns[feature], dtype=np.float64)
+            values = np.where(np.isnan(values), self.medians[i], values)
+            values = ((yeo_johnson(values, self.lambdas[i]) - self.means[i]) / self.scales[i]).astype(np.float32)
+            if self.feature_encoding == 'sparse':
+                values[values == 0] = np.nan  # zeros are missing to a model trained on CSR data
+            code = np.searchsorted(self.thresholds[i], values, side='right')
+            code[np.isnan(values)] = len(self.thresholds[i]) + 1
+            codes.append(code)
+        for feature, index in zip(CATEGORICAL_FEATURES, self.category_index):
+            unknown = len(index)
+            codes.append(np.fromiter(
+                (index.get(self.missing_value if _is_missing(v) else v, unknown) for v in columns[feature]),
+                dtype=np.int64, count=len(columns[feature])
+            ))
+        return codes
+
+    def predict(self, X):
+        """
+        Score a batch of loans.
+
+        Args:
+            X: A list of dicts, or a columnar mapping (dict of lists or DataFrame)
+
+        Returns:
+            np.ndarray of credit scores (0-100)
+        """
+        codes = self.codes(X)
+        n_rows = len(codes[0])
+        scores = np.empty(n_rows, dtype=np.float64)
+        for start in range(0, n_rows, CHUNK_ROWS):
+            # (rows, groups) table positions; each code's map is one contiguous row
+            index = self.offsets + self.maps[0][codes[0][start:start + CHUNK_ROWS]]
+            for field_map, code in zip(self.maps[1:], codes[1:]):
+                index += field_map[code[start:start + CHUNK_ROWS]]
+            scores[start:start + CHUNK_ROWS] = self.tables[index].sum(axis=1, dtype=np.float64)
+        return np.clip(scores + self.base_score, 0, 100)
+
+    def predict_one(self, record):
+        """Score a single loan given as a dict with the 7 model features."""
+        return float(self.predict([record])[0])
+
+    def memory_report(self):
+        """Size of the compiled structure: groups, table entries and bytes per component."""
+        table_bytes = self.tables.nbytes + self.offsets.nbytes
+        map_bytes = sum(m.nbytes for m in self.maps)
+        threshold_bytes = sum(t.nbytes for t in self.thresholds)
+        return {
+            'n_groups': len(self.offsets),
+            'table_entries': int(self.tables.size),
+            'bins': {f: len(t) + 2 for f, t in zip(NUMERIC_FEATURES, self.thresholds)},
+            'categories': {f: len(c) + 1 for f, c in zip(CATEGORICAL_FEATURES, self.categories)},
+            'table_bytes': table_bytes,
+            'map_bytes': map_bytes,
+            'threshold_bytes': threshold_bytes,
+            'total_bytes': table_bytes + map_bytes + threshold_bytes,
+        }
+
+    def save(self, path):
+        """Write the scorer to a single .npz file (read back with load_lookup_scorer)."""
+        arrays = {
+            'medians': self.medians, 'lambdas': self.lambdas, 'means': self.means, 'scales': self.scales,
+            'tables': self.tables, 'offsets': self.offsets,
+        }
+        for i, thresholds in enumerate(self.thresholds):
+            arrays[f'thresholds_{i}'] = thresholds
+        for i, cats in enumerate(self.categories):
+            arrays[f'categories_{i}'] = np.array(cats, dtype=str)
+        for i, field_map in enumerate(self.maps):
+            arrays[f'map_{i}'] = field_map
+        meta = {
+            'format_version': LOOKUP_FORMAT_VERSION,
+            'fields': FIELDS,
+            'missing_value': self.missing_value,
+            'feature_encoding': self.feature_encoding,
+            'base_score': self.base_score,
+        }
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def load_lookup_scorer(path):
+    """Load a LookupTableScorer written by LookupTableScorer.save; needs numpy only."""
+    with np.load(path, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays['meta']))
+        if meta.get('format_version') != LOOKUP_FORMAT_VERSION:
+            raise ValueError(f"Unsupported lookup table format: {meta.get('format_version')}")
+        if meta['fields'] != FIELDS:
+            raise ValueError("Lookup table feature layout does not match this scorer")
+        return LookupTableScorer(
+            medians=arrays['medians'], lambdas=arrays['lambdas'], means=arrays['means'], scales=arrays['scales'],
+            thresholds=[arrays[f'thresholds_{i}'] for i in range(len(NUMERIC_FEATURES))],
+            categories=[arrays[f'categories_{i}'].tolist() for i in range(len(CATEGORICAL_FEATURES))],
+            missing_value=meta['missing_value'],
+            feature_encoding=meta['feature_encoding'],
+            tables=arrays['tables'],
+            offsets=arrays['offsets'],
+            maps=[arrays[f'map_{i}'] for i in range(len(FIELDS))],
+            base_score=meta['base_score'],
+        )
+
+
+def _field_codes(scorer, trees):
+    """
+    Per field: the model columns it occupies, the values of those columns for
+    each of its codes, and (numeric fields) the sorted split thresholds.
+    """
+    n_numeric = len(NUMERIC_FEATURES)
+    native = scorer.feature_encoding == 'native'
+    columns, values, thresholds = [], [], []
+    for i in range(n_numeric):
+        used = np.concatenate([t['condition'][(t['left'] != -1) & (t['feature'] == i)] for t in trees])
+        cuts = np.unique(used).astype(np.float32)
+        thresholds.append(cuts)
+        columns.append(np.array([i]))
+        # Bin 0 is below every threshold, bin k starts at threshold k-1, the last bin is missing
+        values.append(np.concatenate([[-np.inf], cuts, [np.nan]]).astype(np.float32)[:, None])
+    offset = n_numeric
+    for j, cats in enumerate(scorer.categories):
+        n = len(cats)
+        if native:
+            columns.append(np.array([n_numeric + j]))
+            values.append(np.concatenate([np.arange(n), [np.nan]]).astype(np.float32)[:, None])
+            continue
+        columns.append(np.arange(offset, offset + n))
+        block = np.full((n + 1, n), np.nan if scorer.feature_encoding == 'sparse' else 0.0, dtype=np.float32)
+        block[np.arange(n), np.arange(n)] = 1.0  # the last code (unknown) sets no column
+        values.append(block)
+        offset += n
+    return columns, values, thresholds
+
+
+def _tree_classes(tree, columns, values, field_of_column, local_column):
+    """Per field, the class of each code: codes in a class take the same branch at every split on the field."""
+    split_nodes = np.flatnonzero(tree['left'] != -1)
+    classes = []
+    for f, field_values in enumerate(values):
+        nodes = split_nodes[field_of_column[tree['feature'][split_nodes]] == f]
+        if not len(nodes):
+            classes.append(np.zeros(len(field_values), dtype=np.int64))
+            continue
+        node_values = field_values[:, local_column[tree['feature'][nodes]]]
+        decisions = _go_left(tree, np.broadcast_to(nodes, node_values.shape).ravel(), node_values.ravel())
+        decisions = decisions.reshape(node_values.shape)
+        classes.append(np.unique(decisions, axis=0, return_inverse=True)[1].ravel())
+    return classes
+
+
+def compile_lookup_scorer(model, max_group_size=MAX_GROUP_SIZE, max_table_entries=MAX_TABLE_ENTRIES):
+    """
+    Compile a trained model into a LookupTableScorer.
+
+    Args:
+        model: A trained MicroLoanRiskModelAdvanced or a CompiledScorer
+            (e.g. from inference.load_artifact)
+        max_group_size: Largest table a group of trees may share; larger
+            means fewer, bigger tables (trees too complex for the limit
+            still get a table of their own)
+        max_table_entries: Budget for all tables together
+
+    Returns:
+        LookupTableScorer
+
+    Raises:
+        ValueError: If the tables would exceed max_table_entries
+    """
+    scorer = model if hasattr(model, 'booster') else model.compile_scorer()
+    trees, base_score = parse_trees(scorer.booster, scorer.iteration_range)
+    columns, values, thresholds = _field_codes(scorer, trees)
+    n_columns = sum(len(c) for c in columns)
+    field_of_column = np.empty(n_columns, dtype=np.int64)
+    local_column = np.empty(n_columns, dtype=np.int64)
+    for f, cols in enumerate(columns):
+        field_of_column[cols] = f
+        local_column[cols] = np.arange(len(cols))
+
+    # Pack consecutive trees while the product of their joint classes stays small
+    groups, total = [], 0.0
+    for k, tree in enumerate(trees):
+        classes = _tree_classes(tree, columns, values, field_of_column, local_column)
+        size = np.prod([int(c.max()) + 1 for c in classes], dtype=np.float64)
+        if size > max_table_entries:
+            raise ValueError(f"Tree {k} alone needs a lookup table of {size:,.0f} entries, over the budget of "
+                             f"{max_table_entries:,} (max_table_entries); use another scoring backend")
+        if groups:
+            merged = [_combine(a, b) for a, b in zip(groups[-1][1], classes)]
+            merged_size = np.prod([int(c.max()) + 1 for c in merged], dtype=np.float64)
+            if merged_size <= max_group_size:
+                total += merged_size - groups[-1][2]
+                groups[-1] = [groups[-1][0] + [tree], merged, merged_size]
+                continue
+        groups.append([[tree], classes, size])
+        total += size
+        if total > max_table_entries:
+            raise ValueError(f"Lookup tables need more than {max_table_entries:,} entries (max_table_entries) "
+                             f"by tree {k} of {len(trees)}; use another scoring backend")
+
+    tables, offsets, maps, position = [], [], [[] for _ in FIELDS], 0
+    for group_trees, classes, size in groups:
+        shape = [int(c.max()) + 1 for c in classes]
+        strides = [int(np.prod(shape[f + 1:])) for f in range(len(shape))]
+        # One representative code per class
+        representatives = []
+        for f, c in enumerate(classes):
+            first = np.empty(shape[f], dtype=np.int64)
+            first[c[::-1]] = np.arange(len(c))[::-1]
+            representatives.append(first)
+            maps[f].append(c * strides[f])
+        table = np.zeros(int(size), dtype=np.float64)
+        # The model columns of every class combination, a chunk of the table at a time
+        for start in range(0, len(table), BUILD_CHUNK_ROWS):
+            grid = np.unravel_index(np.arange(start, min(start + BUILD_CHUNK_ROWS, len(table))), shape)
+            X = np.empty((len(grid[0]), n_columns), dtype=np.float32)
+            for f, first in enumerate(representatives):
+                X[:, columns[f]] = values[f][first[grid[f]]]
+            for tree in group_trees:
+                table[start:start + len(X)] += _evaluate(tree, X)
+        tables.append(table.astype(np.float32))
+        offsets.append(position)
+        position += len(table)
+
+    return LookupTableScorer(
+        medians=scorer.medians, lambdas=scorer.lambdas, means=scorer.means, scales=scorer.scales,
+        thresholds=thresholds,
+        categories=scorer.categories,
+        missing_value=scorer.missing_value,
+        feature_encoding=scorer.feature_encoding,
+        tables=np.concatenate(tables) if tables else np.zeros(1, dtype=np.float32),
+        offsets=offsets if offsets else [0],
+        maps=[np.stack(m, axis=1) if m else np.zeros((len(v), 1), dtype=np.int32) for m, v in zip(maps, values)],
+        base_score=base_score,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile a trained risk model into lookup tables')
+    parser.add_argument('--model', default='microloan_risk_model_advanced',
+                        help='Inference artifact directory or pickle saved by train_model')
+    parser.add_argument('--output', default='lookup_tables.npz', help='Compiled tables (.npz)')
+    parser.add_argument('--max-group-size', type=int, default=MAX_GROUP_SIZE,
+                        help='Largest table shared by a group of trees')
+    parser.add_argument('--max-table-entries', type=int, default=MAX_TABLE_ENTRIES,
+                        help='Budget for all tables together; larger models are refused')
+    args = parser.parse_args()
+
+    from inference import is_artifact, load_artifact
+    if is_artifact(args.model):
+        model = load_artifact(args.model)
+    else:
+        from incremental import load_trained_model
+        model = load_trained_model(args.model)
+    lookup = compile_lookup_scorer(model, args.max_group_size, args.max_table_entries)
+    lookup.save(args.output)
+    report = lookup.memory_report()
+    print(f"Compiled {report['n_groups']} tables ({report['table_entries']:,} entries) to {args.output}")
+    print(f"Memory: tables {report['table_bytes'] / 1e6:.2f} MB, code maps {report['map_bytes'] / 1e6:.2f} MB, "
+          f"thresholds {report['threshold_bytes'] / 1e3:.1f} KB, total {report['total_bytes'] / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - ONNX Export
+
+Converts the fitted preprocessing and the booster into one ONNX graph, so
+loans can be scored with onnxruntime alone: no sklearn, pandas or XGBoost
+at serve time. The graph has two inputs:
+  - amounts: double [N, 3], NUMERIC_FEATURES order, NaN for missing
+  - categories: string [N, 4], CATEGORICAL_FEATURES order
+and one output, score: float [N], the credit score (0-100).
+
+Inside the graph:
+  - Numeric columns: median imputation, Yeo-Johnson with the fitted
+    lambdas and standardization, computed in double and cast to float32
+    (as in CompiledScorer).
+  - Categorical columns: a LabelEncoder per column maps each category to
+    its one-hot column; unknown categories set no column.
+  - For sparse models, zeros become missing.
+  - Trees: a TreeEnsembleRegressor (ai.onnx.ml) holding the booster's
+    trees, thresholds, default directions and base score.
+
+Missing categorical values are replaced by the imputer's fill value before
+they reach the graph (OnnxScorer does this). Models trained with
+feature_encoding='native' use categorical set splits, which
+TreeEnsembleRegressor cannot express; exporting them raises ValueError.
+
+The graph's metadata records the source model_version, so a stale
+model.onnx next to an updated artifact is detected.
+
+Usage:
+    python onnx_export.py --model microloan_risk_model_advanced
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from inference import CATEGORICAL_FEATURES, NUMERIC_FEATURES, _as_columns, _is_missing
+from lookup_compiler import parse_trees
+
+# File name of the exported graph inside an inference artifact directory
+ONNX_FILE = 'model.onnx'
+
+ONNX_OPSET = 17
+ONNX_ML_OPSET = 3
+# Pinned so older onnxruntime releases can load the graph
+ONNX_IR_VERSION = 8
+
+
+def build_onnx_model(model, model_version=None):
+    """
+    Build the ONNX graph of a trained model.
+
+    Args:
+        model: A trained MicroLoanRiskModelAdvanced or a CompiledScorer
+        model_version: Version recorded in the graph's metadata (default:
+            the artifact manifest's, or the model's content hash)
+
+    Returns:
+        onnx.ModelProto
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    scorer = model if hasattr(model, 'booster') else model.compile_scorer()
+    if scorer.feature_encoding == 'native':
+        raise ValueError("ONNX export supports the onehot and sparse feature encodings, not native")
+    trees, base_score = parse_trees(scorer.booster, scorer.iteration_range)
+    if model_version is None:
+        model_version = scorer.manifest.get('model_version') or (
+            model.model_version() if hasattr(model, 'model_version') else '')
+
+    nodes, initializers = [], []
+
+    def const(name, value, dtype):
+        initializers.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), name))
+        return name
+
+    def op(op_type, inputs, output, **attrs):
+        nodes.append(helper.make_node(op_type, inputs, [output], **attrs))
+        return output
+
+    # Numeric columns: impute, Yeo-Johnson, standardize (double), then float32
+    lambdas = scorer.lambdas
+    zero, one = const('zero', 0.0, np.float64), const('one', 1.0, np.float64)
+    x = op('Where', [op('IsNaN', ['amounts'], 'amounts_missing'), const('medians', scorer.medians, np.float64),
+                     'amounts'], 'imputed')
+    positive = op('GreaterOrEqual', [x, zero], 'positive')
+    log_pos = op('Log', [op('Add', [one, op('Where', [positive, x, zero], 'x_pos')], 'one_plus_x')], 'log_pos')
+    log_neg = op('Log', [op('Sub', [one, op('Where', [positive, zero, x], 'x_neg')], 'one_minus_x')], 'log_neg')
+    lam_zero = np.abs(lambdas) < np.spacing(1.0)
+    lam_two = np.abs(lambdas - 2) <= np.spacing(1.0)
+    lam = const('lambdas', np.where(lam_zero, 1.0, lambdas), np.float64)
+    two_minus = const('two_minus_lambdas', np.where(lam_two, 1.0, 2 - lambdas), np.float64)
+    pos_power = op('Div', [op('Sub', [op('Exp', [op('Mul', [lam, log_pos], 'lam_log_pos')], 'exp_pos'), one],
+                              'expm1_pos'), lam], 'pos_power')
+    neg_power = op('Div', [op('Sub', [op('Exp', [op('Mul', [two_minus, log_neg], 'lam_log_neg')], 'exp_neg'), one],
+                              'expm1_neg'), two_minus], 'neg_power')
+    pos_value = op('Where', [const('lambda_is_zero', lam_zero, bool), log_pos, pos_power], 'pos_value')
+    neg_value = op('Neg', [op('Where', [const('lambda_is_two', lam_two, bool), log_neg, neg_power], 'neg_abs')],
+                   'neg_value')
+    transformed = op('Where', [positive, pos_value, neg_value], 'yeo_johnson')
+    scaled = op('Div', [op('Sub', [transformed, const('means', scorer.means, np.float64)], 'centered'),
+                        const('scales', scorer.scales, np.float64)], 'scaled')
+    numeric = op('Cast', [scaled], 'numeric', to=TensorProto.FLOAT)
+
+    # Categorical columns: category -> one-hot column, summed over the 4 fields
+    width = sum(len(cats) for cats in scorer.categories)
+    column_indices, offset = [], 0
+    for j, cats in enumerate(scorer.categories):
+        column = op('Gather', ['categories', const(f'field_{j}', [j], np.int64)], f'category_{j}', axis=1)
+        column_indices.append(op('LabelEncoder', [column], f'onehot_index_{j}', domain='ai.onnx.ml',
+                                 keys_strings=list(cats), values_int64s=list(range(offset, offset + len(cats))),
+                                 default_int64=width))
+        offset += len(cats)
+    indices = op('Concat', column_indices, 'onehot_indices', axis=1)
+    # Unknown categories land in an extra column that is dropped again
+    onehot = op('OneHot', [indices, const('depth', width + 1, np.int64), const('onehot_values', [0.0, 1.0],
+                                                                              np.float32)], 'onehot', axis=-1)
+    summed = op('ReduceSum', [onehot, const('field_axis', [1], np.int64)], 'onehot_summed', keepdims=0)
+    categorical = op('Slice', [summed, const('slice_start', [0], np.int64), const('slice_end', [width], np.int64),
+                               const('slice_axis', [1], np.int64)], 'categorical')
+    features = op('Concat', [numeric, categorical], 'features', axis=1)
+    if scorer.feature_encoding == 'sparse':
+        # The booster was trained on CSR data, where zeros are missing
+        features = op('Where', [op('Equal', [features, const('zero_f', 0.0, np.float32)], 'is_zero'),
+                                const('nan_f', np.nan, np.float32), features], 'features_sparse')
+
+    # Trees
+    ensemble = {key: [] for key in (
+        'nodes_treeids', 'nodes_nodeids', 'nodes_featureids', 'nodes_values', 'nodes_modes',
+        'nodes_truenodeids', 'nodes_falsenodeids', 'nodes_missing_value_tracks_true',
+        'target_treeids', 'target_nodeids', 'target_ids', 'target_weights')}
+    for tree_id, tree in enumerate(trees):
+        for node in range(len(tree['left'])):
+            leaf = tree['left'][node] == -1
+            ensemble['nodes_treeids'].append(tree_id)
+            ensemble['nodes_nodeids'].append(node)
+            ensemble['nodes_featureids'].append(0 if leaf else int(tree['feature'][node]))
+            ensemble['nodes_values'].append(0.0 if leaf else float(tree['condition'][node]))
+            ensemble['nodes_modes'].append('LEAF' if leaf else 'BRANCH_LT')
+            ensemble['nodes_truenodeids'].append(0 if leaf else int(tree['left'][node]))
+            ensemble['nodes_falsenodeids'].append(0 if leaf else int(tree['right'][node]))
+            ensemble['nodes_missing_value_tracks_true'].append(0 if leaf else int(tree['default_left'][node]))
+            if leaf:
+                ensemble['target_treeids'].append(tree_id)
+                ensemble['target_nodeids'].append(node)
+                ensemble['target_ids'].append(0)
+                ensemble['target_weights'].append(float(tree['condition'][node]))
+    margin = op('TreeEnsembleRegressor', [features], 'margin', domain='ai.onnx.ml', n_targets=1,
+                aggregate_function='SUM', post_transform='NONE', base_values=[base_score], **ensemble)
+    clipped = op('Clip', [margin, const('score_min', 0.0, np.float32), const('score_max', 100.0, np.float32)],
+                 'clipped')
+    op('Reshape', [clipped, const('flat', [-1], np.int64)], 'score')
+
+    graph = helper.make_graph(
+        nodes, 'microloan_risk_model',
+        inputs=[helper.make_tensor_value_info('amounts', TensorProto.DOUBLE, [None, len(NUMERIC_FEATURES)]),
+                helper.make_tensor_value_info('categories', TensorProto.STRING, [None, len(CATEGORICAL_FEATURES)])],
+        outputs=[helper.make_tensor_value_info('score', TensorProto.FLOAT, [None])],
+        initializer=initializers,
+    )
+    onnx_model = helper.make_model(graph, producer_name='microloan-risk-model', ir_version=ONNX_IR_VERSION,
+                                   opset_imports=[helper.make_opsetid('', ONNX_OPSET),
+                                                  helper.make_opsetid('ai.onnx.ml', ONNX_ML_OPSET)])
+    helper.set_model_props(onnx_model, {
+        'model_version': model_version,
+        'missing_value': str(scorer.missing_value),
+        'feature_encoding': scorer.feature_encoding,
+        'numeric_features': ','.join(NUMERIC_FEATURES),
+        'categorical_features': ','.join(CATEGORICAL_FEATURES),
+    })
+    onnx.checker.check_model(onnx_model)
+    return onnx_model
+
+
+def export_onnx(model, path, model_version=None):
+    """Write the ONNX graph of a trained model to `path`; returns the path."""
+    import onnx
+
+    onnx.save(build_onnx_model(model, model_version), path)
+    return path
+
+
+class OnnxScorer:
+    """
+    Scores loans with onnxruntime, with the same predict / predict_one
+    interface as CompiledScorer.
+    """
+
+    def __init__(self, model, nthread=None):
+        """
+        Args:
+            model: Path to an exported graph, or its serialized bytes
+            nthread: Optional intra-op thread count for onnxruntime
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if nthread is not None:
+            options.intra_op_num_threads = nthread
+        self.session = ort.InferenceSession(model, options, providers=['CPUExecutionProvider'])
+        self.metadata = dict(self.session.get_modelmeta().custom_metadata_map)
+        if (self.metadata.get('numeric_features') != ','.join(NUMERIC_FEATURES)
+                or self.metadata.get('categorical_features') != ','.join(CATEGORICAL_FEATURES)):
+            raise ValueError("ONNX model feature layout does not match this scorer")
+        self.missing_value = self.metadata['missing_value']
+        self.model_version = self.metadata.get('model_version', '')
+
+    @classmethod
+    def from_model(cls, model, nthread=None):
+        """Export a trained model in memory and load it (needs onnx and onnxruntime)."""
+        return cls(build_onnx_model(model).SerializeToString(), nthread)
+
+    def _inputs(self, X):
+        columns = _as_columns(X)
+        amounts = np.column_stack([np.asarray(columns[f], dtype=np.float64) for f in NUMERIC_FEATURES])
+        categories = np.array([[self.missing_value if _is_missing(v) else str(v) for v in columns[f]]
+                               for f in CATEGORICAL_FEATURES], dtype=object).T
+        return {'amounts': amounts.reshape(-1, len(NUMERIC_FEATURES)),
+                'categories': categories.reshape(-1, len(CATEGORICAL_FEATURES))}
+
+    def predict(self, X):
+        """
+        Score a batch of loans.
+
+        Args:
+            X: A list of dicts, or a columnar mapping (dict of lists or DataFrame)
+
+        Returns:
+            np.ndarray of credit scores (0-100)
+        """
+        return self.session.run(['score'], self._inputs(X))[0]
+
+    def predict_one(self, record):
+        """Score a single loan given as a dict with the 7 model features."""
+        return float(self.predict([record])[0])
+
+
+def default_onnx_path(model_path):
+    """Where the export of a model lives: inside an artifact directory, or beside a pickle."""
+    from inference import is_artifact
+    if is_artifact(model_path):
+        return os.path.join(model_path, ONNX_FILE)
+    return os.path.splitext(model_path)[0] + '.onnx'
+
+
+def load_onnx_scorer(path, nthread=None, model_version=None):
+    """
+    Load an exported graph as an OnnxScorer; needs onnxruntime only.
+
+    Args:
+        path: The .onnx file, or an artifact directory containing ONNX_FILE
+        nthread: Optional intra-op thread count
+        model_version: If given, raise ValueError unless the graph was
+            exported from this model version
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, ONNX_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX model not found at {path}")
+    scorer = OnnxScorer(path, nthread)
+    if model_version is not None and scorer.model_version != model_version:
+        raise ValueError(f"{path} was exported from model {scorer.model_version}, not {model_version}")
+    return scorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a trained risk model to ONNX')
+    parser.add_argument('--model', default='microloan_risk_model_advanced',
+                        help='Inference artifact directory or pickle saved by train_model')
+    parser.add_argument('--output', default=None,
+                        help=f'Output .onnx file (default: {ONNX_FILE} inside the artifact directory, '
+                             'or beside the pickle)')
+    args = parser.parse_args()
+
+    from inference import is_artifact, load_artifact
+    if is_artifact(args.model):
+        model = load_artifact(args.model)
+    else:
+        from incremental import load_trained_model
+        model = load_trained_model(args.model)
+    output = args.output or default_onnx_path(args.model)
+    export_onnx(model, output)
+    print(f"ONNX model written to {output} ({os.path.getsize(output) / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
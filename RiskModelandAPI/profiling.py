@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Training Profiler
+
+Per-stage instrumentation of the training pipeline. The stages of
+MicroLoanRiskModelAdvanced (load, clean, prepare, preprocess, tune, train,
+fit, shap, plot, save) are decorated with @profiled. Outside a profiled
+run the decorator only calls the method. Inside `with profile_run() as
+profiler:` each stage records:
+  - wall time and CPU time (process time, so XGBoost's threads count;
+    worker processes do not)
+  - RSS at start and end, and the peak RSS increase while it ran (Linux:
+    from VmHWM, reset per stage; elsewhere a lower bound from ru_maxrss)
+  - rows and columns of its input and output
+  - start time and pid, to line the stage up with an external sampling
+    profiler recording (e.g. `py-spy record -o run.svg -- python boost_model.py`)
+
+Stages nest (fit runs inside train); each record keeps its depth and
+parent. profiler.write_report() writes the records as a JSON run report;
+train_model() stores it next to the saved model.
+
+To drill into a single stage, name it in `profile_stage` (or the
+MICROLOAN_PROFILE_STAGE environment variable): that stage runs under
+cProfile and its stats are dumped to <profile_dir>/<stage>.prof, for
+pstats, snakeviz or similar.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Stage to run under cProfile when profile_run() is not given one
+PROFILE_STAGE_ENV = 'MICROLOAN_PROFILE_STAGE'
+
+_active = None
+
+
+def proc_status_mb(field):
+    """A memory field (e.g. VmRSS, VmHWM) of this process from /proc, or None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux), so later peaks belong to the measured stage."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Peak RSS of this process in MB (since the last reset_peak_rss on Linux)."""
+    peak = proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def rss_mb():
+    """Current RSS of this process in MB (the peak where /proc is unavailable)."""
+    current = proc_status_mb('VmRSS')
+    return current if current is not None else peak_rss_mb()
+
+
+def _shape(value):
+    """(rows, columns) of a DataFrame, Series, array or sparse matrix, or None."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    shape = getattr(value, 'shape', None)
+    if shape is None or len(shape) == 0:
+        return None
+    return int(shape[0]), int(shape[1]) if len(shape) > 1 else 1
+
+
+class StageProfiler:
+    """Records one entry per profiled stage; see the module docstring."""
+
+    def __init__(self, profile_stage=None, profile_dir='.', log=print):
+        self.profile_stage = profile_stage or os.environ.get(PROFILE_STAGE_ENV) or None
+        self.profile_dir = profile_dir
+        self.log = log
+        self.records = []
+        self._open = []
+        self.started = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def _update_peaks(self):
+        # Fold the peak since the last reset into every open stage, then start a new window
+        peak = peak_rss_mb()
+        for record in self._open:
+            record['_peak_mb'] = max(record['_peak_mb'], peak)
+        reset_peak_rss()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure the enclosed block as stage `name`. Yields the stage record,
+        to which callers may add fields (e.g. rows and columns).
+        """
+        self._update_peaks()
+        rss_start = rss_mb()
+        record = {
+            'stage': name,
+            'depth': len(self._open),
+            'parent': self._open[-1]['stage'] if self._open else None,
+            'pid': os.getpid(),
+            'start': time.time(),
+            'rss_start_mb': rss_start,
+            '_peak_mb': rss_start,
+        }
+        self.records.append(record)
+        self._open.append(record)
+
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            self._update_peaks()
+            self._open.pop()
+            record['rss_end_mb'] = rss_mb()
+            record['peak_rss_delta_mb'] = record.pop('_peak_mb') - rss_start
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                record['profile'] = os.path.join(self.profile_dir, f'{name}.prof')
+                profiler.dump_stats(record['profile'])
+            self.log(f"[profile] {'  ' * record['depth']}{name}: {record['wall_seconds']:.2f}s wall, "
+                     f"{record['cpu_seconds']:.2f}s CPU, peak +{record['peak_rss_delta_mb']:.0f} MB")
+
+    def summary(self):
+        """Total wall and CPU seconds per stage name, for the top-level view."""
+        totals = {}
+        for record in self.records:
+            if 'wall_seconds' not in record:
+                continue
+            entry = totals.setdefault(record['stage'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                         'peak_rss_delta_mb': 0.0})
+            entry['calls'] += 1
+            entry['wall_seconds'] += record['wall_seconds']
+            entry['cpu_seconds'] += record['cpu_seconds']
+            entry['peak_rss_delta_mb'] = max(entry['peak_rss_delta_mb'], record['peak_rss_delta_mb'])
+        return totals
+
+    def report(self, **metadata):
+        """The run report as a JSON-serializable dict."""
+        return {
+            'started': datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M:%S"),
+            'wall_seconds': time.perf_counter() - self._wall_start,
+            'cpu_seconds': time.process_time() - self._cpu_start,
+            'peak_rss_mb': max([r['rss_start_mb'] + r['peak_rss_delta_mb']
+                                for r in self.records if 'peak_rss_delta_mb' in r] + [rss_mb()]),
+            'pid': os.getpid(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'profile_stage': self.profile_stage,
+            'metadata': metadata,
+            'summary': self.summary(),
+            'stages': self.records,
+        }
+
+    def write_report(self, path, **metadata):
+        """Write report() as JSON to `path`; returns the report."""
+        report = self.report(**metadata)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        self.log(f"Run report written to {path}")
+        return report
+
+
+def current_profiler():
+    """The StageProfiler of the enclosing profile_run(), or None."""
+    return _active
+
+
+@contextmanager
+def profile_run(profile_stage=None, profile_dir='.', log=print):
+    """Activate a StageProfiler for the @profiled stages run inside the block."""
+    global _active
+    previous, _active = _active, StageProfiler(profile_stage, profile_dir, log)
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+def profiled(name):
+    """
+    Decorator marking a method or function as pipeline stage `name`. Rows and
+    columns of the first shaped argument and of the result are recorded.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return fn(*args, **kwargs)
+            with profiler.stage(name) as record:
+                shape_in = next((s for s in map(_shape, args + tuple(kwargs.values())) if s), None)
+                if shape_in:
+                    record['rows_in'], record['columns_in'] = shape_in
+                result = fn(*args, **kwargs)
+                shape_out = _shape(result)
+                if shape_out:
+                    record['rows_out'], record['columns_out'] = shape_out
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Reports
+
+Renders the training reports from saved artifacts, outside the training
+process:
+  - feature_importance.png: XGBoost feature importances (top 20)
+  - shap_importance.png: mean |SHAP| per feature, if explanations were computed
+  - metrics.json: model version, R², RMSE, importances and per-stage
+    timings of the run report
+  - summary.md: the same, for people
+
+Inputs are the inference artifact's manifest (or the training pickle) and
+the run report written by train_model. Plots are drawn on bare Figures
+with the Agg canvas, so no display is needed and the caller's pyplot backend
+is left alone. train_model starts render_reports_in_background once
+the model is saved and returns without waiting for it.
+
+Usage:
+    python reports.py --model microloan_risk_model_advanced --output-dir reports
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Where reports are written unless an output directory is given
+REPORT_DIR = os.environ.get('REPORT_DIR', 'reports')
+
+# Resolution of the rendered plots
+REPORT_DPI = 150
+
+# Features shown in the importance plots
+TOP_FEATURES = 20
+
+
+def load_report_inputs(model_path, run_report_path=None):
+    """
+    Collect what the reports need from saved artifacts.
+
+    Args:
+        model_path: Inference artifact directory or training pickle
+        run_report_path: Run report JSON written by train_model (optional)
+
+    Returns:
+        dict with model_version, model_path, metrics (r2_score, rmse,
+        n_samples), feature_importance, shap_importance and run_report
+    """
+    from inference import MANIFEST_FILE, is_artifact
+
+    if is_artifact(model_path):
+        # Reads the manifest only; the booster is needed just for old artifacts
+        with open(os.path.join(model_path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        metadata = manifest.get('metadata', {})
+        version = manifest['model_version']
+        metrics = {k: metadata[k] for k in ('r2_score', 'rmse', 'n_samples') if k in metadata}
+        feature_importance = metadata.get('feature_importance')
+        if feature_importance is None:
+            feature_importance = _booster_importance(os.path.join(model_path, manifest['booster_file']))
+        shap_importance = metadata.get('shap_importance')
+    elif os.path.exists(model_path):
+        import pickle
+        with open(model_path, 'rb') as f:
+            model_data = pickle.load(f)
+        model_metrics = model_data.get('model_metrics', {})
+        instance = model_data.get('instance')
+        version = instance.model_version() if instance is not None else None
+        metrics = {k: float(model_metrics[k]) for k in ('r2_score', 'rmse', 'n_samples') if k in model_metrics}
+        feature_importance = model_metrics.get('feature_importance')
+        if feature_importance is None and instance is not None:
+            feature_importance = dict(zip(instance.model.feature_names_in_, instance.model.feature_importances_))
+        feature_importance = {str(k): float(v) for k, v in (feature_importance or {}).items()}
+        shap_importance = model_metrics.get('shap_importance')
+    else:
+        raise FileNotFoundError(f"Model not found at {model_path}")
+
+    run_report = None
+    if run_report_path and os.path.exists(run_report_path):
+        with open(run_report_path) as f:
+            run_report = json.load(f)
+    return {
+        'model_version': version,
+        'model_path': model_path,
+        'metrics': metrics,
+        'feature_importance': feature_importance or {},
+        'shap_importance': shap_importance or {},
+        'run_report': run_report,
+    }
+
+
+def _booster_importance(booster_path):
+    """Normalized gain importances of a saved booster (what XGBRegressor reports)."""
+    import xgboost as xgb
+    booster = xgb.Booster(model_file=booster_path)
+    gain = booster.get_score(importance_type='gain')
+    total = sum(gain.values()) or 1.0
+    return {feature: gain.get(feature, 0.0) / total for feature in booster.feature_names or gain}
+
+
+def plot_importance(importance, path, title, xlabel='Importance', dpi=REPORT_DPI):
+    """
+    Save a horizontal bar chart of the TOP_FEATURES largest importances.
+
+    Args:
+        importance: {feature: importance}
+        path: Output image file
+        title, xlabel: Chart labels
+        dpi: Resolution
+
+    Returns:
+        str: The path written
+    """
+    # A bare Figure renders with Agg and leaves pyplot and the caller's backend alone
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+
+    top = sorted(importance.items(), key=lambda item: item[1], reverse=True)[:TOP_FEATURES]
+    features = [feature for feature, _ in top][::-1]
+    values = [value for _, value in top][::-1]
+    colors = colormaps['viridis_r']([i / max(len(top) - 1, 1) for i in range(len(top))])
+
+    fig = Figure(figsize=(12, 10))
+    ax = fig.subplots()
+    ax.barh(features, values, color=colors)
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel(xlabel, fontsize=14)
+    ax.set_ylabel('Feature', fontsize=14)
+    ax.grid(axis='x', alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+def _summary_markdown(summary, images):
+    metrics = summary['metrics']
+    lines = [f"# MicroLoan risk model {summary['model_version'] or ''}".rstrip(), '',
+             f"Model: `{summary['model_path']}`", '']
+    if metrics:
+        lines += ['| Metric | Value |', '|---|---|']
+        lines += [f"| {name} | {value:.4f} |" if isinstance(value, float) else f"| {name} | {value} |"
+                  for name, value in metrics.items()]
+        lines.append('')
+    for name in ('feature_importance', 'shap_importance'):
+        top = list(summary[name].items())[:5]
+        if top:
+            lines += [f"## Top {name.replace('_', ' ')}", '']
+            lines += [f"{i}. {feature}: {value:.4f}" for i, (feature, value) in enumerate(top, 1)]
+            lines.append('')
+    if summary['stages']:
+        lines += ['## Training stages', '', '| Stage | Calls | Wall (s) | CPU (s) |', '|---|---|---|---|']
+        lines += [f"| {stage} | {entry['calls']} | {entry['wall_seconds']:.2f} | {entry['cpu_seconds']:.2f} |"
+                  for stage, entry in summary['stages'].items()]
+        lines.append('')
+    lines += [f"![{os.path.splitext(image)[0]}]({image})" for image in images]
+    return '\n'.join(lines) + '\n'
+
+
+def render_reports(model_path='microloan_risk_model_advanced', output_dir=None, run_report_path=None,
+                   dpi=REPORT_DPI):
+    """
+    Render all reports of a saved model into `output_dir`.
+
+    Args:
+        model_path: Inference artifact directory or training pickle
+        output_dir: Output directory (default REPORT_DIR)
+        run_report_path: Run report JSON written by train_model (optional)
+        dpi: Resolution of the plots
+
+    Returns:
+        list: Paths written
+    """
+    output_dir = output_dir or REPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    inputs = load_report_inputs(model_path, run_report_path)
+
+    def ranked(importance):
+        return dict(sorted(((k, float(v)) for k, v in importance.items()), key=lambda item: item[1], reverse=True))
+
+    run_report = inputs['run_report'] or {}
+    summary = {
+        'model_version': inputs['model_version'],
+        'model_path': model_path,
+        'metrics': inputs['metrics'],
+        'feature_importance': ranked(inputs['feature_importance']),
+        'shap_importance': ranked(inputs['shap_importance']),
+        'run_status': run_report.get('metadata', {}).get('status'),
+        'stages': run_report.get('summary', {}),
+    }
+
+    written, images = [], []
+    if summary['feature_importance']:
+        written.append(plot_importance(summary['feature_importance'],
+                                       os.path.join(output_dir, 'feature_importance.png'),
+                                       f'Top {TOP_FEATURES} Feature Importances', dpi=dpi))
+        images.append('feature_importance.png')
+    if summary['shap_importance']:
+        written.append(plot_importance(summary['shap_importance'], os.path.join(output_dir, 'shap_importance.png'),
+                                       f'Top {TOP_FEATURES} Features by Mean |SHAP|', xlabel='Mean |SHAP value|',
+                                       dpi=dpi))
+        images.append('shap_importance.png')
+
+    metrics_path = os.path.join(output_dir, 'metrics.json')
+    with open(metrics_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    summary_path = os.path.join(output_dir, 'summary.md')
+    with open(summary_path, 'w') as f:
+        f.write(_summary_markdown(summary, images))
+    written += [metrics_path, summary_path]
+    print(f"Reports for model {inputs['model_version']} written to {output_dir}")
+    return written
+
+
+def render_reports_in_background(model_path='microloan_risk_model_advanced', output_dir=None,
+                                 run_report_path=None, dpi=REPORT_DPI, log_path=None):
+    """
+    Render the reports in a separate interpreter and return without waiting.
+
+    The child starts fresh, so it holds none of the caller's memory, and
+    keeps running if the caller exits.
+
+    Args:
+        model_path, output_dir, run_report_path, dpi: As for render_reports
+        log_path: File for the child's output (default: reports.log in output_dir)
+
+    Returns:
+        subprocess.Popen of the rendering process
+    """
+    output_dir = output_dir or REPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    command = [sys.executable, os.path.join(HERE, 'reports.py'), '--model', os.path.abspath(model_path),
+               '--output-dir', os.path.abspath(output_dir), '--dpi', str(dpi)]
+    if run_report_path:
+        command += ['--run-report', os.path.abspath(run_report_path)]
+    log_path = log_path or os.path.join(output_dir, 'reports.log')
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(command, cwd=HERE, stdout=log, stderr=subprocess.STDOUT,
+                                   env=dict(os.environ, MPLBACKEND='Agg'), start_new_session=True)
+    print(f"Rendering reports in the background (pid {process.pid}, log {log_path})")
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render training reports from a saved risk model')
+    parser.add_argument('--model', default='microloan_risk_model_advanced',
+                        help='Inference artifact directory or pickle saved by train_model')
+    parser.add_argument('--output-dir', default=None, help=f'Output directory (default: {REPORT_DIR})')
+    parser.add_argument('--run-report', default=None, help='Run report JSON written by train_model')
+    parser.add_argument('--dpi', type=int, default=REPORT_DPI, help='Resolution of the plots')
+    args = parser.parse_args()
+    render_reports(args.model, args.output_dir, args.run_report, args.dpi)
+
+
+if __name__ == "__main__":
+    main()
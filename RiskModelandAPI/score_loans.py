@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Streaming Bulk Scoring
+
+Rescore a loan file of any size in the `loan_data.csv` layout. The input is
+streamed in chunks, reading only the ID column and the 7 model features;
+chunks are scored in parallel across a process pool and the results are
+written incrementally, in input order, to CSV or to a directory of Parquet
+part files. At most `2 * workers` chunks are in flight, so memory is bounded
+by the chunk size rather than the file size.
+
+A progress file next to the output records how many chunks are complete; run
+again with --resume to continue an interrupted run where it stopped.
+
+Usage:
+    python score_loans.py loan_data.csv --output scores.csv --workers 4
+    python score_loans.py loan_data.csv --output scores_parquet --format parquet --resume
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import credit_pred
+
+FEATURES = credit_pred.REQUIRED_FIELDS
+
+
+def _init_worker(model_path):
+    # Inherited from the parent under fork; loaded from model_path otherwise
+    credit_pred.load_model_once(model_path)
+    compiled = credit_pred.get_compiled_scorer()
+    if compiled is not None:
+        compiled.booster.set_param({'nthread': 1})
+
+
+def score_chunk(chunk):
+    """
+    Score one chunk of raw loans (a DataFrame with the 7 features).
+
+    Numeric columns are coerced like clean_data does (unparseable values become
+    missing and are imputed by the model). The prediction cache is bypassed,
+    since a full rescore rarely repeats a loan.
+
+    Returns:
+        np.ndarray of credit scores
+    """
+    chunk = chunk.copy()
+    for col in credit_pred.NUMERIC_FIELDS:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    for col in credit_pred.CATEGORICAL_FIELDS:
+        chunk[col] = chunk[col].astype(object).where(chunk[col].notna(), None)
+    handle = credit_pred.get_active_model()
+    if handle.scorer is not None:
+        return handle.scorer.predict(chunk)
+    return np.asarray(handle.model.predict(chunk[FEATURES]))
+
+
+class _ProgressFile:
+    """JSON checkpoint of a bulk scoring run."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, state):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class _CsvSink:
+    def __init__(self, path, resume_state):
+        self.path = path
+        if resume_state is not None:
+            # Drop anything written after the last checkpoint
+            with open(path, 'r+b') as f:
+                f.truncate(resume_state['bytes_written'])
+            self._file = open(path, 'a', newline='')
+            self._header = False
+        else:
+            self._file = open(path, 'w', newline='')
+            self._header = True
+
+    def write(self, frame, chunk_index):
+        frame.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def position(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetSink:
+    def __init__(self, path, resume_state):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if resume_state is None:
+            # A fresh run must not leave parts of an earlier run behind
+            for name in os.listdir(path):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(path, name))
+
+    def write(self, frame, chunk_index):
+        part = os.path.join(self.path, f'part-{chunk_index:05d}.parquet')
+        frame.to_parquet(part + '.tmp', index=False)
+        os.replace(part + '.tmp', part)
+
+    def position(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def score_file(input_path, output_path, output_format=None, id_column='id', chunksize=100000,
+               workers=None, model_path=None, encoding='latin1', resume=False, log=print):
+    """
+    Stream `input_path` through the model and write scores to `output_path`.
+
+    Args:
+        input_path: CSV in the loan_data.csv layout
+        output_path: CSV file, or directory for Parquet part files
+        output_format: 'csv' or 'parquet' (default: from the output extension)
+        id_column: Column copied to the output to identify each loan
+        chunksize: Rows per chunk
+        workers: Scoring processes (default: CPU count; 0 scores in this process)
+        model_path: Model to use (see credit_pred.load_model_once)
+        encoding: Input file encoding
+        resume: Continue from the progress file of an earlier run
+        log: Callable used for progress messages
+
+    Returns:
+        dict: Summary with rows, chunks, seconds and rows_per_second
+    """
+    if output_format is None:
+        output_format = 'parquet' if output_path.endswith('.parquet') or os.path.isdir(output_path) else 'csv'
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError(f"Unsupported output format: {output_format}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Load in the parent so forked workers share it, and so the version is known up front
+    credit_pred.load_model_once(model_path)
+    model_version = credit_pred.get_model_version()
+
+    sink_class = _CsvSink if output_format == 'csv' else _ParquetSink
+    progress_path = (output_path + '.progress.json' if output_format == 'csv'
+                     else os.path.join(output_path, '_progress.json'))
+    progress = _ProgressFile(progress_path)
+    state = progress.load() if resume else None
+    if state is not None:
+        if state['input'] != os.path.abspath(input_path) or state['chunksize'] != chunksize:
+            raise ValueError("Progress file belongs to a different input or chunk size; rerun without --resume")
+        if state['model_version'] != model_version:
+            raise ValueError(f"Progress file was written by model {state['model_version']}, "
+                             f"but {model_version} is loaded; rerun without --resume")
+        if state.get('finished'):
+            log(f"Nothing to do: {input_path} was fully scored ({state['rows_done']} rows)")
+            return {'rows': 0, 'chunks': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+        log(f"Resuming after {state['chunks_done']} chunks ({state['rows_done']} rows)")
+    else:
+        state = {
+            'input': os.path.abspath(input_path),
+            'chunksize': chunksize,
+            'model_version': model_version,
+            'chunks_done': 0,
+            'rows_done': 0,
+            'bytes_written': 0,
+            'finished': False,
+        }
+    sink = sink_class(output_path, state if state['chunks_done'] else None)
+
+    reader = pd.read_csv(
+        input_path,
+        encoding=encoding,
+        usecols=[id_column] + FEATURES,
+        dtype={col: str for col in credit_pred.CATEGORICAL_FIELDS},
+        chunksize=chunksize,
+        # Completed rows are skipped by the tokenizer instead of being re-parsed
+        skiprows=range(1, state['rows_done'] + 1) if state['rows_done'] else None,
+    )
+
+    executor = None
+    if workers > 0:
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                                       initializer=_init_worker, initargs=(model_path,))
+
+    start = time.perf_counter()
+    rows = chunks = 0
+    inflight = deque()
+
+    def drain_one():
+        nonlocal rows, chunks
+        chunk_index, ids, pending = inflight.popleft()
+        scores = pending.result() if executor is not None else pending
+        sink.write(pd.DataFrame({id_column: ids, 'risk_score': scores,
+                                 'model_version': model_version}), chunk_index)
+        rows += len(ids)
+        chunks += 1
+        state['chunks_done'] = chunk_index + 1
+        state['rows_done'] += len(ids)
+        state['bytes_written'] = sink.position()
+        progress.save(state)
+        elapsed = time.perf_counter() - start
+        log(f"Chunk {chunk_index}: {state['rows_done']:,} rows scored ({rows / elapsed:,.0f} rows/s)")
+
+    try:
+        for chunk in reader:
+            chunk_index = state['chunks_done'] + len(inflight)
+            ids = chunk[id_column].to_numpy()
+            features = chunk[FEATURES]
+            pending = executor.submit(score_chunk, features) if executor is not None else score_chunk(features)
+            inflight.append((chunk_index, ids, pending))
+            # Bound memory: never hold more than two chunks per worker
+            while len(inflight) >= max(2 * workers, 1):
+                drain_one()
+        while inflight:
+            drain_one()
+        state['finished'] = True
+        progress.save(state)
+    finally:
+        sink.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'rows': rows,
+        'chunks': chunks,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed > 0 else 0.0,
+        'model_version': model_version,
+    }
+    log(f"Scored {rows:,} rows in {elapsed:.1f}s ({summary['rows_per_second']:,.0f} rows/s) -> {output_path}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a loan file through the risk model')
+    parser.add_argument('input', help='CSV in the loan_data.csv layout')
+    parser.add_argument('--output', required=True, help='Output CSV file or Parquet directory')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None)
+    parser.add_argument('--id-column', default='id')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Scoring processes (default: CPU count, 0 = in-process)')
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--encoding', default='latin1')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run')
+    args = parser.parse_args()
+
+    score_file(args.input, args.output, args.format, args.id_column, args.chunksize,
+               args.workers, args.model_path, args.encoding, args.resume)
+
+
+if __name__ == "__main__":
+    main()
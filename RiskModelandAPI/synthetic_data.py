@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Synthetic Data
+
+Generates loan records in the `loan_data.csv` layout expected by
+MicroLoanRiskModelAdvanced.load_data, and trains a small model on them.
+Used by the tests so that no real dataset or network access is needed.
+"""
+
+import numpy as np
+import pandas as pd
+
+SECTORS = ['Agriculture', 'Retail', 'Food', 'Services', 'Clothing', 'Transportation',
+           'Housing', 'Education', 'Health', 'Arts', 'Construction', 'Manufacturing']
+COUNTRIES = {
+    'Kenya': 'KES', 'Philippines': 'PHP', 'Peru': 'PEN', 'Uganda': 'UGX',
+    'Cambodia': 'KHR', 'Nicaragua': 'NIO', 'Ghana': 'GHS', 'Ecuador': 'USD',
+    'Tajikistan': 'TJS', 'Pakistan': 'PKR', 'Bolivia': 'BOB', 'Mexico': 'MXN'
+}
+GEO_LEVELS = ['country', 'town', 'city', 'rural_area', 'region']
+
+
+def generate_loan_data(n_rows=2000, seed=0, n_countries=None):
+    """
+    Generate a raw loan DataFrame in the Kiva export layout.
+
+    Args:
+        n_rows: Number of loan rows to generate
+        seed: Random seed
+        n_countries: Use this many countries instead of the 12 built-in ones
+            (extra ones are named 'Country 13', ... and lend in USD), for
+            high-cardinality experiments
+
+    Returns:
+        DataFrame with an `id` column, the 7 model features, `status`,
+        `terms.disbursal_date` and a few unused columns.
+    """
+    rng = np.random.default_rng(seed)
+    country_currency = dict(COUNTRIES)
+    for i in range(len(COUNTRIES), n_countries or 0):
+        country_currency[f'Country {i + 1}'] = 'USD'
+    countries = rng.choice(list(country_currency), size=n_rows)
+    currencies = np.array([country_currency[c] for c in countries], dtype=object)
+    # Some loans are disbursed in USD regardless of country
+    usd = rng.random(n_rows) < 0.1
+    currencies[usd] = 'USD'
+    sectors = rng.choice(SECTORS, size=n_rows)
+    geo = rng.choice(GEO_LEVELS, size=n_rows)
+
+    amount = np.maximum(np.round(rng.lognormal(mean=6.0, sigma=0.8, size=n_rows) / 25) * 25, 25)
+    loan_amount = amount
+    local_amount = np.round(amount * rng.uniform(1, 120, size=n_rows), 2)
+
+    # Default probability depends on sector, country and loan size
+    sector_risk = {s: r for s, r in zip(SECTORS, rng.uniform(-1.0, 1.0, len(SECTORS)))}
+    country_risk = {c: r for c, r in zip(country_currency, rng.uniform(-1.5, 1.5, len(country_currency)))}
+    logit = (-2.0
+             + np.array([sector_risk[s] for s in sectors])
+             + np.array([country_risk[c] for c in countries])
+             + 0.6 * (np.log(amount) - 6.0)
+             + 0.3 * (geo == 'rural_area'))
+    p_default = 1.0 / (1.0 + np.exp(-logit))
+    status = np.where(rng.random(n_rows) < p_default, 'defaulted', 'paid').astype(object)
+    # A small share of loans is still outstanding and gets filtered by clean_data
+    status[rng.random(n_rows) < 0.05] = 'in_repayment'
+
+    disbursal = pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, 3000, n_rows), unit='D')
+
+    df = pd.DataFrame({
+        'id': np.arange(1, n_rows + 1),
+        'status': status,
+        'sector': sectors,
+        'location.country': countries,
+        'location.geo.level': geo,
+        'terms.disbursal_currency': currencies,
+        'terms.loan_amount': loan_amount,
+        'local_amount': local_amount,
+        'amount': amount,
+        'terms.disbursal_date': disbursal.strftime('%Y%m%d').astype(int),
+        'funded_amount': loan_amount,
+        'borrowers.gender': rng.choice(['F', 'M'], size=n_rows),
+    })
+    # Sprinkle in missing values like the real export has
+    df.loc[rng.random(n_rows) < 0.02, 'local_amount'] = np.nan
+    df.loc[rng.random(n_rows) < 0.02, 'location.geo.level'] = np.nan
+    return df
+
+
+def build_synthetic_model(n_rows=2000, seed=0, n_estimators=50, max_depth=4, feature_encoding='onehot'):
+    """
+    Train a small MicroLoanRiskModelAdvanced on generated data.
+
+    Runs the same clean/prepare/preprocess steps as train_model() but fits a
+    fixed XGBRegressor instead of tuning, so it finishes in about a second.
+    `feature_encoding` is passed to preprocess_data.
+
+    Returns:
+        The trained MicroLoanRiskModelAdvanced instance
+    """
+    import xgboost as xgb
+    from boost_model import MicroLoanRiskModelAdvanced
+
+    ml_model = MicroLoanRiskModelAdvanced()
+    df_clean = ml_model.clean_data(generate_loan_data(n_rows, seed))
+    X, y = ml_model.prepare_features(df_clean)
+    X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y, feature_encoding=feature_encoding)
+    ml_model.model = xgb.XGBRegressor(
+        objective='reg:squarederror',
+        random_state=42,
+        tree_method='hist',
+        n_estimators=n_estimators,
+        max_depth=max_depth,
+        learning_rate=0.1,
+        n_jobs=1,
+        **ml_model.xgb_params()
+    )
+    ml_model.fit_model(X_train, y_train)
+    return ml_model
+
+
+def sample_records(n_rows=100, seed=1):
+    """Return raw API-style loan records (list of dicts) with the 7 model features."""
+    df = generate_loan_data(n_rows, seed)
+    features = ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency',
+                'terms.loan_amount', 'local_amount', 'amount']
+    records = df[features].astype(object).where(df[features].notna(), None).to_dict('records')
+    return records
+
+
+def random_records(categories, n_rows=100, seed=0):
+    """
+    Return random loan records over known, unseen and missing categories and a
+    wide range of (also negative and missing) amounts, for comparing scorers.
+
+    Args:
+        categories: Per categorical feature, the categories the model knows
+            (e.g. CompiledScorer.categories)
+        n_rows: Number of records
+        seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    fields = ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency']
+    records = []
+    for _ in range(n_rows):
+        record = {}
+        for field, cats in zip(fields, categories):
+            choice = rng.random()
+            record[field] = None if choice < 0.05 else 'Unseen' if choice < 0.1 else str(rng.choice(cats))
+        for field in ['terms.loan_amount', 'local_amount', 'amount']:
+            record[field] = None if rng.random() < 0.05 else float(rng.lognormal(6, 2) * rng.choice([1, 1, 1, -1]))
+        records.append(record)
+    return records
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+import credit_pred
+from api_server import MicroBatcher, ScoringServer
+from synthetic_data import sample_records
+
+
+async def _request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_concurrent_requests_are_micro_batched(loaded_model):
+    records = sample_records(40)
+    expected = [r['score'] for r in credit_pred.predict_credit_scores(records)]
+    credit_pred.configure_prediction_cache(maxsize=0)
+
+    async def scenario():
+        server = ScoringServer(MicroBatcher(credit_pred.predict_credit_scores,
+                                            max_batch_size=16, max_wait_ms=20), port=0)
+        await server.start()
+        try:
+            responses = await asyncio.gather(*(_request(server.port, 'POST', '/score', r) for r in records))
+            bulk = await _request(server.port, 'POST', '/score', records[:3] + [{'sector': 'Retail'}])
+            missing = await _request(server.port, 'GET', '/nowhere')
+            return responses, bulk, missing, server.batcher.stats()
+        finally:
+            await server.stop()
+
+    responses, bulk, missing, stats = asyncio.run(scenario())
+    assert [status for status, _ in responses] == [200] * 40
+    assert [body['score'] for _, body in responses] == pytest.approx(expected)
+    assert responses[0][1]['model_version'] == credit_pred.get_model_version()
+    assert stats['items'] == 44 and stats['batches'] < 40
+
+    status, body = bulk
+    assert status == 200 and body['results'][3]['error'].startswith('Missing required field')
+    assert {r['model_version'] for r in body['results']} == {credit_pred.get_model_version()}
+    assert missing[0] == 404
+
+
+def test_batcher_can_be_restarted_and_refuses_loans_while_stopped():
+    async def scenario():
+        batcher = MicroBatcher(lambda records: [len(records)] * len(records), max_wait_ms=1)
+        with pytest.raises(RuntimeError, match='not running'):
+            await batcher.submit({})
+        results = []
+        for _ in range(2):
+            await batcher.start()
+            results.append(await batcher.submit({}))
+            await batcher.stop()
+        with pytest.raises(RuntimeError, match='not running'):
+            await batcher.submit({})
+        return results
+
+    assert asyncio.run(scenario()) == [1, 1]
+
+
+@pytest.mark.parametrize('workers_busy', [False, True])
+def test_stopping_fails_the_batch_being_collected(workers_busy):
+    import threading
+
+    release = threading.Event()
+
+    def score_batch(records):
+        release.wait(timeout=5)
+        return [0] * len(records)
+
+    async def scenario():
+        batcher = MicroBatcher(score_batch, max_wait_ms=500)
+        await batcher.start()
+        busy = None
+        if workers_busy:
+            # Occupies the only worker, so the next batch waits for a slot
+            busy = asyncio.ensure_future(batcher.submit({}))
+            await asyncio.sleep(0.6)
+        pending = asyncio.ensure_future(batcher.submit({}))
+        await asyncio.sleep(0.05 if not workers_busy else 0.6)
+        stopping = asyncio.ensure_future(batcher.stop())
+        await asyncio.sleep(0.05)
+        release.set()
+        await stopping
+        with pytest.raises(RuntimeError, match='stopped'):
+            await asyncio.wait_for(pending, 2)
+        if busy is not None:
+            assert await busy == 0
+
+    asyncio.run(scenario())
+
+
+def test_reload_only_uses_the_configured_model_path(trained_model, tmp_path, monkeypatch):
+    artifact = str(tmp_path / 'artifact')
+    trained_model.save_inference_artifact(artifact)
+    monkeypatch.setattr(credit_pred, '_model', None)
+    monkeypatch.setattr(credit_pred, '_active', None)
+    monkeypatch.setattr(credit_pred, '_model_path', None)
+    monkeypatch.setattr(credit_pred, '_reload_stats', {'reloads': 0, 'failed_reloads': 0, 'last_error': None})
+    credit_pred.load_model_once(artifact)
+
+    async def scenario():
+        server = ScoringServer(MicroBatcher(credit_pred.predict_credit_scores), port=0)
+        await server.start()
+        try:
+            refused = await _request(server.port, 'POST', '/admin/reload', {'model_path': str(tmp_path / 'x.pkl')})
+            reloaded = await _request(server.port, 'POST', '/admin/reload')
+            return refused, reloaded
+        finally:
+            await server.stop()
+
+    refused, reloaded = asyncio.run(scenario())
+    assert refused[0] == 400 and 'model_path' in refused[1]['error']
+    assert reloaded[0] == 200
+    assert reloaded[1]['model']['model_path'] == artifact and reloaded[1]['model']['reloads'] == 1
@@ -0,0 +1,26 @@
+import json
+
+from benchmark_inference import run_benchmarks
+
+
+def test_benchmark_reports_all_sections(loaded_model, tmp_path):
+    results = run_benchmarks(n_rows=500, n_estimators=10, max_depth=3, batch_sizes=(1, 50),
+                             repeats=50, min_seconds=0.01, cold_runs=1, backends=('xgboost', 'lookup'))
+
+    single = results['single_row']['predict_credit_score']
+    assert 0 < single['p50_ms'] <= single['p95_ms'] <= single['p99_ms']
+    assert [row['batch_size'] for row in results['batch']] == [1, 50]
+    assert all(row['model_predict_rows_per_second'] > 0 for row in results['batch'])
+    assert all(row['explain_credit_scores_rows_per_second'] > 0 for row in results['batch'])
+    assert set(results['explainers']) == {'tables', 'pred_contribs'}
+    assert results['explainers']['tables']['uses_tables'] and results['explainers']['tables']['rows_per_second']['50'] > 0
+    assert set(results['cold_start']) == {'artifact', 'pickle'}
+    assert results['cold_start']['artifact']['load_seconds'] > 0
+    assert results['cold_start']['artifact']['peak_rss_mb'] > 0
+    assert set(results['backends']) == {'xgboost', 'lookup'}
+    lookup = results['backends']['lookup']
+    assert lookup['backend'] == lookup['cold_start']['backend'] == 'lookup'
+    assert lookup['single_row']['p50_ms'] > 0 and lookup['batch_rows_per_second']['50'] > 0
+    assert results['peak_rss_mb'] > 0
+    # The report must be plain JSON
+    json.dumps(results)
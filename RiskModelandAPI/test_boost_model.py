@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from boost_model import LOAD_COLUMNS, MicroLoanRiskModelAdvanced
+from synthetic_data import build_synthetic_model, generate_loan_data
+
+
+@pytest.fixture
+def loan_csv(tmp_path):
+    path = tmp_path / 'loan_data.csv'
+    generate_loan_data(3000, seed=3).to_csv(path, index=False, encoding='latin1')
+    return str(path)
+
+
+@pytest.mark.parametrize('chunksize', [None, 700])
+def test_pruned_load_cleans_like_full_load(loan_csv, chunksize):
+    ml_model = MicroLoanRiskModelAdvanced()
+    full = ml_model.clean_data(ml_model.load_data(loan_csv, usecols=None))
+    pruned = ml_model.load_data(loan_csv, chunksize=chunksize)
+
+    assert set(pruned.columns) == set(LOAD_COLUMNS)
+    assert isinstance(pruned['sector'].dtype, pd.CategoricalDtype)
+    if chunksize is not None:
+        assert set(pruned['status']) == {'paid', 'defaulted'}
+    columns = LOAD_COLUMNS + ['score']
+    pd.testing.assert_frame_equal(ml_model.clean_data(pruned)[columns], full[columns])
+
+
+@pytest.mark.parametrize('typed', [False, True])
+def test_lean_clean_matches_clean(loan_csv, typed):
+    ml_model = MicroLoanRiskModelAdvanced()
+    raw = ml_model.load_data(loan_csv, usecols='model' if typed else None)
+    raw.loc[raw.index[::40], 'amount'] = float('nan')
+    expected = ml_model.clean_data(raw)
+    lean = ml_model.clean_data(raw, lean=True)
+
+    assert list(lean.columns) == [col for col in expected.columns if col in lean.columns]
+    assert isinstance(lean['sector'].dtype, pd.CategoricalDtype)
+    assert not lean['amount'].isna().any()
+    for col in ['sector', 'location.country', 'location.geo.level', 'terms.disbursal_currency']:
+        lean[col] = lean[col].astype(str)
+    pd.testing.assert_frame_equal(lean, expected[lean.columns])
+
+
+@pytest.mark.parametrize('feature_encoding', ['onehot', 'native'])
+def test_global_explanations_are_sampled_and_cached(tmp_path, feature_encoding):
+    ml_model = build_synthetic_model(feature_encoding=feature_encoding)
+    X, y = ml_model.prepare_features(ml_model.clean_data(generate_loan_data(2000, seed=5)))
+    X = ml_model.transform_features(X)
+    first = ml_model.explain_global(X, y, sample_size=500, cache_dir=str(tmp_path))
+    assert not first['cached'] and first['sample_size'] == 500
+    assert ml_model.model_metrics['shap_importance'] == first['mean_abs_shap']
+
+    cache_file, = tmp_path.iterdir()
+    with np.load(cache_file) as cached:
+        rows, shap_values, base = cached['rows'], cached['shap_values'], cached['base_values']
+    # Contributions add up to the predictions of the sampled rows
+    np.testing.assert_allclose(shap_values.sum(axis=1) + base, ml_model.model.predict(X.iloc[rows]),
+                               rtol=1e-4, atol=1e-3)
+
+    second = ml_model.explain_global(X, y, sample_size=500, cache_dir=str(tmp_path))
+    assert second['cached'] and second['mean_abs_shap'] == first['mean_abs_shap']
+
+    # Other data for the same model is explained afresh, not served from the cache
+    other = ml_model.explain_global(X.iloc[::-1].reset_index(drop=True), y.iloc[::-1].reset_index(drop=True),
+                                    sample_size=500, cache_dir=str(tmp_path))
+    assert not other['cached'] and len(list(tmp_path.iterdir())) == 2
+
+
+def test_model_version_is_stable_across_pickles_and_matches_the_artifact(trained_model, tmp_path):
+    import pickle
+    trained_model.save_model(str(tmp_path / 'model.pkl'))
+    with open(tmp_path / 'model.pkl', 'rb') as f:
+        reloaded = pickle.load(f)['instance']
+    version = trained_model.model_version()
+    assert reloaded.model_version() == version
+    assert trained_model.save_inference_artifact(str(tmp_path / 'artifact'))['model_version'] == version
+
+
+def test_plotting_and_explainer_reuse_skip_shap_recomputation(tmp_path, monkeypatch):
+    ml_model = build_synthetic_model()
+    ml_model.setup_explainer()
+    explainer = ml_model.explainer
+    ml_model.setup_explainer()
+    assert ml_model.explainer is explainer
+
+    def fail():
+        raise AssertionError("plot_feature_importance should not compute SHAP values")
+    monkeypatch.setattr(ml_model, 'setup_explainer', fail)
+    ml_model.plot_feature_importance(output_dir=str(tmp_path))
+    assert (tmp_path / 'feature_importance.png').exists()
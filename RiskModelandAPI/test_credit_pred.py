@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import credit_pred
+from synthetic_data import sample_records
+
+
+def test_batch_matches_single_predictions(loaded_model):
+    records = sample_records(50)
+    single = [credit_pred.predict_credit_score(r) for r in records]
+    batch = credit_pred.predict_credit_scores(records)
+    assert [r['error'] for r in batch] == [None] * 50
+    np.testing.assert_allclose([r['score'] for r in batch], single, rtol=1e-6)
+
+
+def test_batch_accepts_columnar_payload(loaded_model):
+    records = sample_records(20)
+    columnar = {f: [r[f] for r in records] for f in credit_pred.REQUIRED_FIELDS}
+    from_rows = credit_pred.predict_credit_scores(records)
+    assert credit_pred.predict_credit_scores(columnar) == from_rows
+    assert credit_pred.predict_credit_scores(pd.DataFrame(records)) == from_rows
+
+
+def test_batch_reports_per_row_errors(loaded_model):
+    good = sample_records(2)
+    records = [good[0], {'sector': 'Retail'}, dict(good[1], amount='lots'), 'not a loan']
+    results = credit_pred.predict_credit_scores(records)
+    assert results[0]['error'] is None and 0 <= results[0]['score'] <= 100
+    assert results[1]['score'] is None
+    assert results[1]['error'] == 'Missing required field: location.country'
+    assert results[1]['model_version'] == credit_pred.get_model_version()
+    assert results[2]['score'] is None and 'amount' in results[2]['error']
+    assert (results[3]['score'], results[3]['error']) == (None, 'Record must be a dict')
+
+
+def test_columnar_payload_requires_all_fields(loaded_model):
+    with pytest.raises(ValueError):
+        credit_pred.predict_credit_scores({'sector': ['Retail']})
+
+
+def test_load_model_once_accepts_inference_artifact(trained_model, tmp_path, monkeypatch):
+    artifact = str(tmp_path / 'artifact')
+    trained_model.save_inference_artifact(artifact)
+    monkeypatch.setattr(credit_pred, '_model', None)
+    credit_pred.load_model_once(artifact)
+
+    record = sample_records(1)[0]
+    expected = trained_model.predict(pd.DataFrame([record]))[0]
+    assert credit_pred.predict_credit_score(record) == pytest.approx(expected, rel=1e-5)
+
+
+def test_cache_hits_skip_the_model(loaded_model, monkeypatch):
+    record = sample_records(1)[0]
+    score = credit_pred.predict_credit_score(record)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("model called on a cache hit")
+
+    class FailingScorer:
+        predict = predict_one = staticmethod(fail)
+    monkeypatch.setattr(credit_pred, '_active', credit_pred.get_active_model()._replace(scorer=FailingScorer()))
+    monkeypatch.setattr(credit_pred, '_score_rows', fail)
+
+    assert credit_pred.predict_credit_score(dict(record)) == score
+    assert credit_pred.predict_credit_scores([record])[0]['score'] == score
+    stats = credit_pred.get_cache_stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_cache_is_invalidated_by_a_new_model_version(loaded_model, monkeypatch):
+    record = sample_records(1)[0]
+    credit_pred.predict_credit_score(record)
+    monkeypatch.setattr(credit_pred, '_compute_model_version', lambda model: 'retrained')
+    monkeypatch.setattr(credit_pred, '_active', None)
+    credit_pred.predict_credit_score(record)
+    assert credit_pred.get_cache_stats()['misses'] == 2
+
+
+def test_reload_swaps_version_and_keeps_old_model_on_failure(tmp_path, monkeypatch):
+    from synthetic_data import build_synthetic_model
+    first, second = str(tmp_path / 'v1'), str(tmp_path / 'v2')
+    build_synthetic_model(n_rows=800, seed=1).save_inference_artifact(first)
+    build_synthetic_model(n_rows=800, seed=2).save_inference_artifact(second)
+    monkeypatch.setattr(credit_pred, '_model', None)
+    monkeypatch.setattr(credit_pred, '_active', None)
+    monkeypatch.setattr(credit_pred, '_model_path', None)
+    monkeypatch.setattr(credit_pred, '_reload_stats', {'reloads': 0, 'failed_reloads': 0, 'last_error': None})
+    credit_pred.load_model_once(first)
+    old_handle = credit_pred.get_active_model()
+    record = sample_records(1)[0]
+
+    credit_pred.reload_model(second, background=True).join()
+    info = credit_pred.get_model_info()
+    assert info['model_version'] != old_handle.version and info['model_path'] == second
+    assert credit_pred.predict_credit_scores([record])[0]['model_version'] == info['model_version']
+    # A snapshot taken before the swap still scores with the old model
+    assert old_handle.scorer.predict([record])[0] != credit_pred.predict_credit_score(record)
+
+    broken = tmp_path / 'broken'
+    broken.mkdir()
+    (broken / 'manifest.json').write_text('{"format_version": 99}')
+    with pytest.raises(ValueError):
+        credit_pred.reload_model(str(broken))
+    info = credit_pred.get_model_info()
+    assert info['model_path'] == second and info['failed_reloads'] == 1
+
+
+def test_explanations_fold_to_fields_and_match_scores(loaded_model):
+    records = sample_records(30)
+    records[3] = dict(records[3], amount='lots')
+    explained = credit_pred.explain_credit_scores(records, top_k=2)
+    scored = credit_pred.predict_credit_scores(records)
+    assert [r['error'] for r in explained] == [r['error'] for r in scored]
+    assert explained[3]['reasons'] == [] and explained[3]['score'] is None
+
+    for result, score in zip(explained, scored):
+        if result['error'] is not None:
+            continue
+        assert result['score'] == pytest.approx(score['score'], abs=1e-4)
+        assert len(result['reasons']) == 2
+        assert {reason['field'] for reason in result['reasons']} <= set(credit_pred.REQUIRED_FIELDS)
+        sizes = [abs(reason['contribution']) for reason in result['reasons']]
+        assert sizes == sorted(sizes, reverse=True)
+
+    # All 7 contributions move the expected score to the loan's score
+    full = credit_pred.explain_credit_scores(records[:3], top_k=7)
+    for result in full:
+        total = result['expected_score'] + sum(reason['contribution'] for reason in result['reasons'])
+        assert np.clip(total, 0, 100) == pytest.approx(result['score'], abs=1e-3)
+
+
+@pytest.mark.parametrize('backend', ['onnx', 'lookup'])
+def test_scoring_backends_match_the_default(loaded_model, monkeypatch, backend):
+    if backend == 'onnx':
+        pytest.importorskip('onnx')
+        pytest.importorskip('onnxruntime')
+    monkeypatch.setattr(credit_pred, '_backend', 'xgboost')
+    records = sample_records(50)
+    expected = [r['score'] for r in credit_pred.predict_credit_scores(records)]
+
+    credit_pred.configure_backend(backend)
+
+    def fail(*args):
+        raise AssertionError("backend scorer built in the request path")
+    monkeypatch.setattr(credit_pred, '_backend_scorer', fail)
+    info = credit_pred.get_model_info()
+    assert info['backend'] == backend and info['compiled']
+    assert credit_pred.get_scorer() is credit_pred.get_active_model().scorer
+    assert credit_pred.get_compiled_scorer() is credit_pred.get_active_model().compiled
+    assert credit_pred.get_compiled_scorer() is not credit_pred.get_scorer()
+    scores = [r['score'] for r in credit_pred.predict_credit_scores(records)]
+    np.testing.assert_allclose(scores, expected, atol=1e-3)
+    assert credit_pred.predict_credit_score(records[0]) == pytest.approx(expected[0], abs=1e-3)
+    # Explanations still come from the compiled booster
+    assert credit_pred.explain_credit_scores(records[:2])[0]['reasons']
+
+
+def test_unavailable_backend_falls_back_to_xgboost(loaded_model, monkeypatch):
+    monkeypatch.setattr(credit_pred, '_backend', 'xgboost')
+
+    def unavailable(*args):
+        raise ImportError('No module named onnxruntime')
+
+    monkeypatch.setattr(credit_pred, '_backend_scorer', unavailable)
+    credit_pred.configure_backend('onnx')
+    handle = credit_pred.get_active_model()
+    assert handle.backend == 'xgboost' and handle.scorer is handle.compiled
+    assert credit_pred.predict_credit_scores(sample_records(3))[0]['score'] is not None
+    with pytest.raises(ValueError):
+        credit_pred.configure_backend('tensorrt')
+
+
+def test_a_stale_model_read_cannot_revert_a_reload(tmp_path, monkeypatch):
+    from synthetic_data import build_synthetic_model
+    first, second = str(tmp_path / 'v1'), str(tmp_path / 'v2')
+    build_synthetic_model(n_rows=800, seed=1).save_inference_artifact(first)
+    build_synthetic_model(n_rows=800, seed=2).save_inference_artifact(second)
+    monkeypatch.setattr(credit_pred, '_model', None)
+    monkeypatch.setattr(credit_pred, '_active', None)
+    monkeypatch.setattr(credit_pred, '_model_path', None)
+    old_model = credit_pred.load_model_once(first)
+    credit_pred.get_active_model()
+
+    new_handle = credit_pred.reload_model(second)
+    # A request that read the old model just before the swap
+    monkeypatch.setattr(credit_pred, 'load_model_once', lambda model_path=None: old_model)
+    assert credit_pred.get_active_model() is new_handle
+    assert credit_pred.get_model_info()['model_version'] == new_handle.version
+
+
+def test_the_explainer_is_built_on_the_first_explanation_only(trained_model, tmp_path, monkeypatch):
+    artifact = str(tmp_path / 'artifact')
+    trained_model.save_inference_artifact(artifact)
+    monkeypatch.setattr(credit_pred, '_model', None)
+    monkeypatch.setattr(credit_pred, '_active', None)
+    monkeypatch.setattr(credit_pred, '_model_path', None)
+    credit_pred.load_model_once(artifact)
+    handle = credit_pred.get_active_model()
+    credit_pred.predict_credit_scores(sample_records(5))
+    assert handle.compiled._explainer is None
+
+    credit_pred.explain_credit_scores(sample_records(2))
+    explainer = handle.compiled._explainer
+    assert explainer is not None
+    credit_pred.explain_credit_scores(sample_records(2))
+    assert handle.compiled._explainer is explainer
@@ -0,0 +1,48 @@
+import copy
+
+import numpy as np
+import pytest
+import xgboost as xgb
+from sklearn.metrics import mean_squared_error
+
+from distributed import fit_distributed, train_distributed
+
+
+@pytest.fixture(scope='module')
+def model_and_data():
+    from boost_model import MicroLoanRiskModelAdvanced
+    from synthetic_data import generate_loan_data
+    ml_model = MicroLoanRiskModelAdvanced()
+    X, y = ml_model.prepare_features(ml_model.clean_data(generate_loan_data(4000, seed=8), lean=True))
+    X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y)
+    ml_model.model = xgb.XGBRegressor(objective='reg:squarederror', random_state=42, tree_method='hist',
+                                      n_estimators=40, max_depth=4, learning_rate=0.1)
+    single = copy.deepcopy(ml_model)
+    single.fit_model(X_train, y_train)
+    return ml_model, single, X_train, X_test, y_train, y_test
+
+
+def test_one_worker_matches_single_process(model_and_data):
+    ml_model, single, X_train, X_test, y_train, _ = model_and_data
+    distributed = copy.deepcopy(ml_model)
+    summary = fit_distributed(distributed, X_train, y_train, n_workers=1)
+    assert summary['workers'][0]['rows'] == X_train.shape[0]
+    np.testing.assert_array_equal(distributed.model.predict(X_test), single.model.predict(X_test))
+
+
+def test_two_workers_train_an_equivalent_model(model_and_data):
+    ml_model, single, X_train, X_test, y_train, y_test = model_and_data
+    distributed = copy.deepcopy(ml_model)
+    summary = fit_distributed(distributed, X_train, y_train, n_workers=2)
+    assert sum(w['rows'] for w in summary['workers']) == X_train.shape[0]
+    assert len(summary['workers']) == 2
+    assert distributed.model.get_booster().num_boosted_rounds() == 40
+    single_rmse = np.sqrt(mean_squared_error(y_test, single.model.predict(X_test)))
+    distributed_rmse = np.sqrt(mean_squared_error(y_test, distributed.model.predict(X_test)))
+    assert abs(distributed_rmse - single_rmse) < 0.02 * single_rmse
+
+
+def test_worker_errors_are_raised(model_and_data):
+    _, _, X_train, _, y_train, _ = model_and_data
+    with pytest.raises(RuntimeError, match='Distributed training failed'):
+        train_distributed(X_train, y_train, {'objective': 'no-such-objective'}, 5, n_workers=2)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from explanations import TreeShapExplainer, column_fields
+from synthetic_data import build_synthetic_model, sample_records
+
+
+@pytest.mark.parametrize('feature_encoding', ['onehot', 'sparse', 'native'])
+def test_tables_match_xgboost_treeshap(feature_encoding):
+    ml_model = build_synthetic_model(feature_encoding=feature_encoding, max_depth=5)
+    scorer = ml_model.compile_scorer()
+    records = sample_records(300, seed=4)
+    records[0]['sector'] = 'Space Tourism'  # unseen category
+    records[1]['location.country'] = None  # missing category
+    records[2]['local_amount'] = None  # missing numeric
+    X = scorer.transform(records)
+
+    contributions, expected_value = TreeShapExplainer.from_scorer(scorer).shap_values(X)
+    data = xgb.DMatrix(X, missing=np.nan, feature_types=scorer.booster.feature_types,
+                       enable_categorical=feature_encoding == 'native')
+    contribs = scorer.booster.predict(data, pred_contribs=True, validate_features=False)
+    fields = column_fields(scorer)
+    folded = np.stack([contribs[:, :-1][:, fields == f].sum(axis=1) for f in range(7)], axis=1)
+    np.testing.assert_allclose(contributions, folded, atol=1e-3)
+    assert expected_value == pytest.approx(float(contribs[0, -1]), abs=1e-3)
+
+    margin = scorer.booster.inplace_predict(X, predict_type='margin')
+    np.testing.assert_allclose(contributions.sum(axis=1) + expected_value, margin, atol=1e-3)
+
+
+def test_fallback_to_pred_contribs_gives_the_same_values():
+    scorer = build_synthetic_model().compile_scorer()
+    X = scorer.transform(sample_records(50, seed=1))
+    fast, expected = TreeShapExplainer.from_scorer(scorer).shap_values(X)
+    fallback = TreeShapExplainer.from_scorer(scorer, max_table_size=0)
+    assert fallback.tables is None
+    slow, slow_expected = fallback.shap_values(X)
+    np.testing.assert_allclose(fast, slow, atol=1e-3)
+    assert expected == pytest.approx(slow_expected, abs=1e-3)
+
+
+def test_tables_built_in_small_chunks_are_the_same(monkeypatch):
+    import explanations
+
+    scorer = build_synthetic_model(max_depth=5).compile_scorer()
+    X = scorer.transform(sample_records(50, seed=2))
+    whole = TreeShapExplainer.from_scorer(scorer)
+    monkeypatch.setattr(explanations, 'BUILD_CHUNK_MASKS', 4)
+    chunked = TreeShapExplainer.from_scorer(scorer)
+    assert chunked.tables.dtype == np.float32
+    np.testing.assert_array_equal(chunked.tables, whole.tables)
+    np.testing.assert_array_equal(chunked.shap_values(X)[0], whole.shap_values(X)[0])
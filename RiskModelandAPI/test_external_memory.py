@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from external_memory import scan_loans, train_out_of_core
+from synthetic_data import generate_loan_data
+
+
+@pytest.fixture(scope='module')
+def loan_files(tmp_path_factory):
+    df = generate_loan_data(6000, seed=12, n_countries=20)
+    directory = tmp_path_factory.mktemp('loans')
+    df.to_csv(directory / 'loans.csv', index=False)
+    df.to_parquet(directory / 'loans.parquet')
+    return df, str(directory / 'loans.csv'), str(directory / 'loans.parquet')
+
+
+def test_scan_collects_all_categories_with_bounded_sample(loan_files):
+    df, csv_path, _ = loan_files
+    categories, sample, n_resolved = scan_loans(csv_path, chunksize=500, sample_size=700)
+    resolved = df[df['status'].isin(['paid', 'defaulted'])]
+    assert n_resolved == len(resolved)
+    assert len(sample) == 700
+    assert categories['location.country'] == sorted(resolved['location.country'].unique())
+    assert 'Unknown' in categories['location.geo.level']
+
+
+@pytest.mark.parametrize('feature_encoding', ['onehot', 'sparse', 'native'])
+def test_out_of_core_training_from_csv_and_parquet(loan_files, feature_encoding):
+    df, csv_path, parquet_path = loan_files
+    from_csv = train_out_of_core(csv_path, chunksize=1000, feature_encoding=feature_encoding,
+                                 num_boost_round=30, sample_size=2000)
+    from_parquet = train_out_of_core(parquet_path, chunksize=1000, feature_encoding=feature_encoding,
+                                     num_boost_round=30, sample_size=2000)
+
+    metrics = from_csv.model_metrics
+    assert from_csv.model.get_booster().num_boosted_rounds() == 30
+    assert 0 < metrics['n_test'] < metrics['n_samples']
+    assert np.isfinite(metrics['rmse']) and metrics['r2_score'] > 0
+    assert metrics['n_samples'] == int(df['status'].isin(['paid', 'defaulted']).sum())
+    assert from_parquet.model_metrics == metrics
+
+    X = df[from_csv.feature_names].head(200)
+    np.testing.assert_allclose(from_csv.predict(X), from_parquet.predict(X))
+    np.testing.assert_allclose(from_csv.compile_scorer().predict(X), from_csv.predict(X), rtol=1e-5, atol=1e-4)
@@ -0,0 +1,56 @@
+"""Cold-import budget for the scoring path, measured in fresh interpreters."""
+
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds allowed for a cold `import credit_pred`; override for slow CI machines
+IMPORT_BUDGET_SECONDS = float(os.environ.get('IMPORT_BUDGET_SECONDS', '1.0'))
+
+HEAVY_MODULES = ['pandas', 'sklearn', 'matplotlib', 'seaborn', 'shap', 'scipy']
+
+_PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}}))\n"
+)
+
+
+def _cold_import(module, runs=3):
+    """Import `module` in fresh interpreters; return the fastest run."""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module)],
+            cwd=HERE, capture_output=True, text=True, check=True
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or stats['seconds'] < best['seconds']:
+            best = stats
+    return best
+
+
+def _loaded(stats, names):
+    return [name for name in names if name in stats['modules']]
+
+
+def test_credit_pred_cold_import_within_budget():
+    stats = _cold_import('credit_pred')
+    assert _loaded(stats, HEAVY_MODULES + ['boost_model']) == []
+    assert stats['seconds'] < IMPORT_BUDGET_SECONDS, (
+        f"import credit_pred took {stats['seconds']:.3f}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    )
+
+
+def test_inference_imports_only_numpy():
+    stats = _cold_import('inference')
+    assert _loaded(stats, HEAVY_MODULES + ['xgboost']) == []
+
+
+def test_boost_model_defers_plotting_and_explainability():
+    stats = _cold_import('boost_model', runs=1)
+    assert _loaded(stats, ['matplotlib', 'seaborn', 'shap']) == []
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+import pytest
+
+from incremental import load_trained_model, update_from_file
+from synthetic_data import build_synthetic_model, generate_loan_data
+
+
+@pytest.mark.parametrize('feature_encoding', ['onehot', 'sparse', 'native'])
+def test_update_continues_boosting_with_unseen_categories(feature_encoding):
+    ml_model = build_synthetic_model(feature_encoding=feature_encoding)
+    original = ml_model.model
+    base_rounds = original.get_booster().num_boosted_rounds()
+    X_new, y_new = ml_model.prepare_features(
+        ml_model.clean_data(generate_loan_data(3000, seed=9, n_countries=15), lean=True)
+    )
+
+    summary = ml_model.update_model(X_new, y_new, max_rounds=30, force=True)
+    assert summary['unseen_categories'] == {'location.country': 3}
+    assert 1 <= summary['rounds_added'] <= 30
+    # Fit, early-stopping and evaluation rows are disjoint
+    assert summary['n_holdout'] == round(0.2 * summary['n_new'])
+    assert abs(summary['n_validation'] - summary['n_holdout']) <= 1
+    assert ml_model.model.get_booster().num_boosted_rounds() > base_rounds
+    assert original.get_booster().num_boosted_rounds() == base_rounds
+    assert ml_model.model_metrics['updates'][-1] is summary
+    params = ml_model.model.get_params()
+    assert params['early_stopping_rounds'] is None
+    assert params['n_estimators'] == original.get_params()['n_estimators']
+    # The compiled scorer follows the updated booster
+    np.testing.assert_allclose(ml_model.compile_scorer().predict(X_new.head(100)),
+                               ml_model.predict(X_new.head(100)), rtol=1e-5, atol=1e-4)
+
+
+def test_update_from_file_saves_new_version(tmp_path):
+    ml_model = build_synthetic_model()
+    model_path = str(tmp_path / 'model.pkl')
+    ml_model.save_model(model_path)
+    ml_model.save_inference_artifact(str(tmp_path / 'artifact'))
+    with open(tmp_path / 'artifact' / 'manifest.json') as f:
+        old_version = json.load(f)['model_version']
+    new_loans = str(tmp_path / 'new_loans.csv')
+    generate_loan_data(2000, seed=11).to_csv(new_loans, index=False)
+
+    summary = update_from_file(new_loans, model_path=model_path, output_path=str(tmp_path / 'updated.pkl'),
+                               artifact_dir=str(tmp_path / 'artifact'), force=True)
+    assert summary['applied'] and summary['model_version'] != old_version
+    updated = load_trained_model(str(tmp_path / 'updated.pkl'))
+    assert updated.model_metrics['updates'][0]['before'] == summary['before']
+    assert 'updates' not in load_trained_model(model_path).model_metrics
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from inference import CompiledScorer, is_artifact, load_artifact
+from synthetic_data import sample_records
+
+
+def _edge_case_records():
+    records = sample_records(300)
+    records[0]['sector'] = 'Space Tourism'  # unseen category
+    records[1]['location.country'] = None  # missing category
+    records[2]['local_amount'] = None  # missing numeric
+    records[3]['amount'] = -25.0  # negative branch of Yeo-Johnson
+    return records
+
+
+def test_compiled_scorer_matches_predict(trained_model):
+    records = _edge_case_records()
+    expected = trained_model.predict(pd.DataFrame(records))
+    scorer = trained_model.compile_scorer()
+    np.testing.assert_allclose(scorer.predict(records), expected, rtol=1e-5, atol=1e-4)
+    single = [scorer.predict_one(r) for r in records]
+    np.testing.assert_allclose(single, expected, rtol=1e-5, atol=1e-4)
+
+
+def test_compiled_transform_matches_preprocessor(trained_model):
+    records = _edge_case_records()
+    expected = trained_model.preprocessor.transform(pd.DataFrame(records))
+    scorer = CompiledScorer.from_model(trained_model)
+    np.testing.assert_allclose(scorer.transform(records), expected, rtol=1e-5, atol=1e-5)
+    assert scorer.feature_names == list(trained_model.model.feature_names_in_)
+
+
+def test_artifact_round_trip(trained_model, tmp_path):
+    records = _edge_case_records()
+    manifest = trained_model.save_inference_artifact(str(tmp_path / 'artifact'))
+    assert is_artifact(str(tmp_path / 'artifact'))
+
+    scorer = load_artifact(str(tmp_path / 'artifact'))
+    assert scorer.manifest['model_version'] == manifest['model_version']
+    expected = trained_model.predict(pd.DataFrame(records))
+    np.testing.assert_allclose(scorer.predict(records), expected, rtol=1e-5, atol=1e-4)
+
+
+def test_artifact_json_format_has_same_version_contents(trained_model, tmp_path):
+    ubj = trained_model.save_inference_artifact(str(tmp_path / 'ubj'))
+    again = trained_model.save_inference_artifact(str(tmp_path / 'ubj2'))
+    as_json = trained_model.save_inference_artifact(str(tmp_path / 'json'), booster_format='json')
+    assert ubj['model_version'] == again['model_version']
+    assert as_json['booster_file'] == 'booster.json'
+    records = sample_records(20)
+    np.testing.assert_allclose(load_artifact(str(tmp_path / 'json')).predict(records),
+                               load_artifact(str(tmp_path / 'ubj')).predict(records))
+
+
+@pytest.mark.parametrize('feature_encoding', ['sparse', 'native'])
+def test_compiled_scorer_matches_predict_for_other_encodings(feature_encoding, tmp_path):
+    from synthetic_data import build_synthetic_model
+    ml_model = build_synthetic_model(n_rows=1500, feature_encoding=feature_encoding)
+    records = _edge_case_records()
+    expected = ml_model.predict(pd.DataFrame(records))
+
+    scorer = ml_model.compile_scorer()
+    assert scorer.feature_names == list(ml_model.model.feature_names_in_)
+    np.testing.assert_allclose(scorer.predict(records), expected, rtol=1e-5, atol=1e-4)
+    np.testing.assert_allclose([scorer.predict_one(r) for r in records], expected, rtol=1e-5, atol=1e-4)
+
+    ml_model.save_inference_artifact(str(tmp_path / 'artifact'))
+    loaded = load_artifact(str(tmp_path / 'artifact'))
+    assert loaded.feature_encoding == feature_encoding
+    np.testing.assert_allclose(loaded.predict(records), expected, rtol=1e-5, atol=1e-4)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lookup_compiler import compile_lookup_scorer, load_lookup_scorer
+from synthetic_data import build_synthetic_model, random_records
+
+
+@pytest.mark.parametrize('feature_encoding', ['onehot', 'sparse', 'native'])
+def test_lookup_tables_match_model_predict(feature_encoding):
+    ml_model = build_synthetic_model(feature_encoding=feature_encoding, max_depth=4)
+    lookup = compile_lookup_scorer(ml_model)
+    records = random_records(ml_model.compile_scorer().categories, 2000)
+
+    expected = ml_model.predict(pd.DataFrame(records))
+    np.testing.assert_allclose(lookup.predict(records), expected, rtol=1e-5, atol=1e-4)
+    assert lookup.predict_one(records[0]) == pytest.approx(expected[0], abs=1e-4)
+
+
+def test_group_size_trades_tables_for_lookups_and_round_trips(tmp_path):
+    ml_model = build_synthetic_model(max_depth=3)
+    records = random_records(ml_model.compile_scorer().categories, 500, seed=1)
+    small = compile_lookup_scorer(ml_model, max_group_size=1)
+    large = compile_lookup_scorer(ml_model, max_group_size=1 << 16)
+    small_report, large_report = small.memory_report(), large.memory_report()
+    assert small_report['n_groups'] == ml_model.model.get_booster().num_boosted_rounds()
+    assert large_report['n_groups'] < small_report['n_groups']
+    assert large_report['total_bytes'] == (large_report['table_bytes'] + large_report['map_bytes']
+                                           + large_report['threshold_bytes'])
+    np.testing.assert_allclose(small.predict(records), large.predict(records), atol=1e-4)
+
+    path = str(tmp_path / 'lookup.npz')
+    large.save(path)
+    np.testing.assert_array_equal(load_lookup_scorer(path).predict(records), large.predict(records))
+
+
+def test_deep_trees_over_the_table_budget_are_refused():
+    ml_model = build_synthetic_model(n_estimators=5, max_depth=8)
+    with pytest.raises(ValueError, match='max_table_entries'):
+        compile_lookup_scorer(ml_model, max_table_entries=1000)
+    # Within the budget, the chunked table build still matches the booster
+    records = random_records(ml_model.compile_scorer().categories, 500, seed=3)
+    lookup = compile_lookup_scorer(ml_model)
+    np.testing.assert_allclose(lookup.predict(records), ml_model.predict(pd.DataFrame(records)), atol=1e-4)
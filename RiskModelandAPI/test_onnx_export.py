@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic_data import build_synthetic_model, random_records
+
+pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+
+from onnx_export import OnnxScorer, export_onnx, load_onnx_scorer  # noqa: E402
+
+
+@pytest.mark.parametrize('feature_encoding', ['onehot', 'sparse'])
+def test_onnx_graph_matches_model_predict(feature_encoding):
+    ml_model = build_synthetic_model(feature_encoding=feature_encoding, max_depth=4)
+    scorer = OnnxScorer.from_model(ml_model)
+    records = random_records(ml_model.compile_scorer().categories, 2000)
+
+    expected = ml_model.predict(pd.DataFrame(records))
+    np.testing.assert_allclose(scorer.predict(records), expected, rtol=1e-5, atol=1e-4)
+    assert scorer.predict_one(records[0]) == pytest.approx(expected[0], abs=1e-4)
+    assert scorer.model_version == ml_model.model_version()
+
+
+def test_native_encoding_is_not_exported():
+    ml_model = build_synthetic_model(feature_encoding='native', max_depth=3)
+    with pytest.raises(ValueError, match='native'):
+        OnnxScorer.from_model(ml_model)
+
+
+def test_export_round_trips_and_detects_stale_files(trained_model, tmp_path):
+    artifact = str(tmp_path / 'artifact')
+    version = trained_model.save_inference_artifact(artifact)['model_version']
+    export_onnx(trained_model, str(tmp_path / 'artifact' / 'model.onnx'), model_version=version)
+    records = random_records(trained_model.compile_scorer().categories, 200, seed=2)
+
+    scorer = load_onnx_scorer(artifact, model_version=version)
+    np.testing.assert_allclose(scorer.predict(records), trained_model.predict(pd.DataFrame(records)),
+                               rtol=1e-5, atol=1e-4)
+    with pytest.raises(ValueError, match='exported from model'):
+        load_onnx_scorer(artifact, model_version='0' * 16)
@@ -0,0 +1,31 @@
+from prediction_cache import PredictionCache
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(maxsize=2)
+    cache.put('a', 1.0)
+    cache.put('b', 2.0)
+    assert cache.get('a') == 1.0  # 'b' is now least recently used
+    cache.put('c', 3.0)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3.0
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (2, 1, 1, 2)
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('prediction_cache.time.monotonic', lambda: now[0])
+    cache = PredictionCache(maxsize=10, ttl=5)
+    cache.put('a', 1.0)
+    now[0] += 4
+    assert cache.get('a') == 1.0
+    now[0] += 2
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_zero_size_disables_cache():
+    cache = PredictionCache(maxsize=0)
+    cache.put('a', 1.0)
+    assert cache.get('a') is None and len(cache) == 0
@@ -0,0 +1,72 @@
+import json
+import os
+import pstats
+
+import numpy as np
+import pytest
+
+from profiling import profile_run, profiled
+
+
+@profiled('outer')
+def outer(X):
+    return inner(X)
+
+
+@profiled('inner')
+def inner(X):
+    return np.hstack([X, X])
+
+
+@profiled('allocate')
+def allocate(mb):
+    block = np.ones(mb * 1024 * 1024 // 8)
+    return float(block.sum())
+
+
+@profiled('fail')
+def fail():
+    raise ValueError('bad input')
+
+
+def test_decorator_is_transparent_outside_a_run():
+    X = np.zeros((5, 2))
+    assert outer(X).shape == (5, 4)
+
+
+def test_nested_stages_record_shapes_and_report(tmp_path):
+    with profile_run(log=lambda *a: None) as profiler:
+        outer(np.zeros((10, 3)))
+        with pytest.raises(ValueError):
+            fail()
+        report = profiler.write_report(str(tmp_path / 'run.json'), status='ok')
+
+    outer_record, inner_record, fail_record = report['stages']
+    assert (outer_record['depth'], inner_record['depth'], inner_record['parent']) == (0, 1, 'outer')
+    assert (inner_record['rows_in'], inner_record['columns_in']) == (10, 3)
+    assert (outer_record['rows_out'], outer_record['columns_out']) == (10, 6)
+    assert fail_record['error'] == 'ValueError: bad input'
+    assert outer_record['wall_seconds'] >= inner_record['wall_seconds'] >= 0
+    with open(tmp_path / 'run.json') as f:
+        written = json.load(f)
+    assert written['metadata'] == {'status': 'ok'}
+    assert written['summary']['inner']['calls'] == 1
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/clear_refs'), reason='needs Linux peak RSS reset')
+def test_peak_rss_is_attributed_to_the_stage():
+    with profile_run(log=lambda *a: None) as profiler:
+        allocate(200)
+        inner(np.zeros((2, 2)))
+    allocated, small = profiler.records
+    assert allocated['peak_rss_delta_mb'] > 150
+    assert small['peak_rss_delta_mb'] < 50
+
+
+def test_profile_stage_dumps_cprofile_stats(tmp_path):
+    with profile_run(profile_stage='inner', profile_dir=str(tmp_path), log=lambda *a: None) as profiler:
+        outer(np.zeros((3, 3)))
+    inner_record = profiler.records[1]
+    assert inner_record['profile'] == str(tmp_path / 'inner.prof')
+    assert 'profile' not in profiler.records[0]
+    assert pstats.Stats(inner_record['profile']).total_calls > 0
@@ -0,0 +1,53 @@
+import json
+
+from reports import render_reports, render_reports_in_background
+
+
+def test_reports_render_from_the_inference_artifact(trained_model, tmp_path):
+    artifact = str(tmp_path / 'artifact')
+    saved_metrics = trained_model.model_metrics
+    trained_model.model_metrics = {'r2_score': 0.8, 'rmse': 4.5, 'n_samples': 2000,
+                                   'shap_importance': {'num__amount': 0.5, 'cat__sector_Retail': 0.25}}
+    try:
+        version = trained_model.save_inference_artifact(artifact)['model_version']
+    finally:
+        trained_model.model_metrics = saved_metrics
+    run_report = tmp_path / 'run.json'
+    run_report.write_text(json.dumps({'metadata': {'status': 'ok'},
+                                      'summary': {'fit': {'calls': 1, 'wall_seconds': 2.0, 'cpu_seconds': 1.5,
+                                                          'peak_rss_delta_mb': 10.0}}}))
+
+    out = tmp_path / 'reports'
+    written = render_reports(artifact, str(out), str(run_report), dpi=50)
+    assert {p.name for p in out.iterdir()} == {'feature_importance.png', 'shap_importance.png',
+                                                'metrics.json', 'summary.md'}
+    assert len(written) == 4
+    metrics = json.loads((out / 'metrics.json').read_text())
+    assert metrics['model_version'] == version
+    assert metrics['metrics'] == {'r2_score': 0.8, 'rmse': 4.5, 'n_samples': 2000}
+    assert metrics['run_status'] == 'ok'
+    assert list(metrics['shap_importance']) == ['num__amount', 'cat__sector_Retail']
+    importances = list(metrics['feature_importance'].values())
+    assert importances == sorted(importances, reverse=True)
+    assert '| fit | 1 | 2.00 | 1.50 |' in (out / 'summary.md').read_text()
+
+
+def test_background_rendering_runs_in_a_separate_process(trained_model, tmp_path):
+    pickle_path = str(tmp_path / 'model.pkl')
+    trained_model.save_model(pickle_path)
+    out = tmp_path / 'reports'
+    process = render_reports_in_background(pickle_path, str(out), dpi=50)
+    assert process.wait(timeout=120) == 0
+    assert (out / 'feature_importance.png').exists()
+    assert json.loads((out / 'metrics.json').read_text())['model_version'] == trained_model.model_version()
+
+
+def test_plotting_leaves_the_callers_backend_alone(tmp_path):
+    import matplotlib
+
+    from reports import plot_importance
+
+    backend = matplotlib.get_backend()
+    path = plot_importance({'amount': 0.6, 'sector': 0.4}, str(tmp_path / 'importance.png'), 'Importance', dpi=50)
+    assert (tmp_path / 'importance.png').stat().st_size > 0 and path.endswith('importance.png')
+    assert matplotlib.get_backend() == backend
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import credit_pred
+from score_loans import score_file
+from synthetic_data import generate_loan_data
+
+
+class _Interrupt(Exception):
+    pass
+
+
+@pytest.fixture
+def loan_file(tmp_path):
+    path = tmp_path / 'loan_data.csv'
+    generate_loan_data(3000, seed=3).to_csv(path, index=False)
+    return str(path)
+
+
+def _expected_scores(path):
+    df = pd.read_csv(path, dtype={f: str for f in credit_pred.CATEGORICAL_FIELDS})
+    records = df[credit_pred.REQUIRED_FIELDS].astype(object).where(df.notna(), None).to_dict('records')
+    return [r['score'] for r in credit_pred.predict_credit_scores(records)]
+
+
+def test_streams_file_in_order_across_workers(loaded_model, loan_file, tmp_path):
+    output = str(tmp_path / 'scores.csv')
+    summary = score_file(loan_file, output, chunksize=400, workers=2, log=lambda msg: None)
+    scores = pd.read_csv(output)
+    assert summary['rows'] == 3000 and summary['chunks'] == 8
+    assert list(scores.columns) == ['id', 'risk_score', 'model_version']
+    assert scores['id'].tolist() == list(range(1, 3001))
+    assert scores['risk_score'].tolist() == pytest.approx(_expected_scores(loan_file), abs=1e-4)
+
+
+def test_resume_continues_after_interruption(loaded_model, loan_file, tmp_path):
+    reference, output = str(tmp_path / 'reference.csv'), str(tmp_path / 'scores.csv')
+    score_file(loan_file, reference, chunksize=400, workers=0, log=lambda msg: None)
+
+    messages = []
+
+    def interrupt_after_three_chunks(msg):
+        messages.append(msg)
+        if len(messages) == 3:
+            raise _Interrupt()
+    with pytest.raises(_Interrupt):
+        score_file(loan_file, output, chunksize=400, workers=0, log=interrupt_after_three_chunks)
+
+    summary = score_file(loan_file, output, chunksize=400, workers=0, resume=True, log=lambda msg: None)
+    assert summary['chunks'] == 5
+    with open(reference) as expected, open(output) as actual:
+        assert actual.read() == expected.read()
+
+
+def test_parquet_output(loaded_model, loan_file, tmp_path):
+    output = str(tmp_path / 'scores_parquet')
+    score_file(loan_file, output, output_format='parquet', chunksize=1000, workers=0, log=lambda msg: None)
+    scores = pd.read_parquet(output).sort_values('id')
+    assert len(scores) == 3000
+    assert scores['risk_score'].tolist() == pytest.approx(_expected_scores(loan_file), abs=1e-4)
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from boost_model import MicroLoanRiskModelAdvanced
+from synthetic_data import generate_loan_data
+from training_cache import TrainingDataCache, prepare_training_data
+
+
+@pytest.fixture
+def loan_csv(tmp_path):
+    path = tmp_path / 'loan_data.csv'
+    generate_loan_data(2000, seed=4).to_csv(path, index=False)
+    return str(path)
+
+
+def test_cache_hit_restores_identical_data(loan_csv, tmp_path):
+    cache = TrainingDataCache(str(tmp_path / 'cache'))
+    fresh_model = MicroLoanRiskModelAdvanced()
+    fresh = prepare_training_data(fresh_model, loan_csv, cache=cache)
+    cached_model = MicroLoanRiskModelAdvanced()
+    cached = prepare_training_data(cached_model, loan_csv, cache=cache)
+
+    assert len(cache.entries()) == 1
+    for expected, actual in zip(fresh[:4], cached[:4]):
+        assert (expected.index == actual.index).all()
+        np.testing.assert_array_equal(np.asarray(expected), np.asarray(actual))
+    pd.testing.assert_frame_equal(fresh[4], cached[4], check_freq=False)
+    assert cached_model.feature_names == fresh_model.feature_names
+    X_raw = fresh[4][fresh_model.feature_names].head(20)
+    np.testing.assert_allclose(cached_model.preprocessor.transform(X_raw),
+                               fresh_model.preprocessor.transform(X_raw))
+
+
+def test_key_changes_with_file_and_params(loan_csv, tmp_path):
+    cache = TrainingDataCache(str(tmp_path / 'cache'))
+    key = cache.key_for(loan_csv, {'test_size': 0.3})
+    assert cache.key_for(loan_csv, {'test_size': 0.2}) != key
+    generate_loan_data(2000, seed=5).to_csv(loan_csv, index=False)
+    assert cache.key_for(loan_csv, {'test_size': 0.3}) != key
+
+
+def test_eviction_and_bypass(loan_csv, tmp_path):
+    cache = TrainingDataCache(str(tmp_path / 'cache'))
+    prepare_training_data(MicroLoanRiskModelAdvanced(), loan_csv, cache=cache, test_size=0.3)
+    prepare_training_data(MicroLoanRiskModelAdvanced(), loan_csv, cache=cache, test_size=0.2)
+    assert len(cache.entries()) == 2
+
+    cache.max_bytes = cache.entries()[-1][1]
+    cache.evict()
+    assert len(cache.entries()) == 1
+
+    prepare_training_data(MicroLoanRiskModelAdvanced(), loan_csv, use_cache=False, cache=cache, test_size=0.25)
+    assert len(cache.entries()) == 1
+    assert os.path.isdir(cache.cache_dir)
+
+
+@pytest.mark.parametrize('feature_encoding', ['sparse', 'native'])
+def test_cache_round_trips_other_encodings(loan_csv, tmp_path, feature_encoding):
+    cache = TrainingDataCache(str(tmp_path / 'cache'))
+    fresh_model = MicroLoanRiskModelAdvanced()
+    fresh = prepare_training_data(fresh_model, loan_csv, cache=cache, feature_encoding=feature_encoding)
+    cached_model = MicroLoanRiskModelAdvanced()
+    cached = prepare_training_data(cached_model, loan_csv, cache=cache, feature_encoding=feature_encoding)
+
+    assert type(cached[0]) is type(fresh[0])
+    assert cached_model.feature_encoding == feature_encoding
+    assert cached_model.processed_feature_names == fresh_model.processed_feature_names
+    assert cached_model.X_train_proc_df.shape == fresh_model.X_train_proc_df.shape
+    if feature_encoding == 'sparse':
+        assert (cached[0] != fresh[0]).nnz == 0
+    else:
+        pd.testing.assert_frame_equal(cached[0], fresh[0])
+
+
+def test_changed_preparation_code_misses_the_cache(loan_csv, tmp_path):
+    class EditedModel(MicroLoanRiskModelAdvanced):
+        def clean_data(self, df, lean=False, fill_values=None):
+            return super().clean_data(df, lean=lean, fill_values=fill_values).iloc[:-1]
+
+    cache = TrainingDataCache(str(tmp_path / 'cache'))
+    original = prepare_training_data(MicroLoanRiskModelAdvanced(), loan_csv, cache=cache)
+    edited = prepare_training_data(EditedModel(), loan_csv, cache=cache)
+    assert len(cache.entries()) == 2
+    assert len(edited[4]) == len(original[4]) - 1
+
+
+def test_hashes_of_changed_or_deleted_files_are_pruned(loan_csv, tmp_path):
+    import json
+
+    cache = TrainingDataCache(str(tmp_path / 'cache'))
+    other = tmp_path / 'other.csv'
+    other.write_text('a,b\n1,2\n')
+    cache.file_hash(loan_csv)
+    cache.file_hash(str(other))
+    generate_loan_data(2000, seed=5).to_csv(loan_csv, index=False)
+    cache.file_hash(loan_csv)
+    index_path = os.path.join(cache.cache_dir, 'file_hashes.json')
+    with open(index_path) as f:
+        assert len(json.load(f)) == 2
+
+    other.unlink()
+    cache.evict()
+    with open(index_path) as f:
+        assert [fingerprint.split('|')[0] for fingerprint in json.load(f)] == [os.path.abspath(loan_csv)]
+    cache.clear()
+    assert not os.path.exists(index_path)
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from tuning import HalvingSearch, plan_threads
+
+
+@pytest.fixture(scope='module')
+def split_data():
+    from boost_model import MicroLoanRiskModelAdvanced
+    from synthetic_data import generate_loan_data
+    ml_model = MicroLoanRiskModelAdvanced()
+    X, y = ml_model.prepare_features(ml_model.clean_data(generate_loan_data(3000, seed=6), lean=True))
+    return ml_model.preprocess_data(X, y)
+
+
+def test_hyperband_schedule():
+    search = HalvingSearch(max_rounds=81, min_rounds=3, eta=3)
+    schedule = search.brackets()
+    assert [s for s, _, _ in schedule] == [3, 2, 1, 0]
+    assert schedule[0][2] == [(27, 3), (9, 9), (3, 27), (1, 81)]
+    assert schedule[-1][2] == [(4, 81)]
+
+
+@pytest.mark.parametrize('resource', ['rounds', 'data'])
+def test_search_logs_and_resumes(split_data, tmp_path, resource):
+    X_train, X_valid, y_train, y_valid = split_data
+    log_path = str(tmp_path / 'trials.jsonl')
+    options = dict(method='halving', max_rounds=27, min_rounds=3, eta=3, n_configs=6, resource=resource,
+                   early_stopping_rounds=5, trials_path=log_path, cpu_budget=1, log=lambda *a: None)
+
+    search = HalvingSearch(**options).fit(X_train, y_train, X_valid, y_valid)
+    assert len(search.trials_) == 6 + 2 + 1
+    assert 1 <= search.best_rounds_ <= 27
+    with open(log_path) as f:
+        lines = [json.loads(line) for line in f]
+    assert 'header' in lines[0] and len(lines) == 1 + len(search.trials_)
+
+    resumed = HalvingSearch(resume=True, **options).fit(X_train, y_train, X_valid, y_valid)
+    assert resumed.trials_ == search.trials_
+    assert resumed.best_params_ == search.best_params_
+
+    with pytest.raises(ValueError):
+        HalvingSearch(resume=True, **dict(options, seed=7)).fit(X_train, y_train, X_valid, y_valid)
+
+
+def test_time_budget_keeps_best_so_far(split_data):
+    X_train, X_valid, y_train, y_valid = split_data
+    search = HalvingSearch(max_rounds=81, min_rounds=3, time_budget=0.0, cpu_budget=1, log=lambda *a: None)
+    search.fit(X_train, y_train, X_valid, y_valid)
+    assert search.timed_out_
+    assert len(search.trials_) == 1
+
+
+def test_plan_threads_never_oversubscribes():
+    assert plan_threads(8, 100) == (8, 1)
+    assert plan_threads(8, 2) == (2, 4)
+    assert plan_threads(8, 6, max_parallel=3) == (3, 2)
+    assert plan_threads(1, 10) == (1, 1)
+    for cpus in range(1, 17):
+        for units in range(1, 20):
+            parallel, threads = plan_threads(cpus, units)
+            assert parallel * threads <= cpus
+
+
+def test_cross_validated_search_in_parallel(split_data):
+    X_train, _, y_train, _ = split_data
+    search = HalvingSearch(method='halving', max_rounds=27, min_rounds=3, n_configs=4, n_folds=3,
+                           early_stopping_rounds=5, cpu_budget=2, log=lambda *a: None)
+    search.fit(X_train, y_train)
+    assert len(search.trials_) == 4 + 1 + 1
+    assert {rung['parallel'] * rung['threads_per_unit'] for rung in search.cpu_report_['rungs']} <= {1, 2}
+    assert search.cpu_report_['rungs'][0]['units'] == 4 * 3
+    assert 0 < search.cpu_report_['utilization']
@@ -0,0 +1,42 @@
+import sys
+
+import pytest
+
+import credit_pred
+from synthetic_data import sample_records
+from worker_pool import ScoringWorkerPool
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='relies on fork and /proc')
+def test_pool_matches_in_process_scoring(loaded_model):
+    records = sample_records(300)
+    records[5] = {'sector': 'Retail'}
+    expected = credit_pred.predict_credit_scores(records)
+
+    with ScoringWorkerPool(n_workers=2, chunk_size=64) as pool:
+        results = pool.score(records)
+        report = pool.memory_report()
+
+    assert [r['error'] for r in results] == [r['error'] for r in expected]
+    assert [r['score'] for r in results] == pytest.approx([r['score'] for r in expected])
+    assert len(report['workers']) == 2
+    assert all(w['rss_mb'] > 0 and w['uss_mb'] <= w['rss_mb'] for w in report['workers'])
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='relies on fork and /proc')
+def test_a_dead_worker_fails_pending_chunks_and_breaks_the_pool(loaded_model, monkeypatch):
+    import os
+    import signal
+
+    def crash(records):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    records = sample_records(20)
+    # Inherited by the forked worker, which dies in the middle of its first chunk
+    monkeypatch.setattr(credit_pred, 'predict_credit_scores', crash)
+    with ScoringWorkerPool(n_workers=1, chunk_size=10) as pool:
+        with pytest.raises(RuntimeError, match='died'):
+            pool.score(records, timeout=30)
+        assert pool.broken
+        with pytest.raises(RuntimeError, match='broken'):
+            pool.submit(records)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Training Data Cache
+
+A content-addressed on-disk cache for the data preparation steps of a
+training run (load_data -> clean_data -> prepare_features -> preprocess_data).
+An entry is keyed on the SHA-256 of the input file plus the loading, cleaning
+and split parameters, the source of the preparation code and the library
+versions, so it is reused only when the result would be identical; editing
+clean_data or preprocess_data (or a helper they call) invalidates it. Each entry holds:
+  - clean.parquet     the cleaned frame (pickle if pyarrow is missing)
+  - arrays.npz        the processed train/test matrices (dense, or CSR parts
+                      for the sparse encoding), targets and row index
+  - X_*.parquet       the processed frames instead, for the native categorical
+                      encoding
+  - state.pkl         the fitted ColumnTransformer and the model attributes
+                      preprocess_data sets
+  - meta.json         feature names, shapes and bookkeeping
+
+Entries are evicted least-recently-used once the cache exceeds `max_bytes`.
+Remembered file hashes are dropped once their file is deleted or changes.
+
+Environment:
+  TRAINING_CACHE_DIR     cache location (default: .training_cache next to this file)
+  TRAINING_CACHE_MAX_MB  size limit in MB (default: 2048)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+
+# Layout of an entry on disk; bump when the files or their contents change shape
+CACHE_FORMAT_VERSION = 3
+DEFAULT_CACHE_DIR = os.environ.get(
+    'TRAINING_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.training_cache')
+)
+DEFAULT_MAX_BYTES = int(float(os.environ.get('TRAINING_CACHE_MAX_MB', 2048)) * 1024 * 1024)
+
+_HASH_BLOCK = 1 << 20
+_HASH_INDEX = 'file_hashes.json'
+
+# Model attributes set by preprocess_data that a cache hit must restore
+_MODEL_STATE = ('preprocessor', 'feature_names', 'feature_encoding', 'processed_feature_names')
+
+# Model methods whose source (and that of what they call) is part of the key
+_PREPARATION_STEPS = ('load_data', 'clean_data', 'prepare_features', 'preprocess_data')
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _library_versions():
+    import sklearn
+    return {'pandas': pd.__version__, 'numpy': np.__version__, 'sklearn': sklearn.__version__}
+
+
+def _preparation_code(ml_model):
+    """
+    SHA-256 of the source of `ml_model`'s preparation methods and of the
+    methods, functions and classes of its module that they reach by name.
+    """
+    cls = type(ml_model)
+    module = inspect.getmodule(cls)
+    pending = [getattr(cls, name) for name in _PREPARATION_STEPS]
+    sources = {}
+    while pending:
+        obj = inspect.unwrap(pending.pop())
+        if obj in sources:
+            continue
+        try:
+            sources[obj] = inspect.getsource(obj)
+        except (OSError, TypeError):
+            continue
+        codes = [obj.__code__] if inspect.isfunction(obj) else []
+        while codes:
+            code = codes.pop()
+            codes.extend(const for const in code.co_consts if inspect.iscode(const))
+            for name in code.co_names:
+                target = getattr(cls, name, None) or getattr(module, name, None)
+                if ((inspect.isfunction(target) or inspect.isclass(target))
+                        and inspect.getmodule(inspect.unwrap(target)) is module):
+                    pending.append(target)
+    digest = hashlib.sha256()
+    for source in sorted(sources.values()):
+        digest.update(source.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _matrix_format(X):
+    """'dense' for numeric DataFrames, 'csr' for scipy sparse, 'frame' for mixed-dtype frames."""
+    if not hasattr(X, 'columns'):
+        return 'csr'
+    return 'dense' if all(pd.api.types.is_numeric_dtype(dtype) for dtype in X.dtypes) else 'frame'
+
+
+def _current_hashes(index):
+    """The entries of a file-hash index whose file still has the remembered size and mtime."""
+    current = {}
+    for fingerprint, digest in index.items():
+        path, size, mtime_ns = fingerprint.rsplit('|', 2)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if f"{stat.st_size}|{stat.st_mtime_ns}" == f"{size}|{mtime_ns}":
+            current[fingerprint] = digest
+    return current
+
+
+def _restore_matrix(entry, name, meta, arrays):
+    index = arrays['train_index' if name == 'X_train' else 'test_index']
+    if meta['matrix_format'] == 'dense':
+        return pd.DataFrame(arrays[name], columns=meta['processed_columns'], index=index)
+    if meta['matrix_format'] == 'csr':
+        from scipy import sparse
+        return sparse.csr_matrix((arrays[f'{name}_data'], arrays[f'{name}_indices'], arrays[f'{name}_indptr']),
+                                 shape=tuple(arrays[f'{name}_shape']))
+    frame = pd.read_parquet(os.path.join(entry, f'{name}.parquet'))
+    frame.index = index
+    return frame
+
+
+class TrainingDataCache:
+    """Content-addressed store of cleaned and preprocessed training data."""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Args:
+            cache_dir: Directory holding the entries (default: DEFAULT_CACHE_DIR)
+            max_bytes: Evict least-recently-used entries beyond this total size
+        """
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _read_hash_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, _HASH_INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_hash_index(self, index):
+        index_path = os.path.join(self.cache_dir, _HASH_INDEX)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+    def file_hash(self, filepath):
+        """
+        SHA-256 of a file's contents. Hashes are remembered per (path, size,
+        mtime), so an unchanged file is only read once.
+        """
+        stat = os.stat(filepath)
+        fingerprint = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}"
+        index = self._read_hash_index()
+        if fingerprint in index:
+            return index[fingerprint]
+
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+                digest.update(block)
+        index = _current_hashes(index)
+        index[fingerprint] = digest.hexdigest()
+        self._write_hash_index(index)
+        return index[fingerprint]
+
+    def prune_hashes(self):
+        """Forget the hashes of files that were deleted or have changed since."""
+        index = self._read_hash_index()
+        current = _current_hashes(index)
+        if len(current) < len(index):
+            self._write_hash_index(current)
+
+    def key_for(self, filepath, params):
+        """Cache key for `filepath` prepared with `params` (a JSON-serializable dict)."""
+        payload = json.dumps({
+            'format': CACHE_FORMAT_VERSION,
+            'file': self.file_hash(filepath),
+            'params': params,
+            'versions': _library_versions(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """
+        Return the cached entry for `key` as a dict (df_clean, X_train, X_test,
+        y_train, y_test, state), or None on a miss.
+        """
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['clean_format'] == 'parquet':
+                df_clean = pd.read_parquet(os.path.join(entry, 'clean.parquet'))
+            else:
+                df_clean = pd.read_pickle(os.path.join(entry, 'clean.pkl'))
+            with np.load(os.path.join(entry, 'arrays.npz'), allow_pickle=False) as arrays:
+                arrays = dict(arrays)
+            matrices = {name: _restore_matrix(entry, name, meta, arrays) for name in ('X_train', 'X_test')}
+            with open(os.path.join(entry, 'state.pkl'), 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable training cache entry {key}: {str(e)}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        os.utime(meta_path)
+        target = meta['target_name']
+        return {
+            'df_clean': df_clean,
+            'X_train': matrices['X_train'],
+            'X_test': matrices['X_test'],
+            'y_train': pd.Series(arrays['y_train'], index=arrays['train_index'], name=target),
+            'y_test': pd.Series(arrays['y_test'], index=arrays['test_index'], name=target),
+            'state': state,
+        }
+
+    def store(self, key, df_clean, X_train, X_test, y_train, y_test, state):
+        """
+        Write an entry atomically, then evict old entries beyond the size limit.
+
+        Args:
+            key: Entry key from key_for
+            df_clean: Cleaned frame
+            X_train, X_test, y_train, y_test: preprocess_data output
+            state: Picklable dict of model attributes to restore on a hit
+        """
+        entry = self._entry(key)
+        staging = tempfile.mkdtemp(prefix=f'.{key}-', dir=self.cache_dir)
+        try:
+            try:
+                df_clean.to_parquet(os.path.join(staging, 'clean.parquet'), index=True)
+                clean_format = 'parquet'
+            except ImportError:
+                df_clean.to_pickle(os.path.join(staging, 'clean.pkl'))
+                clean_format = 'pickle'
+            arrays = {
+                'y_train': y_train.to_numpy(), 'y_test': y_test.to_numpy(),
+                'train_index': y_train.index.to_numpy(), 'test_index': y_test.index.to_numpy(),
+            }
+            matrix_format = _matrix_format(X_train)
+            for name, X in (('X_train', X_train), ('X_test', X_test)):
+                if matrix_format == 'dense':
+                    arrays[name] = X.to_numpy()
+                elif matrix_format == 'csr':
+                    arrays.update({f'{name}_data': X.data, f'{name}_indices': X.indices,
+                                   f'{name}_indptr': X.indptr, f'{name}_shape': np.asarray(X.shape)})
+                else:
+                    X.to_parquet(os.path.join(staging, f'{name}.parquet'), index=False)
+            np.savez(os.path.join(staging, 'arrays.npz'), **arrays)
+            with open(os.path.join(staging, 'state.pkl'), 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            meta = {
+                'key': key,
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'clean_format': clean_format,
+                'matrix_format': matrix_format,
+                'processed_columns': list(X_train.columns) if hasattr(X_train, 'columns') else None,
+                'target_name': y_train.name,
+                'train_rows': X_train.shape[0],
+                'test_rows': X_test.shape[0],
+            }
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(staging, entry)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """Return (key, size_bytes, last_used) for every entry, least recently used first."""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+            if not name.startswith('.') and os.path.exists(meta_path):
+                found.append((name, _dir_size(os.path.join(self.cache_dir, name)), os.path.getmtime(meta_path)))
+        return sorted(found, key=lambda item: item[2])
+
+    def evict(self, keep=None):
+        """
+        Remove least-recently-used entries until the cache fits in max_bytes,
+        and the remembered hashes of files that are gone or changed.
+        """
+        self.prune_hashes()
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+            print(f"Evicted training cache entry {key} ({size / 1e6:.1f} MB)")
+
+    def clear(self):
+        """Remove every entry and the remembered file hashes."""
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+        try:
+            os.remove(os.path.join(self.cache_dir, _HASH_INDEX))
+        except FileNotFoundError:
+            pass
+
+
+@profiled('prepare_training_data')
+def prepare_training_data(ml_model, filepath='loan_data.csv', use_cache=True, cache=None,
+                          load_params=None, test_size=0.3, random_state=42, feature_encoding='onehot'):
+    """
+    Run load/clean/prepare/preprocess for `ml_model`, or restore the result
+    from the cache when the input file and parameters are unchanged.
+
+    On a hit the model's preprocessor, feature names, feature encoding and
+    X_train_proc_df are set exactly as preprocess_data would have set them.
+
+    Args:
+        ml_model: MicroLoanRiskModelAdvanced instance to prepare
+        filepath: Loan CSV export
+        use_cache: False to bypass the cache (neither read nor written)
+        cache: TrainingDataCache to use (default: one at DEFAULT_CACHE_DIR)
+        load_params: Extra keyword arguments for load_data
+        test_size, random_state, feature_encoding: Passed to preprocess_data
+
+    Returns:
+        tuple: (X_train, X_test, y_train, y_test, df_clean)
+    """
+    load_params = dict(load_params or {})
+    key = None
+    if use_cache:
+        cache = cache or TrainingDataCache()
+        key = cache.key_for(filepath, {'load': load_params, 'test_size': test_size,
+                                       'random_state': random_state, 'feature_encoding': feature_encoding,
+                                       'code': _preparation_code(ml_model)})
+        start = time.perf_counter()
+        hit = cache.load(key)
+        if hit is not None:
+            state = hit['state']
+            for name in _MODEL_STATE:
+                setattr(ml_model, name, state[name])
+            background = state.get('X_train_proc_df')
+            ml_model.X_train_proc_df = background if background is not None else hit['X_train'].copy()
+            print(f"Loaded prepared training data from cache {key} "
+                  f"({hit['X_train'].shape[0]} train / {hit['X_test'].shape[0]} test rows "
+                  f"in {time.perf_counter() - start:.2f}s)")
+            return hit['X_train'], hit['X_test'], hit['y_train'], hit['y_test'], hit['df_clean']
+
+    df_clean = ml_model.clean_data(ml_model.load_data(filepath, **load_params), lean=True)
+    X, y = ml_model.prepare_features(df_clean)
+    X_train, X_test, y_train, y_test = ml_model.preprocess_data(X, y, test_size=test_size,
+                                                                random_state=random_state,
+                                                                feature_encoding=feature_encoding)
+    if key is not None:
+        state = {name: getattr(ml_model, name) for name in _MODEL_STATE}
+        if not hasattr(X_train, 'columns'):
+            # Sparse training data: X_train_proc_df is only a background sample
+            state['X_train_proc_df'] = ml_model.X_train_proc_df
+        cache.store(key, df_clean, X_train, X_test, y_train, y_test, state)
+        print(f"Stored prepared training data in cache {key}")
+    return X_train, X_test, y_train, y_test, df_clean
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Hyperparameter Search
+
+Successive halving and Hyperband over XGBoost boosting rounds (or training
+data fraction), with early stopping on a validation fold:
+  - every rung trains its configurations on a small budget, keeps the best
+    1/eta of them and gives the survivors eta times more budget
+  - with the 'rounds' resource survivors continue boosting from where they
+    stopped instead of starting over, and configurations that early-stopped
+    below their budget are not trained further
+  - Hyperband runs several such brackets, from many configurations on a
+    small budget down to a few on the full budget
+  - an optional wall-clock budget stops the search and keeps the best so far
+  - each validation (or cross-validation) fold is quantized once into a
+    QuantileDMatrix shared by every trial, and each rung splits a CPU budget
+    between parallel trials and XGBoost threads per trial, so the cores are
+    never oversubscribed; CPU utilization is logged per rung
+
+Each trial is appended to a JSONL log. Configurations are drawn from a seeded
+generator per bracket, so the schedule is deterministic: rerunning with
+resume=True replays finished trials from the log and only trains the rest.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Hyperparameter search space: name -> (kind, low, high)
+#   'int' - uniform integer in [low, high]; 'uniform' - uniform float;
+#   'log' - log-uniform float
+DEFAULT_SEARCH_SPACE = {
+    'max_depth': ('int', 3, 10),
+    'learning_rate': ('log', 0.01, 0.3),
+    'subsample': ('uniform', 0.5, 1.0),
+    'colsample_bytree': ('uniform', 0.5, 1.0),
+    'min_child_weight': ('log', 1.0, 20.0),
+    'gamma': ('uniform', 0.0, 5.0),
+    'reg_alpha': ('log', 1e-3, 10.0),
+    'reg_lambda': ('log', 0.1, 10.0),
+}
+
+# Parameters the search fixes for every trial
+BASE_PARAMS = {
+    'objective': 'reg:squarederror',
+    'eval_metric': 'rmse',
+    'tree_method': 'hist',
+    'seed': 42,
+}
+
+
+def sample_params(space, rng):
+    """Draw one configuration from `space` (see DEFAULT_SEARCH_SPACE)."""
+    params = {}
+    for name, (kind, low, high) in space.items():
+        if kind == 'int':
+            params[name] = int(rng.integers(low, high + 1))
+        elif kind == 'uniform':
+            params[name] = float(rng.uniform(low, high))
+        elif kind == 'log':
+            params[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            raise ValueError(f"Unknown search space kind for {name}: {kind}")
+    return params
+
+
+class TrialLog:
+    """Append-only JSONL record of search trials, with a header line describing the search."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, header):
+        """
+        Return {trial_key: record} from an existing log written by the same search.
+
+        Raises:
+            ValueError: If the log was written with different search settings
+        """
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        trials = {}
+        with open(self.path) as f:
+            for i, line in enumerate(f):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if i == 0:
+                    if record.get('header') != header:
+                        raise ValueError(f"Trial log {self.path} belongs to a different search; "
+                                         f"remove it or rerun without resume")
+                    continue
+                trials[record['key']] = record
+        return trials
+
+    def start(self, header, resume):
+        if not self.path:
+            return
+        if resume and os.path.exists(self.path):
+            return
+        with open(self.path, 'w') as f:
+            f.write(json.dumps({'header': header}) + '\n')
+
+    def append(self, record):
+        if not self.path:
+            return
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class HalvingSearch:
+    """Successive-halving / Hyperband search over XGBoost hyperparameters."""
+
+    def __init__(self, space=None, method='hyperband', max_rounds=1000, min_rounds=30, eta=3,
+                 n_configs=None, resource='rounds', early_stopping_rounds=30, time_budget=None,
+                 trials_path=None, resume=False, seed=42, n_folds=1, cpu_budget=None,
+                 max_parallel_trials=None, xgb_params=None, log=print):
+        """
+        Args:
+            space: Search space (default: DEFAULT_SEARCH_SPACE)
+            method: 'hyperband' (several brackets) or 'halving' (one bracket)
+            max_rounds: Boosting rounds of a full-budget trial
+            min_rounds: Smallest rung budget in rounds (with resource='data' the
+                smallest data fraction is min_rounds / max_rounds)
+            eta: Halving rate; each rung keeps the best 1/eta configurations
+            n_configs: Configurations in the first rung of 'halving' (default: eta ** n_rungs)
+            resource: 'rounds' (budget = boosting rounds) or 'data' (budget =
+                fraction of training rows, always up to max_rounds)
+            early_stopping_rounds: Patience on the validation RMSE
+            time_budget: Stop starting trials after this many seconds (the first
+                trial always runs)
+            trials_path: JSONL trial log (None to keep trials in memory only)
+            resume: Replay finished trials from `trials_path`
+            seed: Seed for configuration sampling and folds
+            n_folds: Cross-validation folds when fit() gets no validation set
+            cpu_budget: Cores to use (default: all available). Each rung splits
+                them between parallel (trial, fold) units and XGBoost threads
+            max_parallel_trials: Upper bound on parallel units
+            xgb_params: Extra fixed XGBoost parameters (e.g. enable categorical support)
+            log: Callable used for progress messages
+        """
+        if method not in ('hyperband', 'halving'):
+            raise ValueError(f"Unknown search method: {method}")
+        if resource not in ('rounds', 'data'):
+            raise ValueError(f"Unknown search resource: {resource}")
+        if not 0 < min_rounds <= max_rounds:
+            raise ValueError("min_rounds must be between 1 and max_rounds")
+        self.space = dict(space or DEFAULT_SEARCH_SPACE)
+        self.method = method
+        self.max_rounds = max_rounds
+        self.min_rounds = min_rounds
+        self.eta = eta
+        self.n_configs = n_configs
+        self.resource = resource
+        self.early_stopping_rounds = early_stopping_rounds
+        self.time_budget = time_budget
+        self.trial_log = TrialLog(trials_path)
+        self.resume = resume
+        self.seed = seed
+        self.n_folds = n_folds
+        self.cpu_budget = cpu_budget or available_cpus()
+        self.max_parallel_trials = max_parallel_trials
+        self.xgb_params = dict(xgb_params or {})
+        self.log = log
+
+    def brackets(self):
+        """
+        Return the schedule as a list of (bracket, n_configs, rung budgets),
+        where each rung budget is (n_trials, rounds).
+        """
+        s_max = int(math.floor(math.log(self.max_rounds / self.min_rounds, self.eta) + 1e-9))
+        if self.method == 'halving':
+            brackets = [(s_max, self.n_configs or self.eta ** s_max)]
+        else:
+            brackets = [(s, int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s)))
+                        for s in range(s_max, -1, -1)]
+        schedule = []
+        for s, n in brackets:
+            rungs = []
+            for i in range(s + 1):
+                n_i = max(int(n * self.eta ** -i), 1)
+                r_i = int(round(self.max_rounds * self.eta ** (i - s)))
+                rungs.append((n_i, min(r_i, self.max_rounds)))
+            schedule.append((s, n, rungs))
+        return schedule
+
+    def _header(self):
+        return {
+            'method': self.method, 'max_rounds': self.max_rounds, 'min_rounds': self.min_rounds,
+            'eta': self.eta, 'n_configs': self.n_configs, 'resource': self.resource,
+            'early_stopping_rounds': self.early_stopping_rounds, 'seed': self.seed, 'n_folds': self.n_folds,
+            'space': {name: list(spec) for name, spec in self.space.items()},
+        }
+
+    def _train(self, params, dtrain, dvalid, rounds, previous=None, nthread=1):
+        """
+        Train up to `rounds` boosting rounds, continuing `previous` (a state
+        dict from an earlier rung) when given.
+
+        Returns:
+            dict with booster, rmse (best validation RMSE), best_iteration and budget
+        """
+        import xgboost as xgb
+
+        done = previous['booster'].num_boosted_rounds() if previous is not None else 0
+        if rounds <= done:
+            return dict(previous, budget=rounds)
+        evals_result = {}
+        booster = xgb.train(
+            {**BASE_PARAMS, 'nthread': nthread, **self.xgb_params, **params},
+            dtrain,
+            num_boost_round=rounds - done,
+            evals=[(dvalid, 'valid')],
+            early_stopping_rounds=self.early_stopping_rounds,
+            evals_result=evals_result,
+            xgb_model=previous['booster'] if previous is not None else None,
+            verbose_eval=False,
+        )
+        # The evaluation history only covers the rounds trained in this call
+        history = evals_result['valid']['rmse']
+        best = int(np.argmin(history))
+        if previous is not None and previous['rmse'] <= history[best]:
+            return {'booster': booster, 'rmse': previous['rmse'],
+                    'best_iteration': previous['best_iteration'], 'budget': rounds}
+        return {'booster': booster, 'rmse': float(history[best]), 'best_iteration': done + best, 'budget': rounds}
+
+    def _build_folds(self, X_train, y_train, X_valid, y_valid):
+        """
+        Quantize the data once: one QuantileDMatrix per fold for training and
+        one for validation (sharing the training cuts), reused by every trial.
+        """
+        import xgboost as xgb
+
+        categorical = bool(self.xgb_params.get('enable_categorical'))
+        if X_valid is not None:
+            splits = [(X_train, np.asarray(y_train), X_valid, np.asarray(y_valid))]
+        else:
+            from sklearn.model_selection import KFold, StratifiedKFold
+            y = np.asarray(y_train)
+            folds = StratifiedKFold(self.n_folds, shuffle=True, random_state=self.seed)
+            try:
+                indices = list(folds.split(np.zeros(len(y)), y))
+            except ValueError:
+                indices = list(KFold(self.n_folds, shuffle=True, random_state=self.seed).split(y))
+            splits = [(_take_rows(X_train, tr), y[tr], _take_rows(X_train, va), y[va]) for tr, va in indices]
+
+        built = []
+        for X_tr, y_tr, X_va, y_va in splits:
+            dtrain = xgb.QuantileDMatrix(X_tr, label=y_tr, enable_categorical=categorical, nthread=self.cpu_budget)
+            dvalid = xgb.QuantileDMatrix(X_va, label=y_va, ref=dtrain, enable_categorical=categorical,
+                                         nthread=self.cpu_budget)
+            built.append({'X': X_tr, 'y': y_tr, 'X_valid': X_va, 'y_valid': y_va,
+                          'train': dtrain, 'valid': dvalid, 'subsets': {}})
+        return built
+
+    def _matrices(self, fold, fraction):
+        """
+        (train, valid) matrices of a fold. For a data fraction, the training
+        matrix holds a fixed random subset of the fold's rows, quantized with
+        the fold's cuts, and gets its own validation matrix.
+        """
+        import xgboost as xgb
+
+        if fraction >= 1.0:
+            return fold['train'], fold['valid']
+        with self._subset_lock:
+            if fraction not in fold['subsets']:
+                categorical = bool(self.xgb_params.get('enable_categorical'))
+                n_rows = len(fold['y'])
+                order = np.random.default_rng(self.seed).permutation(n_rows)
+                rows = np.sort(order[:max(int(n_rows * fraction), 1)])
+                dtrain = xgb.QuantileDMatrix(_take_rows(fold['X'], rows), label=fold['y'][rows],
+                                             ref=fold['train'], enable_categorical=categorical,
+                                             nthread=self.cpu_budget)
+                dvalid = xgb.QuantileDMatrix(fold['X_valid'], label=fold['y_valid'], ref=dtrain,
+                                             enable_categorical=categorical, nthread=self.cpu_budget)
+                fold['subsets'][fraction] = (dtrain, dvalid)
+            return fold['subsets'][fraction]
+
+    def fit(self, X_train, y_train, X_valid=None, y_valid=None):
+        """
+        Run the search. Trials train on (X_train, y_train) and early-stop and
+        are ranked on (X_valid, y_valid); without a validation set, on
+        `n_folds` cross-validation folds of X_train (scored by mean RMSE).
+
+        Sets best_params_, best_score_ (validation RMSE), best_rounds_,
+        trials_ (list of trial records), timed_out_ and cpu_report_.
+
+        Returns:
+            self
+        """
+        header = self._header()
+        finished = self.trial_log.load(header) if self.resume else {}
+        self.trial_log.start(header, self.resume)
+        if finished:
+            self.log(f"Resuming search: {len(finished)} finished trials in {self.trial_log.path}")
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        folds = self._build_folds(X_train, y_train, X_valid, y_valid)
+        self._subset_lock = threading.Lock()
+        self.log(f"Quantized {len(folds)} fold(s) in {time.perf_counter() - start:.2f}s; "
+                 f"CPU budget {self.cpu_budget} core(s)")
+
+        self.trials_ = []
+        self.timed_out_ = False
+        self.cpu_report_ = {'cpu_budget': self.cpu_budget, 'rungs': []}
+        best = None
+
+        for s, n, rungs in self.brackets():
+            rng = np.random.default_rng([self.seed, s])
+            configs = {f'b{s}-c{k}': sample_params(self.space, rng) for k in range(n)}
+            survivors = list(configs)
+            states = {}
+            for rung, (n_keep, budget) in enumerate(rungs):
+                survivors = survivors[:n_keep]
+                pending = [c for c in survivors if f'{c}-r{rung}' not in finished]
+                results = self._run_rung(s, rung, pending, configs, budget, states, folds, start,
+                                         have_result=best is not None or len(self.trials_) > 0)
+                scores = {}
+                for config_id in survivors:
+                    key = f'{config_id}-r{rung}'
+                    record = finished.get(key) or results.get(config_id)
+                    if record is None:
+                        continue
+                    if key not in finished:
+                        self.trial_log.append(record)
+                    self.trials_.append(record)
+                    scores[config_id] = record['rmse']
+                    if best is None or record['rmse'] < best['rmse']:
+                        best = record
+                if len(scores) < len(survivors):
+                    self.timed_out_ = True
+                    break
+                # Promote the best configurations to the next rung
+                survivors = sorted(scores, key=scores.get)
+            if self.timed_out_:
+                self.log(f"Time budget of {self.time_budget:.0f}s reached; keeping the best trial so far")
+                break
+
+        self.best_params_ = dict(best['params'])
+        self.best_score_ = best['rmse']
+        self.best_rounds_ = best['best_iteration'] + 1
+        self.elapsed_ = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+        self.cpu_report_.update({
+            'wall_seconds': self.elapsed_,
+            'cpu_seconds': cpu_seconds,
+            'utilization': cpu_seconds / (self.elapsed_ * self.cpu_budget) if self.elapsed_ > 0 else 0.0,
+        })
+        self.log(f"Best trial {best['key']}: validation RMSE {best['rmse']:.4f} with "
+                 f"{self.best_rounds_} rounds ({len(self.trials_)} trials in {self.elapsed_:.1f}s, "
+                 f"CPU utilization {self.cpu_report_['utilization']:.0%} of {self.cpu_budget} core(s))")
+        return self
+
+    def _run_rung(self, bracket, rung, pending, configs, budget, states, folds, start, have_result):
+        """
+        Train every (configuration, fold) unit of a rung, spreading the CPU
+        budget between parallel units and XGBoost threads per unit.
+
+        Returns:
+            {config_id: trial record} for the configurations that finished
+        """
+        if not pending:
+            return {}
+        units = [(config_id, f) for config_id in pending for f in range(len(folds))]
+        parallel, threads = plan_threads(self.cpu_budget, len(units), self.max_parallel_trials)
+        completed = [have_result]
+
+        def run_unit(config_id, f):
+            # At least one trial always runs, so there is a model to return
+            if (self.time_budget is not None and completed[0]
+                    and time.perf_counter() - start > self.time_budget):
+                return None
+            unit_start = time.perf_counter()
+            state = self._run_unit(configs[config_id], budget, states.get((config_id, f)), folds[f], threads)
+            completed[0] = True
+            return state, time.perf_counter() - unit_start
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if parallel == 1:
+            outcomes = [run_unit(*unit) for unit in units]
+        else:
+            with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='tuning') as executor:
+                outcomes = list(executor.map(lambda unit: run_unit(*unit), units))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        utilization = cpu / (wall * self.cpu_budget) if wall > 0 else 0.0
+        self.cpu_report_['rungs'].append({
+            'bracket': bracket, 'rung': rung, 'units': len(units), 'parallel': parallel,
+            'threads_per_unit': threads, 'wall_seconds': wall, 'cpu_seconds': cpu, 'utilization': utilization,
+        })
+        self.log(f"[{self.method} bracket {bracket} rung {rung}] {len(pending)} trial(s) x {len(folds)} fold(s): "
+                 f"{parallel} parallel x {threads} thread(s), {wall:.2f}s, CPU utilization {utilization:.0%}")
+
+        by_config = {}
+        for (config_id, f), outcome in zip(units, outcomes):
+            by_config.setdefault(config_id, []).append(outcome)
+        results = {}
+        for config_id, fold_outcomes in by_config.items():
+            if any(outcome is None for outcome in fold_outcomes):
+                continue
+            fold_states = [state for state, _ in fold_outcomes]
+            for f, state in enumerate(fold_states):
+                states[(config_id, f)] = state
+            key = f'{config_id}-r{rung}'
+            fraction = budget / self.max_rounds if self.resource == 'data' else 1.0
+            record = {
+                'key': key,
+                'bracket': bracket,
+                'rung': rung,
+                'config': config_id,
+                'params': configs[config_id],
+                'rounds': self.max_rounds if self.resource == 'data' else budget,
+                'data_fraction': fraction,
+                'rmse': float(np.mean([state['rmse'] for state in fold_states])),
+                'best_iteration': int(round(np.mean([state['best_iteration'] for state in fold_states]))),
+                'rounds_trained': max(state['booster'].num_boosted_rounds() for state in fold_states),
+                'seconds': sum(seconds for _, seconds in fold_outcomes),
+            }
+            self.log(f"  {key}: RMSE {record['rmse']:.4f} at {record['best_iteration'] + 1}/{record['rounds']} "
+                     f"rounds, data {fraction:.2f} ({record['seconds']:.2f}s)")
+            results[config_id] = record
+        return results
+
+    def _run_unit(self, params, budget, previous, fold, nthread):
+        """Train one configuration on one fold for this rung's budget."""
+        if self.resource == 'data':
+            dtrain, dvalid = self._matrices(fold, budget / self.max_rounds)
+            return self._train(params, dtrain, dvalid, self.max_rounds, nthread=nthread)
+        if previous is not None and previous['booster'].num_boosted_rounds() < previous['budget']:
+            # Early-stopped below its last budget: more rounds would not help
+            return dict(previous, budget=budget)
+        return self._train(params, fold['train'], fold['valid'], budget, previous, nthread=nthread)
+
+
+def _take_rows(X, rows):
+    """Row subset of a DataFrame, CSR matrix or array."""
+    if hasattr(X, 'iloc'):
+        return X.iloc[rows]
+    return X[rows]
+
+
+def available_cpus():
+    """CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_threads(cpu_budget, n_units, max_parallel=None):
+    """
+    Split a CPU budget between parallel units of work and threads per unit,
+    so that parallel * threads never exceeds the budget. Many small units run
+    side by side single-threaded; a few units get the cores between them.
+
+    Returns:
+        tuple: (parallel, threads_per_unit)
+    """
+    cpu_budget = max(int(cpu_budget), 1)
+    parallel = max(1, min(n_units, cpu_budget, max_parallel or cpu_budget))
+    return parallel, max(1, cpu_budget // parallel)
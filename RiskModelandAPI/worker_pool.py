@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MicroLoan Risk Model - Multi-Process Scoring Workers
+
+A pre-fork worker pool for scoring on several cores. The parent loads the
+model and compiles the scorer once, then forks the workers. The booster and
+the preprocessing arrays are only ever read, so their pages stay shared
+copy-on-write between the parent and every worker instead of each worker
+unpickling its own copy. Where fork is unavailable the workers fall back to
+loading the (lean) model from `model_path` themselves.
+
+Each worker runs the booster single-threaded; parallelism comes from the
+processes. Dispatch is thread-safe, so one pool can serve many request threads.
+
+If a worker dies (OOM kill, crash in the booster), the chunk it was scoring
+fails, as does everything else still pending, and the pool is marked broken:
+further submits raise RuntimeError. Like concurrent.futures'
+BrokenProcessPool, it does not respawn, since a worker killed while reading
+the task queue can leave the queue unusable. Create a new pool to recover.
+
+Usage:
+    python worker_pool.py --model-path microloan_risk_model_advanced --workers 1 2 4 8
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import credit_pred
+
+# How often the result collector checks that every worker is still alive
+LIVENESS_INTERVAL = 0.5
+
+# Default seconds score() waits for one chunk
+RESULT_TIMEOUT = 600
+
+
+def _read_proc_memory(pid):
+    """
+    Return RSS, PSS and USS (in MB) of a process from /proc. PSS splits shared
+    pages between the processes mapping them, and USS counts only private
+    pages, so together they show how much of RSS is shared. Fields are None
+    where /proc is not available.
+    """
+    usage = {'rss_mb': None, 'pss_mb': None, 'uss_mb': None}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return usage
+    usage['rss_mb'] = fields.get('Rss', 0) / 1024
+    usage['pss_mb'] = fields.get('Pss', 0) / 1024
+    usage['uss_mb'] = (fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)) / 1024
+    return usage
+
+
+def _worker_main(index, tasks, results, model_path):
+    # With fork the model is inherited from the parent and this is a no-op
+    credit_pred.load_model_once(model_path)
+    compiled = credit_pred.get_compiled_scorer()
+    if compiled is not None:
+        compiled.booster.set_param({'nthread': 1})
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, records = task
+        # Tells the parent which chunk is lost if this worker dies
+        results.put(('start', index, task_id))
+        try:
+            results.put(('done', index, task_id, credit_pred.predict_credit_scores(records), None))
+        except Exception as e:
+            results.put(('done', index, task_id, None, f"{type(e).__name__}: {str(e)}"))
+
+
+class ScoringWorkerPool:
+    """Fixed pool of forked scoring processes sharing the parent's model."""
+
+    def __init__(self, n_workers=None, model_path=None, chunk_size=1024, start_method=None):
+        """
+        Args:
+            n_workers: Number of worker processes (default: CPU count)
+            model_path: Model to load (see credit_pred.load_model_once)
+            chunk_size: Maximum loans per task sent to a worker
+            start_method: 'fork' (default where available) or 'spawn'
+        """
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.model_path = model_path
+        self.chunk_size = chunk_size
+        if start_method is None:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+
+        # Load and compile once in the parent so forked workers inherit it
+        credit_pred.load_model_once(model_path)
+        credit_pred.get_scorer()
+        self.model_version = credit_pred.get_model_version()
+
+        ctx = multiprocessing.get_context(start_method)
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._workers = [
+            ctx.Process(target=_worker_main, args=(i, self._tasks, self._results, model_path),
+                        name=f'scoring-worker-{i}', daemon=True)
+            for i in range(self.n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._pending = {}
+        # Task each worker is scoring, by worker index
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._closed = False
+        self.broken = None
+        self._collector = threading.Thread(target=self._collect, name='scoring-results', daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                item = self._results.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self._handle(item)
+            if time.monotonic() - last_check >= LIVENESS_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+
+    def _handle(self, item):
+        kind, worker, task_id = item[:3]
+        with self._lock:
+            if kind == 'start':
+                self._in_flight[worker] = task_id
+                return
+            if self._in_flight.get(worker) == task_id:
+                del self._in_flight[worker]
+            future = self._pending.pop(task_id, None)
+        if future is None:
+            return
+        result, error = item[3:]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(error))
+
+    def _check_workers(self):
+        """Mark the pool broken and fail every pending chunk if a worker has died."""
+        dead = [(i, w) for i, w in enumerate(self._workers) if not w.is_alive()]
+        if not dead:
+            return
+        with self._lock:
+            if self._closed or self.broken:
+                return
+            self.broken = ', '.join(f"scoring worker {w.pid} died (exit code {w.exitcode})" for _, w in dead)
+            lost = {self._in_flight.get(i) for i, _ in dead}
+            pending, self._pending = self._pending, {}
+        print(f"Worker pool is broken: {self.broken}")
+        for task_id, future in pending.items():
+            if task_id in lost:
+                future.set_exception(RuntimeError(f"Chunk lost: {self.broken}"))
+            else:
+                future.set_exception(RuntimeError(f"Worker pool is broken: {self.broken}"))
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def submit(self, records):
+        """Send one chunk of loans to the next free worker; returns a Future of its results."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is closed")
+            if self.broken:
+                raise RuntimeError(f"Worker pool is broken: {self.broken}")
+            task_id = next(self._task_ids)
+            self._pending[task_id] = future
+        self._tasks.put((task_id, list(records)))
+        return future
+
+    def score(self, records, timeout=RESULT_TIMEOUT):
+        """
+        Score loans across the workers.
+
+        Args:
+            records: Loans, as for predict_credit_scores
+            timeout: Seconds to wait for each chunk (None waits indefinitely)
+
+        Returns:
+            list: One result dict per loan, in input order (as predict_credit_scores)
+
+        Raises:
+            RuntimeError: If the pool is closed or broken, or a chunk failed
+            concurrent.futures.TimeoutError: If a chunk took longer than `timeout`
+        """
+        records = list(records)
+        futures = [self.submit(records[i:i + self.chunk_size])
+                   for i in range(0, len(records), self.chunk_size)]
+        results = []
+        for future in futures:
+            results.extend(future.result(timeout=timeout))
+        return results
+
+    def memory_report(self):
+        """
+        Return resident memory of the parent and of each worker.
+
+        Returns:
+            dict with 'parent', 'workers' (one entry per worker) and totals of
+            RSS (counts shared pages once per process) and USS (private only).
+        """
+        workers = [dict(pid=w.pid, **_read_proc_memory(w.pid)) for w in self._workers]
+        report = {
+            'n_workers': self.n_workers,
+            'start_method': self.start_method,
+            'parent': dict(pid=os.getpid(), **_read_proc_memory(os.getpid())),
+            'workers': workers,
+        }
+        for key in ('rss_mb', 'uss_mb', 'pss_mb'):
+            values = [w[key] for w in workers if w[key] is not None]
+            report[f'workers_total_{key}'] = sum(values) if values else None
+        return report
+
+    def close(self):
+        """Stop the workers and fail any unfinished requests."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self._results.put(None)
+        self._collector.join(timeout=10)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("Worker pool closed"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score with a pool of forked workers and report memory')
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--loans', type=int, default=20000)
+    args = parser.parse_args()
+
+    from synthetic_data import sample_records
+    records = sample_records(args.loans)
+    credit_pred.configure_prediction_cache(maxsize=0)
+    for n_workers in args.workers:
+        with ScoringWorkerPool(n_workers, args.model_path) as pool:
+            start = time.perf_counter()
+            pool.score(records)
+            elapsed = time.perf_counter() - start
+            report = pool.memory_report()
+            print(f"\n{n_workers} worker(s): {len(records) / elapsed:,.0f} loans/s")
+            parent = report['parent']
+            if parent['rss_mb'] is not None:
+                print(f"  parent  RSS {parent['rss_mb']:.1f} MB")
+            for worker in report['workers']:
+                if worker['rss_mb'] is not None:
+                    print(f"  worker {worker['pid']}: RSS {worker['rss_mb']:.1f} MB, "
+                          f"PSS {worker['pss_mb']:.1f} MB, private {worker['uss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()